@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from binance_client import BinanceFuturesClient
+from metrics import METRICS, log_json
+from snapshot import PREMIUM_FIELDS, TICKER_FIELDS, MarketRow, join_snapshot
+
+DAY_MS = 86_400_000
+
+# ticker closeTime = time of the last trade in the 24h window: the event time of a tick
+ALERT_TICKER_FIELDS = TICKER_FIELDS + ("closeTime",)
+
+
+class Alert(NamedTuple):
+    symbol: str
+    rule: str  # "ret" | "vol" | "oi" | "funding"
+    value: float
+    text: str
+    event_ms: int  # exchange time of the data that crossed the threshold
+
+
+class AlertEngine:
+    """
+    Rolling per-symbol state over snapshot ticks, evaluated column-wise (O(symbols) per tick):
+    - ret: price change over window_sec
+    - vol: quote volume over window_sec vs the 24h average pace. Binance only gives a
+      rolling 24h sum, so window volume is estimated as delta + the average drop-off
+    - oi: open interest change over window_sec (only for symbols whose OI is fed in)
+    - funding: |funding rate| at or above funding_abs
+    One alert per (symbol, rule) per cooldown_sec.
+    """
+
+    def __init__(
+        self,
+        interval_sec: float = 15.0,
+        window_sec: float = 300.0,
+        ret_pct: float = 3.0,
+        vol_ratio: float = 5.0,
+        oi_pct: float = 5.0,
+        funding_abs: float = 0.001,
+        min_quote_vol: float = 1e6,
+        cooldown_sec: float = 1800.0,
+    ):
+        self.window_sec = window_sec
+        self.ret_pct = ret_pct
+        self.vol_ratio = vol_ratio
+        self.oi_pct = oi_pct
+        self.funding_abs = funding_abs
+        self.min_quote_vol = min_quote_vol
+        self.cooldown_sec = cooldown_sec
+        # ring of the last `size` ticks; columns follow self.symbols
+        self.size = max(2, int(round(window_sec / interval_sec)) + 1)
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.ts = np.full(self.size, np.nan)
+        self.price = np.full((self.size, 0), np.nan)
+        self.qv = np.full((self.size, 0), np.nan)
+        self.oi = np.full((self.size, 0), np.nan)
+        self.pos = -1
+        self.fired: Dict[Tuple[str, str], float] = {}
+
+    def _grow(self, symbols: List[str]) -> None:
+        new = [s for s in symbols if s not in self.index]
+        if not new:
+            return
+        for s in new:
+            self.index[s] = len(self.symbols)
+            self.symbols.append(s)
+        pad = np.full((self.size, len(new)), np.nan)
+        self.price = np.hstack([self.price, pad])
+        self.qv = np.hstack([self.qv, pad])
+        self.oi = np.hstack([self.oi, pad])
+
+    def _column(self, values: Dict[str, Optional[float]]) -> np.ndarray:
+        col = np.full(len(self.symbols), np.nan)
+        for s, v in values.items():
+            if v is not None:
+                col[self.index[s]] = v
+        return col
+
+    def update(
+        self,
+        ts_ms: int,
+        market: Dict[str, MarketRow],
+        event_ms: Optional[Dict[str, int]] = None,
+        oi: Optional[Dict[str, float]] = None,
+    ) -> List[Alert]:
+        """Add one tick; returns the alerts it triggers (cooldown applied)."""
+        self._grow(list(market) + ([s for s in oi if s not in market] if oi else []))
+        self.pos = (self.pos + 1) % self.size
+        p = self.pos
+        self.ts[p] = ts_ms
+        self.price[p] = self._column({s: r.last_price for s, r in market.items()})
+        self.qv[p] = self._column({s: r.quote_vol for s, r in market.items()})
+        self.oi[p] = self._column(oi or {})
+
+        # oldest tick in the ring that is at least half a window old
+        old = (p + 1) % self.size
+        while old != p and (np.isnan(self.ts[old]) or ts_ms - self.ts[old] < self.window_sec * 500.0):
+            old = (old + 1) % self.size
+        if old == p:
+            return self._check_funding(ts_ms, market, event_ms)
+        dt_ms = ts_ms - self.ts[old]
+        mins = int(round(dt_ms / 60_000.0))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret = (self.price[p] / self.price[old] - 1.0) * 100.0
+            base = self.qv[p] * dt_ms / DAY_MS
+            vr = np.where(self.qv[p] >= self.min_quote_vol, 1.0 + (self.qv[p] - self.qv[old]) / base, np.nan)
+            oi_chg = (self.oi[p] / self.oi[old] - 1.0) * 100.0
+
+        out: List[Alert] = []
+        for i in np.flatnonzero(np.abs(np.nan_to_num(ret)) >= self.ret_pct):
+            r = float(ret[i])
+            out.append(self._alert(
+                i, "ret", r, f"{'🚀' if r > 0 else '🔻'} {self.symbols[i]} {mins}분 {r:+.2f}% (가격 {self.price[p][i]:g})",
+                ts_ms, event_ms,
+            ))
+        for i in np.flatnonzero(np.nan_to_num(vr) >= self.vol_ratio):
+            v = float(vr[i])
+            out.append(self._alert(i, "vol", v, f"📈 {self.symbols[i]} 거래대금 {v:.1f}x ({mins}분, 24h 평균 대비)", ts_ms, event_ms))
+        for i in np.flatnonzero(np.abs(np.nan_to_num(oi_chg)) >= self.oi_pct):
+            c = float(oi_chg[i])
+            out.append(self._alert(i, "oi", c, f"🧲 {self.symbols[i]} OI {c:+.1f}% ({mins}분)", ts_ms, event_ms))
+        return [a for a in out if self._cooldown(a, ts_ms)] + self._check_funding(ts_ms, market, event_ms)
+
+    def _check_funding(self, ts_ms: int, market: Dict[str, MarketRow], event_ms: Optional[Dict[str, int]]) -> List[Alert]:
+        out = []
+        for s, r in market.items():
+            if r.funding is not None and abs(r.funding) >= self.funding_abs:
+                a = self._alert(self.index[s], "funding", r.funding, f"💸 {s} 펀딩 {r.funding:+.5f}", ts_ms, event_ms)
+                if self._cooldown(a, ts_ms):
+                    out.append(a)
+        return out
+
+    def _alert(self, i: int, rule: str, value: float, text: str, ts_ms: int, event_ms: Optional[Dict[str, int]]) -> Alert:
+        sym = self.symbols[i]
+        ev = (event_ms or {}).get(sym) or 0
+        return Alert(sym, rule, value, text, ev if ev > 0 else ts_ms)
+
+    def _cooldown(self, a: Alert, ts_ms: int) -> bool:
+        key = (a.symbol, a.rule)
+        last = self.fired.get(key)
+        if last is not None and ts_ms - last < self.cooldown_sec * 1000.0:
+            METRICS.inc("alerts_suppressed_total", rule=a.rule)
+            return False
+        self.fired[key] = ts_ms
+        return True
+
+
+async def poll_market(
+    binance: BinanceFuturesClient, client: httpx.AsyncClient, interval_sec: float
+) -> AsyncIterator[Tuple[int, Dict[str, MarketRow], Dict[str, int]]]:
+    """
+    (ts_ms, market snapshot, per-symbol event time) every interval_sec from the bulk
+    ticker/24hr + premiumIndex endpoints (weight 50 per tick, no per-symbol calls).
+    A failed tick is logged and skipped.
+    """
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+    while True:
+        try:
+            tickers, premiums = await asyncio.gather(
+                binance.ticker_24hr_columns(client, ALERT_TICKER_FIELDS),
+                binance.premium_index_columns(client, PREMIUM_FIELDS),
+            )
+            event_ms = {
+                s.decode(): int(t) for s, t in zip(tickers["symbol"], tickers["closeTime"]) if t.isdigit()
+            }
+            yield int(time.time() * 1000), join_snapshot(tickers, premiums), event_ms
+        except Exception as e:
+            METRICS.inc("alert_poll_failures_total", error=type(e).__name__)
+            log_json("alert_poll_failed", error=repr(e))
+        # fixed cadence; after a slow tick, restart from now instead of bursting
+        next_at = max(next_at + interval_sec, loop.time())
+        await asyncio.sleep(next_at - loop.time())
@@ -0,0 +1,515 @@
+"""
+Offline benchmark for build_report.
+
+Binance, Telegram and OpenAI are served by an in-process transport, so nothing
+leaves the machine. Payloads follow the live response shapes; prices and volumes
+are synthetic, or replayed from fixtures recorded with --record: 1h klines plus the
+exchangeInfo, ticker/24hr, premiumIndex and openInterest entries of the same
+symbols, cycled over the BENCH universe under its symbol names. Binance responses
+carry the real used weight of the current minute. Per universe size it runs a
+cold cycle (empty caches) and a warm cycle and reports wall time per stage,
+request count, Binance weight and peak traced memory.
+
+    python bench.py --sizes 300,1000,5000 --latency-ms 5 --error-rate 0.01
+    python bench.py --sizes 300 --tail-rate 0.02 --tail-ms 5000  # degraded API
+    python bench.py --record bench_fixtures   # capture live templates once
+    python bench.py --fixtures bench_fixtures # synthesize universes from them
+    python bench.py --startup --sizes 300     # one-shot (--once) import / first-request timings
+    python bench.py --sizes 5000 --workers 4  # sharded scan (SCAN_WORKERS); request
+                                              # columns then count the coordinator only
+    python bench.py --sizes 600 --workers 4 --weight-limit 2400 --server-limit 2400
+                                              # production limits, enforced by the fake server
+"""
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing as mp
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from binance_client import request_weight
+
+HOUR_MS = 3_600_000
+HISTORY = 1000
+
+STAGES = {
+    "/fapi/v1/exchangeInfo": "exchange_info",
+    "/fapi/v1/ticker/24hr": "ticker",
+    "/fapi/v1/klines": "klines",
+    "/fapi/v1/openInterest": "enrich",
+    "/fapi/v1/premiumIndex": "ticker",  # bulk, next to ticker/24hr
+}
+
+
+class FakeMarket:
+    """Synthetic (or fixture-templated) USDT perpetual universe; symbol i replays recorded symbol i % n."""
+
+    def __init__(self, n_symbols: int, templates: Optional[Dict[str, Any]] = None, seed: int = 7):
+        self.symbols = [f"BENCH{i}USDT" for i in range(n_symbols)]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.templates = templates or {}
+        self.seed = seed
+        self._series: Dict[str, List[Tuple[float, float]]] = {}
+
+    def series(self, symbol: str) -> List[Tuple[float, float]]:
+        """(close, volume) for the last HISTORY hours, live candle last."""
+        s = self._series.get(symbol)
+        if s is None:
+            i = self.index.get(symbol, 0)
+            kl = self.templates.get("klines") or []
+            if kl:
+                rows = kl[i % len(kl)]
+                s = [(float(x[4]), float(x[5])) for x in rows][-HISTORY:]
+            else:
+                rng = random.Random(self.seed * 1_000_003 + i)
+                p = rng.uniform(0.01, 500.0)
+                s = []
+                for _ in range(HISTORY):
+                    p *= 1.0 + rng.gauss(0, 0.01)
+                    s.append((p, rng.uniform(1e3, 1e6)))
+            self._series[symbol] = s
+        return s
+
+    def recorded(self, endpoint: str, symbol: str) -> Optional[Dict[str, Any]]:
+        """The recorded `endpoint` entry of the symbol's template, renamed to `symbol` (None if not recorded)."""
+        names = self.templates.get("symbols") or []
+        rows = self.templates.get(endpoint) or {}
+        if not names:
+            return None
+        row = rows.get(names[self.index.get(symbol, 0) % len(names)])
+        return None if row is None else {**row, "symbol": symbol}
+
+    def exchange_info(self) -> Dict[str, Any]:
+        rec = [self.recorded("exchange_info", s) for s in self.symbols]
+        if all(rec):
+            return {**self.templates.get("exchange_info_meta", {}), "symbols": [{**r, "pair": r["symbol"]} if "pair" in r else r for r in rec]}
+        return {"symbols": [
+            {"symbol": s, "quoteAsset": "USDT", "contractType": "PERPETUAL", "status": "TRADING"}
+            for s in self.symbols
+        ]}
+
+    def ticker_24hr(self) -> List[Dict[str, Any]]:
+        out = []
+        for s in self.symbols:
+            rec = self.recorded("ticker", s)
+            if rec is not None:
+                out.append(rec)
+                continue
+            ser = self.series(s)
+            last, prev = ser[-1][0], ser[-25][0]
+            vol = sum(v for _, v in ser[-24:])
+            # full live field set, so decoding cost matches production
+            out.append({
+                "symbol": s,
+                "priceChange": f"{last - prev:.8f}",
+                "priceChangePercent": f"{(last / prev - 1) * 100:.3f}",
+                "weightedAvgPrice": f"{(last + prev) / 2:.8f}",
+                "lastPrice": f"{last:.8f}",
+                "lastQty": "1.000",
+                "openPrice": f"{prev:.8f}",
+                "highPrice": f"{max(last, prev):.8f}",
+                "lowPrice": f"{min(last, prev):.8f}",
+                "volume": f"{vol:.3f}",
+                "quoteVolume": f"{vol * last:.2f}",
+                "openTime": 0,
+                "closeTime": 0,
+                "firstId": 1,
+                "lastId": 100000,
+                "count": 100000,
+            })
+        return out
+
+    def klines(self, symbol: str, limit: int, now_ms: int) -> List[List[Any]]:
+        cur = now_ms // HOUR_MS * HOUR_MS
+        ser = self.series(symbol)[-limit:]
+        rows = []
+        for k, (c, v) in enumerate(ser):
+            t = cur - (len(ser) - 1 - k) * HOUR_MS
+            cs = f"{c:.8f}"
+            rows.append([t, cs, cs, cs, cs, f"{v:.3f}", t + HOUR_MS - 1, f"{v * c:.2f}", 100, "0", "0", "0"])
+        return rows
+
+    def open_interest(self, symbol: str) -> Dict[str, Any]:
+        rec = self.recorded("open_interest", symbol)
+        if rec is not None:
+            return rec
+        return {"symbol": symbol, "openInterest": f"{self.series(symbol)[-1][1] * 3:.3f}", "time": 0}
+
+    def premium_index(self, symbol: Optional[str]) -> Any:
+        def one(s):
+            rec = self.recorded("premium", s)
+            if rec is not None:
+                return rec
+            c = self.series(s)[-1][0]
+            return {"symbol": s, "markPrice": f"{c:.8f}", "indexPrice": f"{c * 0.9995:.8f}",
+                    "lastFundingRate": "0.00010000", "nextFundingTime": 0, "time": 0}
+        return one(symbol) if symbol else [one(s) for s in self.symbols]
+
+
+class UsedWeight:
+    """
+    The fake server's per-IP weight counter for X-MBX-USED-WEIGHT-1M: weight of every
+    request in the current wall-clock minute. Shared memory, so shard workers'
+    transports (--workers) add to the same count, as processes behind one IP would.
+    """
+
+    def __init__(self):
+        self._a = mp.get_context("spawn").Array("d", 2)  # [minute, used]
+
+    def add(self, weight: int) -> Tuple[int, float]:
+        """Count one request; returns (used weight this minute, seconds left in the minute)."""
+        now = time.time()
+        with self._a.get_lock():
+            if self._a[0] != now // 60:
+                self._a[0], self._a[1] = now // 60, 0.0
+            self._a[1] += weight
+            return int(self._a[1]), 60.0 - now % 60
+
+
+class BenchTransport(httpx.AsyncBaseTransport):
+    """
+    Routes Binance / Telegram / OpenAI calls to FakeMarket and stubs; records every request.
+    Binance responses carry the real used weight of the minute (see UsedWeight); with
+    server_limit > 0, requests past it get 429 with Retry-After as Binance would answer.
+    """
+
+    def __init__(
+        self,
+        market: FakeMarket,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 1,
+        tail_rate: float = 0.0,
+        tail_ms: float = 0.0,
+        used: Optional[UsedWeight] = None,
+        server_limit: int = 0,
+    ):
+        self.market = market
+        self.used = used or UsedWeight()
+        self.server_limit = server_limit
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail = tail_ms / 1000.0
+        self.rng = random.Random(seed)
+        self.log: List[Tuple[str, int, int, float, float]] = []  # (stage, status, weight, start, end)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        t0 = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.tail_rate and "binance" in request.url.host and self.rng.random() < self.tail_rate:
+            await asyncio.sleep(self.tail)
+        resp, stage, weight = self._route(request)
+        self.log.append((stage, resp.status_code, weight, t0, time.perf_counter()))
+        return resp
+
+    def _route(self, request: httpx.Request) -> Tuple[httpx.Response, str, int]:
+        host, path = request.url.host, request.url.path
+        if "telegram" in host:
+            return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}}), "telegram", 0
+        if "openai" in host:
+            return httpx.Response(200, json=self._openai_response(request)), "openai", 0
+
+        params = dict(request.url.params)
+        stage = STAGES.get(path, "other")
+        weight = request_weight(path, params)
+        used, left = self.used.add(weight)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if self.server_limit and used > self.server_limit:
+            headers["Retry-After"] = str(int(left) + 1)
+            return httpx.Response(429, json={"code": -1003, "msg": "too many requests"}, headers=headers), stage, weight
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return httpx.Response(503, json={"code": -1001, "msg": "injected"}, headers=headers), stage, weight
+        m = self.market
+        if path == "/fapi/v1/exchangeInfo":
+            body = m.exchange_info()
+        elif path == "/fapi/v1/ticker/24hr":
+            body = m.ticker_24hr()
+        elif path == "/fapi/v1/klines":
+            body = m.klines(params["symbol"], int(params.get("limit", 500)), int(time.time() * 1000))
+        elif path == "/fapi/v1/openInterest":
+            body = m.open_interest(params["symbol"])
+        elif path == "/fapi/v1/premiumIndex":
+            body = m.premium_index(params.get("symbol"))
+        else:
+            return httpx.Response(404), stage, weight
+        return httpx.Response(200, json=body, headers=headers), stage, weight
+
+    @staticmethod
+    def _openai_response(request: httpx.Request) -> Dict[str, Any]:
+        try:
+            items = json.loads(json.loads(request.content)["input"])["items"]
+        except Exception:
+            items = []
+        text = json.dumps({it["symbol"]: ["벤치 요인1", "벤치 요인2"] for it in items}, ensure_ascii=False)
+        return {
+            "id": "resp_bench", "object": "response", "created_at": 0, "model": "bench",
+            "status": "completed", "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            "output": [{
+                "type": "message", "id": "msg_bench", "role": "assistant", "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        stages: Dict[str, List[float]] = {}
+        for stage, _, _, t0, t1 in self.log:
+            s = stages.setdefault(stage, [t0, t1])
+            s[0], s[1] = min(s[0], t0), max(s[1], t1)
+        return {
+            "requests": sum(1 for x in self.log if x[0] not in ("telegram", "openai")),
+            "weight": sum(x[2] for x in self.log),
+            "errors": sum(1 for x in self.log if x[1] >= 400),
+            "stages_ms": {k: (v[1] - v[0]) * 1000.0 for k, v in stages.items()},
+        }
+
+
+def make_transport(market: FakeMarket, args, used: Optional[UsedWeight] = None) -> BenchTransport:
+    return BenchTransport(
+        market, args.latency_ms, args.error_rate, tail_rate=args.tail_rate, tail_ms=args.tail_ms,
+        used=used, server_limit=args.server_limit,
+    )
+
+
+def worker_transport(n_symbols: int, templates: Dict[str, Any], args, used: UsedWeight) -> BenchTransport:
+    """A shard worker's own fake server (same deterministic universe and weight count as the coordinator's)."""
+    return make_transport(FakeMarket(n_symbols, templates), args, used)
+
+
+async def run_cycle(market: FakeMarket, kline_cache, args, shards=None, used: Optional[UsedWeight] = None) -> Dict[str, Any]:
+    import main
+    from runtime import Runtime
+
+    transport = make_transport(market, args, used)
+    rt = Runtime(kline_cache, transport=transport)
+    rt.shards = shards
+    if args.memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    await main.build_report(rt)
+    wall = time.perf_counter() - t0
+    rt.shards = None  # the pool outlives the cycle; only its own clients are closed
+    await rt.close()
+    peak = None
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"wall_ms": wall * 1000.0, "peak_mb": None if peak is None else peak / 1e6, **transport.summary()}
+
+
+def load_fixtures(path: Optional[str]) -> Dict[str, Any]:
+    """
+    Templates from a --record directory: kline series (in file order) and, per recorded
+    symbol, its exchangeInfo / ticker / premiumIndex / openInterest entries where present
+    (directories recorded before those were captured give klines only).
+    """
+    if not path:
+        return {}
+
+    def read(name: str) -> Any:
+        with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    names = sorted(os.listdir(path))
+    out: Dict[str, Any] = {"klines": [], "symbols": []}
+    for name in names:
+        if name.startswith("klines_") and name.endswith(".json"):
+            out["klines"].append(read(name))
+            out["symbols"].append(name[len("klines_"):-len(".json")])
+    if "exchangeInfo.json" in names:
+        ex = read("exchangeInfo.json")
+        out["exchange_info"] = {s["symbol"]: s for s in ex.pop("symbols", [])}
+        out["exchange_info_meta"] = ex
+    if "ticker_24hr.json" in names:
+        out["ticker"] = {r["symbol"]: r for r in read("ticker_24hr.json")}
+    if "premiumIndex.json" in names:
+        out["premium"] = {r["symbol"]: r for r in read("premiumIndex.json")}
+    if "openInterest.json" in names:
+        out["open_interest"] = {r["symbol"]: r for r in read("openInterest.json")}
+    return out
+
+
+async def record_fixtures(path: str, n: int = 20) -> None:
+    """
+    Store, for the first n live USDT perpetuals: HISTORY 1h klines each, their openInterest,
+    and the exchangeInfo, ticker/24hr and premiumIndex payloads (trimmed to those symbols).
+    """
+    from binance_client import BinanceFuturesClient
+
+    os.makedirs(path, exist_ok=True)
+
+    def write(name: str, obj: Any) -> None:
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+
+    b = BinanceFuturesClient(os.getenv("BINANCE_BASE_URL", "https://fapi.binance.com"))
+    async with httpx.AsyncClient(timeout=15) as client:
+        ex = await b.exchange_info(client)
+        syms = [s["symbol"] for s in ex.get("symbols", [])
+                if s.get("quoteAsset") == "USDT" and s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING"]
+        keep = set(syms[:n])
+        write("exchangeInfo.json", {**ex, "symbols": [s for s in ex["symbols"] if s["symbol"] in keep]})
+        write("ticker_24hr.json", [r for r in await b.ticker_24hr_all(client) if r["symbol"] in keep])
+        # the bulk premiumIndex request the report makes (see premium_index_columns), kept whole
+        write("premiumIndex.json", [r for r in await b._get(client, "/fapi/v1/premiumIndex") if r["symbol"] in keep])
+        oi = []
+        for sym in syms[:n]:
+            write(f"klines_{sym}.json", await b.klines_1h(client, symbol=sym, limit=HISTORY))
+            oi.append(await b.open_interest(client, sym))
+        write("openInterest.json", oi)
+    print(f"recorded {len(keep)} symbols (klines, exchangeInfo, ticker/24hr, premiumIndex, openInterest) to {path}")
+
+
+async def main_async(args) -> None:
+    from kline_cache import KlineCache
+
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+    os.environ.setdefault("TELEGRAM_CHAT_ID", "0")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ["BINANCE_WEIGHT_LIMIT"] = str(args.weight_limit)
+    # gives the coordinator its weight share, as in production
+    os.environ["SCAN_WORKERS"] = str(args.workers)
+    templates = load_fixtures(args.fixtures)
+
+    results = []
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            shards = None
+            try:
+                market = FakeMarket(n, templates)
+                for sym in market.symbols:
+                    market.series(sym)  # generate outside the timed cycles
+                cache = KlineCache("klines.json")
+                used = UsedWeight()
+                if args.workers > 1:
+                    from shards import ShardPool
+
+                    shards = ShardPool(args.workers, functools.partial(worker_transport, n, templates, args, used))
+                for label in ("cold", "warm"):
+                    r = await run_cycle(market, cache, args, shards, used)
+                    results.append({"symbols": n, "cycle": label, **r})
+            finally:
+                if shards is not None:
+                    shards.close()
+                os.chdir(cwd)
+
+    stage_names = ["exchange_info", "ticker", "klines", "enrich", "openai", "telegram"]
+    head = f"{'symbols':>8} {'cycle':>5} {'wall_ms':>9} {'reqs':>6} {'weight':>7} {'errs':>5} {'peak_MB':>8} " + " ".join(
+        f"{s:>13}" for s in stage_names)
+    print(head)
+    for r in results:
+        peak = "NA" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+        st = " ".join(f"{r['stages_ms'].get(s, 0.0):>13.1f}" for s in stage_names)
+        print(f"{r['symbols']:>8} {r['cycle']:>5} {r['wall_ms']:>9.1f} {r['requests']:>6} {r['weight']:>7} {r['errors']:>5} {peak:>8} {st}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+PKG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def startup_child(args) -> None:
+    """One build_report in a fresh process, as `main.py --once` would run; prints JSON timings."""
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+    os.environ.setdefault("TELEGRAM_CHAT_ID", "0")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ["BINANCE_WEIGHT_LIMIT"] = str(args.weight_limit)
+    market = FakeMarket(args.sizes[0], load_fixtures(args.fixtures))
+    for sym in market.symbols:
+        market.series(sym)
+    transport = BenchTransport(market, args.latency_ms)
+
+    t0 = time.perf_counter()
+    import main
+    from runtime import Runtime
+
+    t_import = time.perf_counter()
+    rt = Runtime(transport=transport)
+    try:
+        await main.build_report(rt)
+    finally:
+        await rt.close()
+    binance = [x for x in transport.log if x[0] not in ("telegram", "openai")]
+    sent = [x for x in transport.log if x[0] == "telegram"]
+    print(json.dumps({
+        "import_ms": (t_import - t0) * 1000.0,
+        "first_request_ms": (binance[0][3] - t0) * 1000.0 if binance else None,
+        "report_ms": (sent[-1][4] - t0) * 1000.0 if sent else None,
+        "exchange_info": any(x[0] == "exchange_info" for x in binance),
+        "openai_loaded": "openai" in sys.modules,
+    }))
+
+
+def run_startup(args) -> None:
+    """
+    Cold-start timings of one-shot runs, each in a new interpreter sharing one working
+    directory (so caches persist as they would between cron invocations):
+    clean `import main`, then first Binance request and report delivery per run.
+    """
+    def clean_import(module: str) -> float:
+        code = f"import sys, time; sys.path.insert(0, {PKG_DIR!r}); t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000.0)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        return float(out.stdout.strip().splitlines()[-1])
+
+    print(f"import main   {clean_import('main'):8.1f} ms   (import openai alone: {clean_import('openai'):.1f} ms)")
+    runs = [("cold caches, ai", "ai"), ("warm caches, ai", "ai"), ("warm caches, rules", "rules")]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'run':<20} {'wall_ms':>9} {'import_ms':>10} {'first_req_ms':>13} {'report_ms':>10} {'exchangeInfo':>13} {'openai':>7}")
+        for label, mode in runs:
+            cmd = [sys.executable, os.path.join(PKG_DIR, "bench.py"), "--startup-child",
+                   "--sizes", str(args.sizes[0]), "--latency-ms", str(args.latency_ms)]
+            if args.fixtures:
+                cmd += ["--fixtures", os.path.abspath(args.fixtures)]
+            t0 = time.perf_counter()
+            out = subprocess.run(cmd, cwd=tmp, capture_output=True, text=True, check=True,
+                                 env={**os.environ, "REASONS_MODE": mode})
+            wall = (time.perf_counter() - t0) * 1000.0
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{label:<20} {wall:>9.1f} {r['import_ms']:>10.1f} {r['first_request_ms']:>13.1f} "
+                  f"{r['report_ms']:>10.1f} {str(r['exchange_info']):>13} {str(r['openai_loaded']):>7}")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="300,1000,5000", type=lambda s: [int(x) for x in s.split(",") if x])
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="per-request latency (jittered ±50%%)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of Binance requests answered with 503")
+    ap.add_argument("--tail-rate", type=float, default=0.0, help="fraction of Binance requests delayed by --tail-ms")
+    ap.add_argument("--tail-ms", type=float, default=5000.0, help="extra delay of the slow tail")
+    ap.add_argument("--weight-limit", type=int, default=1_000_000,
+                    help="limiter budget (production: 2400)")
+    ap.add_argument("--server-limit", type=int, default=0,
+                    help="fake server answers 429 past this weight per minute (0: not enforced)")
+    ap.add_argument("--fixtures", default=None, help="directory written by --record")
+    ap.add_argument("--record", default=None, metavar="DIR", help="capture live Binance fixtures (every endpoint the bot reads) and exit")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc (it slows runs)")
+    ap.add_argument("--workers", type=int, default=1, help="sharded scan over this many worker processes")
+    ap.add_argument("--json", default=None, help="also write results to this file")
+    ap.add_argument("--startup", action="store_true", help="measure one-shot cold start instead")
+    ap.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    return ap.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.record:
+        asyncio.run(record_fixtures(args.record))
+    elif args.startup_child:
+        asyncio.run(startup_child(args))
+    elif args.startup:
+        run_startup(args)
+    else:
+        asyncio.run(main_async(args))
@@ -1,16 +1,387 @@
+import asyncio
+import random
+import time
+from collections import deque
 import httpx
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from decode import kline_candles, pick_columns
+from kline_cache import Candle
+from metrics import METRICS, log_json, quantile
+
+# Request weights (USD-M futures). Callables take the request params.
+ENDPOINT_WEIGHTS = {
+    "/fapi/v1/exchangeInfo": lambda p: 1,
+    "/fapi/v1/ticker/24hr": lambda p: 1 if p.get("symbol") else 40,
+    "/fapi/v1/klines": lambda p: _klines_weight(int(p.get("limit", 500))),
+    "/fapi/v1/openInterest": lambda p: 1,
+    "/fapi/v1/premiumIndex": lambda p: 1 if p.get("symbol") else 10,
+}
+
+RETRY_STATUS = {418, 429, 500, 502, 503, 504}
+
+# cheap per-symbol reads that may be duplicated when the first copy is slow
+HEDGE_PATHS = {"/fapi/v1/klines", "/fapi/v1/openInterest"}
+
+
+def _klines_weight(limit: int) -> int:
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def request_weight(path: str, params: Optional[Dict[str, Any]] = None) -> int:
+    f = ENDPOINT_WEIGHTS.get(path)
+    return f(params or {}) if f else 1
+
+
+class WeightLimiter:
+    """
+    Token bucket over Binance's per-minute request weight plus an adaptive in-flight cap.
+    - bucket refills at budget/60 per second and is synced down to the server-reported
+      X-MBX-USED-WEIGHT-1M after every response
+    - concurrency grows by 1 while usage is low and halves when usage is high or on 429/418
+    - Retry-After pauses every caller until it expires
+    - share < 1: one of several processes behind the same IP (sharded scan). The bucket
+      and its refill shrink to that share, while usage is still judged against the
+      whole IP budget, since X-MBX-USED-WEIGHT-1M counts every process's weight
+    """
+
+    def __init__(
+        self,
+        weight_limit: int = 2400,
+        safety: float = 0.8,
+        max_concurrency: int = 20,
+        min_concurrency: int = 2,
+        share: float = 1.0,
+    ):
+        # IP-wide budget: what the used-weight header is compared against
+        self.budget = weight_limit * safety
+        self.share = min(1.0, max(share, 1e-6))
+        # this process's bucket
+        self.capacity = self.budget * self.share
+        self.rate = self.capacity / 60.0
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency = self.max_concurrency
+        self.inflight = 0
+        self.used_weight = 0
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._cond = asyncio.Condition()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, weight: int) -> None:
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif self.inflight >= self.concurrency:
+                    delay = None
+                elif self._tokens >= min(weight, self.capacity):
+                    self._tokens -= weight
+                    self.inflight += 1
+                    return
+                else:
+                    delay = (min(weight, self.capacity) - self._tokens) / self.rate
+                try:
+                    await asyncio.wait_for(self._cond.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, used_weight: Optional[int] = None, throttled: bool = False) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            if used_weight is not None:
+                self.used_weight = used_weight
+                self._refill(time.monotonic())
+                # this process's share of the IP's remaining headroom
+                self._tokens = min(self._tokens, (self.budget - used_weight) * self.share)
+            usage = self.used_weight / self.budget
+            if throttled or usage > 0.8:
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            elif usage < 0.5 and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+            self._cond.notify_all()
+
+    async def pause(self, seconds: float) -> None:
+        async with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker over whole calls (retries included):
+    - opens after `threshold` consecutive failed calls; calls then fail fast
+    - after `cooldown_sec` a single probe call is let through (half-open)
+    - the probe's outcome closes it again or restarts the cooldown
+    """
+
+    def __init__(self, threshold: int = 5, cooldown_sec: float = 30.0):
+        self.threshold = max(1, threshold)
+        self.cooldown_sec = cooldown_sec
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing or time.monotonic() - self.opened_at >= self.cooldown_sec else "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.cooldown_sec:
+            return False
+        self.probing = True
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
 
 class BinanceFuturesClient:
-    def __init__(self, base_url: str, timeout_sec: int = 12):
+    """
+    - attempt_timeout_sec bounds each request on the wire; no retry starts after
+      call_deadline_sec, so a degraded API costs about that much per call at most
+      (time queued in the limiter is excluded: that is our own throttling)
+    - HEDGE_PATHS requests still running after the endpoint's recent p95 (at least
+      hedge_min_sec) get one duplicate; the first response wins. hedge_min_sec <= 0 disables
+    - one CircuitBreaker per endpoint path; open circuits raise CircuitOpenError at once
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout_sec: int = 12,
+        max_concurrency: int = 20,
+        weight_limit: int = 2400,
+        weight_share: float = 1.0,
+        max_retries: int = 3,
+        max_retry_after: float = 120.0,
+        attempt_timeout_sec: Optional[float] = None,
+        call_deadline_sec: float = 30.0,
+        hedge_min_sec: float = 0.5,
+        breaker_threshold: int = 5,
+        breaker_cooldown_sec: float = 30.0,
+    ):
         self.base_url = base_url.rstrip("/")
         self.timeout = httpx.Timeout(timeout_sec)
+        self.limiter = WeightLimiter(weight_limit, max_concurrency=max_concurrency, share=weight_share)
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.attempt_timeout_sec = attempt_timeout_sec or float(timeout_sec)
+        self.call_deadline_sec = call_deadline_sec
+        self.hedge_min_sec = hedge_min_sec
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_sec = breaker_cooldown_sec
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def breaker(self, path: str) -> CircuitBreaker:
+        b = self.breakers.get(path)
+        if b is None:
+            b = self.breakers[path] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown_sec)
+        return b
+
+    def _hedge_delay(self, path: str) -> Optional[float]:
+        if path not in HEDGE_PATHS or self.hedge_min_sec <= 0:
+            return None
+        lat = self.latencies.get(path)
+        if not lat or len(lat) < 20:
+            return max(self.hedge_min_sec, self.attempt_timeout_sec / 2)
+        return max(self.hedge_min_sec, quantile(list(lat), 0.95))
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        weight: int,
+        sent: Optional[asyncio.Event] = None,
+        queued: Optional[List[float]] = None,
+    ) -> httpx.Response:
+        """One request; attempt_timeout_sec starts once the limiter lets it go."""
+        q0 = time.perf_counter()
+        await self.limiter.acquire(weight)
+        if sent is not None:
+            sent.set()
+        if queued is not None:
+            queued.append(time.perf_counter() - q0)
+        used = None
+        throttled = False
+        t0 = time.perf_counter()
+        try:
+            r = await asyncio.wait_for(client.get(url, params=params), self.attempt_timeout_sec)
+            used = _int_header(r, "X-MBX-USED-WEIGHT-1M")
+            throttled = r.status_code in (418, 429)
+            METRICS.inc("http_responses_total", service="binance", endpoint=path, code=r.status_code)
+            if r.status_code < 500:
+                self.latencies.setdefault(path, deque(maxlen=200)).append(time.perf_counter() - t0)
+            return r
+        except httpx.TransportError as e:
+            METRICS.inc("http_responses_total", service="binance", endpoint=path, code=type(e).__name__)
+            raise
+        except asyncio.TimeoutError:
+            METRICS.inc("binance_timeouts_total", endpoint=path)
+            METRICS.inc("http_responses_total", service="binance", endpoint=path, code="timeout")
+            raise
+        except asyncio.CancelledError:
+            # lost a hedge race
+            METRICS.inc("http_responses_total", service="binance", endpoint=path, code="cancelled")
+            raise
+        finally:
+            METRICS.observe("http_request_seconds", time.perf_counter() - t0, service="binance", endpoint=path)
+            await self.limiter.release(used, throttled)
+            METRICS.inc("binance_weight_total", weight)
+            if used is not None:
+                METRICS.set("binance_used_weight_1m", used)
+            METRICS.set("binance_concurrency", self.limiter.concurrency)
 
-    async def _get(self, client: httpx.AsyncClient, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    async def _hedged(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        weight: int,
+        queued: List[float],
+    ) -> httpx.Response:
+        if self._hedge_delay(path) is None:
+            return await self._send(client, url, path, params, weight, queued=queued)
+        loop = asyncio.get_running_loop()
+        sent = asyncio.Event()
+        first = asyncio.ensure_future(self._send(client, url, path, params, weight, sent, queued))
+        tasks = {first}
+        try:
+            # the hedge clock starts once the first copy leaves the limiter queue
+            waiter = asyncio.ensure_future(sent.wait())
+            try:
+                await asyncio.wait({first, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            t0 = loop.time()
+            while not first.done():
+                # re-read each step: the p95 fills in while early requests are in flight
+                wait = self._hedge_delay(path) - (loop.time() - t0)
+                if wait <= 0:
+                    METRICS.inc("binance_hedges_total", endpoint=path)
+                    tasks.add(asyncio.ensure_future(self._send(client, url, path, params, weight)))
+                    break
+                await asyncio.wait(tasks, timeout=min(wait, self.hedge_min_sec))
+            err: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is not first:
+                            METRICS.inc("binance_hedge_wins_total", endpoint=path)
+                        return t.result()
+                    err = t.exception()
+            raise err
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _get(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None,
+    ) -> Any:
+        """decode(body bytes) replaces r.json() for the hot payloads (see decode.py)."""
         url = f"{self.base_url}{path}"
-        r = await client.get(url, params=params)
+        weight = request_weight(path, params)
+        breaker = self.breaker(path)
+        if not breaker.allow():
+            METRICS.inc("binance_circuit_rejected_total", endpoint=path)
+            raise CircuitOpenError(f"circuit open: {path}")
+        try:
+            r = await self._call(client, url, path, params, weight)
+        except Exception:
+            was = breaker.state
+            breaker.failure()
+            if breaker.state != was:
+                log_json("binance_circuit", endpoint=path, state=breaker.state, failures=breaker.failures)
+            METRICS.set("binance_circuit_open", 0 if breaker.state == "closed" else 1, endpoint=path)
+            raise
+        if r.status_code >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+        METRICS.set("binance_circuit_open", 0 if breaker.state == "closed" else 1, endpoint=path)
         r.raise_for_status()
-        return r.json()
+        return decode(r.content) if decode is not None else r.json()
+
+    async def _call(
+        self, client: httpx.AsyncClient, url: str, path: str, params: Optional[Dict[str, Any]], weight: int
+    ) -> httpx.Response:
+        """
+        Attempts with retries until a final response. No retry starts once call_deadline_sec
+        is used up; time spent queued in the limiter is our own throttling and not counted.
+        """
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        queued: List[float] = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                if loop.time() - t0 - sum(queued) >= self.call_deadline_sec:
+                    METRICS.inc("binance_deadline_exceeded_total", endpoint=path)
+                    raise asyncio.TimeoutError(f"call deadline exceeded: {path}")
+                METRICS.inc("binance_retries_total", endpoint=path)
+            err: Optional[Exception] = None
+            try:
+                r = await self._hedged(client, url, path, params, weight, queued)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                err = e
+
+            if err is not None:
+                if attempt >= self.max_retries:
+                    raise err
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            if r.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                return r
+
+            retry_after = _int_header(r, "Retry-After")
+            if r.status_code in (418, 429):
+                # 429: over the limit, 418: IP banned for repeatedly ignoring 429s
+                wait = retry_after if retry_after is not None else _backoff(attempt)
+                log_json("binance_throttled", status=r.status_code, endpoint=path, retry_after=wait)
+                if wait > self.max_retry_after:
+                    return r
+                await self.limiter.pause(wait)
+            else:
+                await asyncio.sleep(_backoff(attempt))
+        raise AssertionError("unreachable")
 
     async def exchange_info(self, client: httpx.AsyncClient) -> Dict[str, Any]:
         return await self._get(client, "/fapi/v1/exchangeInfo")
@@ -19,6 +390,10 @@ class BinanceFuturesClient:
         # Weight: 40 if symbol omitted
         return await self._get(client, "/fapi/v1/ticker/24hr")
 
+    async def ticker_24hr_columns(self, client: httpx.AsyncClient, fields: Sequence[str]) -> Dict[str, List[bytes]]:
+        # same request, only `fields` decoded (see decode.pick_columns)
+        return await self._get(client, "/fapi/v1/ticker/24hr", decode=lambda body: pick_columns(body, fields))
+
     async def klines_1h(self, client: httpx.AsyncClient, symbol: str, limit: int = 25) -> List[List[Any]]:
         # GET /fapi/v1/klines
         return await self._get(
@@ -27,8 +402,33 @@ class BinanceFuturesClient:
             params={"symbol": symbol, "interval": "1h", "limit": limit},
         )
 
+    async def candles_1h(self, client: httpx.AsyncClient, symbol: str, limit: int = 25) -> List[Candle]:
+        # klines_1h decoded straight to (openTime, close, volume)
+        return await self._get(
+            client,
+            "/fapi/v1/klines",
+            params={"symbol": symbol, "interval": "1h", "limit": limit},
+            decode=kline_candles,
+        )
+
     async def open_interest(self, client: httpx.AsyncClient, symbol: str) -> Dict[str, Any]:
         return await self._get(client, "/fapi/v1/openInterest", params={"symbol": symbol})
 
     async def premium_index(self, client: httpx.AsyncClient, symbol: str) -> Dict[str, Any]:
         return await self._get(client, "/fapi/v1/premiumIndex", params={"symbol": symbol})
+
+    async def premium_index_columns(self, client: httpx.AsyncClient, fields: Sequence[str]) -> Dict[str, List[bytes]]:
+        # Weight: 10 if symbol omitted; funding/mark/index for every contract, only `fields` decoded
+        return await self._get(client, "/fapi/v1/premiumIndex", decode=lambda body: pick_columns(body, fields))
+
+
+def _int_header(r: httpx.Response, name: str) -> Optional[int]:
+    try:
+        return int(r.headers[name])
+    except Exception:
+        return None
+
+
+def _backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
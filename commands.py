@@ -0,0 +1,187 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from metrics import METRICS, log_json
+from runtime import Runtime
+from scan import WINDOWS, top_k
+from snapshot import PREMIUM_FIELDS, TICKER_FIELDS, ScanSnapshot, join_snapshot
+from telegram_client import TelegramClient
+
+HELP = (
+    "사용법\n"
+    "/coin SOLUSDT — 코인 요약 (SOL 만 써도 됨)\n"
+    "/top 12h 10 — 12시간 상승 TOP 10 (1h, 4h, 12h, 24h, 7d)\n"
+    "/top 24h 5 down — 24시간 하락 TOP 5"
+)
+
+ALIASES = {"1D": "24H", "D": "24H", "W": "7D", "1W": "7D"}
+
+
+def parse_command(text: str) -> Tuple[str, List[str]]:
+    """"/top@my_bot 12h 10" -> ("top", ["12h", "10"]); non-commands give ("", [])."""
+    parts = (text or "").strip().split()
+    if not parts or not parts[0].startswith("/"):
+        return "", []
+    return parts[0][1:].split("@", 1)[0].lower(), parts[1:]
+
+
+def _pct(x: Optional[float]) -> str:
+    return "NA" if x is None else f"{x:+.2f}%"
+
+
+def _age(sec: float) -> str:
+    return f"{int(sec)}초 전" if sec < 60 else f"{int(sec // 60)}분 전"
+
+
+def answer(snap: Optional[ScanSnapshot], cmd: str, args: List[str]) -> str:
+    """Reply text from the in-memory snapshot only (no I/O)."""
+    if cmd in ("start", "help"):
+        return HELP
+    if snap is None:
+        return "⏳ 아직 시장 데이터를 모으는 중입니다. 잠시 후 다시 시도하세요."
+    age = _age(snap.age_sec())
+
+    if cmd == "coin":
+        if not args:
+            return HELP
+        sym = args[0].upper()
+        if not sym.endswith("USDT"):
+            sym += "USDT"
+        row = snap.row(sym)
+        if row is None:
+            return f"❓ 알 수 없는 심볼: {sym}"
+        m = snap.market.get(sym)
+        ema50, rsi = snap.indicators(sym)
+        price = (m.last_price if m else None) or row.get("price")
+        rets = " | ".join(f"{w.label} {_pct(row.get(f'ret{w.hours}'))}" for w in WINDOWS.values())
+        lines = [
+            f"🔎 {sym} (데이터 {age})",
+            f"가격 {'NA' if price is None else f'{price:g}'} | 24h {_pct(m.pct_24h if m else None)}",
+            rets,
+            f"RSI {'NA' if rsi is None else f'{rsi:.1f}'}"
+            + ("" if ema50 is None or price is None else f" | EMA50 {'상단' if price >= ema50 else '하단'}"),
+            f"펀딩 {'NA' if not m or m.funding is None else f'{m.funding:+.5f}'}"
+            f" | 베이시스 {'NA' if not m or m.basis_pct is None else f'{m.basis_pct:+.3f}%'}",
+            f"거래량배수 {'NA' if row.get('vol_ratio') is None else f'{row['vol_ratio']:.2f}x'}",
+        ]
+        return "\n".join(lines)
+
+    if cmd in ("top", "bottom"):
+        label = (args[0].upper() if args else "12H")
+        label = ALIASES.get(label, label)
+        if label not in WINDOWS:
+            return f"❓ 알 수 없는 구간: {label}\n" + HELP
+        try:
+            n = max(1, min(30, int(args[1]))) if len(args) > 1 else 5
+        except ValueError:
+            return HELP
+        largest = cmd == "top" and not (len(args) > 2 and args[2].lower() in ("down", "하락"))
+        w = WINDOWS[label]
+        scan = snap.scan
+        col = scan.columns[f"ret{w.hours}"]
+        idx = top_k(col, n, largest)
+        head = f"{'🏆' if largest else '📉'} {w.label} {'상승' if largest else '하락'} TOP {len(idx)} (데이터 {age})"
+        body = [f"{k}. {scan.symbols[i]} {_pct(float(col[i]))}" for k, i in enumerate(idx, 1)]
+        return "\n".join([head] + body)
+
+    return HELP
+
+
+class CommandServer:
+    """
+    Long-polls getUpdates (offset = last update_id + 1) and answers each message in
+    its own task, at most max_concurrency at a time. Answers read Runtime.snapshot;
+    when it is older than max_staleness_sec one shared refresh (bulk ticker +
+    premiumIndex, weight 50) runs and a query waits for it at most refresh_wait_sec
+    before answering from what is there.
+    """
+
+    def __init__(
+        self,
+        rt: Runtime,
+        tg: TelegramClient,
+        max_staleness_sec: float = 900.0,
+        refresh_wait_sec: float = 2.0,
+        max_concurrency: int = 8,
+        poll_timeout: int = 30,
+    ):
+        self.rt = rt
+        self.tg = tg
+        self.max_staleness_sec = max_staleness_sec
+        self.refresh_wait_sec = refresh_wait_sec
+        self.poll_timeout = poll_timeout
+        self.offset: Optional[int] = None
+        self.sem = asyncio.Semaphore(max_concurrency)
+        self.tasks: set = set()
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                data = await self.tg.get_updates(client, self.offset, timeout=self.poll_timeout)
+            except Exception as e:
+                METRICS.inc("command_poll_failures_total", error=type(e).__name__)
+                log_json("command_poll_failed", error=repr(e))
+                await asyncio.sleep(5)
+                continue
+            for u in data.get("result", []):
+                # confirmed on the next getUpdates call
+                self.offset = max(self.offset or 0, int(u["update_id"]) + 1)
+                msg = u.get("message") or u.get("channel_post")
+                if not msg or "text" not in msg:
+                    continue
+                t = asyncio.create_task(self.handle(client, msg))
+                self.tasks.add(t)
+                t.add_done_callback(self.tasks.discard)
+
+    async def handle(self, client: httpx.AsyncClient, msg: Dict[str, Any]) -> None:
+        cmd, args = parse_command(msg["text"])
+        if not cmd:
+            return
+        async with self.sem:
+            t0 = time.perf_counter()
+            await self.fresh(client)
+            text = answer(self.rt.snapshot, cmd, args)
+            METRICS.observe("command_answer_seconds", time.perf_counter() - t0, command=cmd)
+            try:
+                await self.tg.send_message(client, str(msg["chat"]["id"]), text)
+            except Exception as e:
+                METRICS.inc("command_send_failures_total", error=type(e).__name__)
+                log_json("command_send_failed", command=cmd, error=repr(e))
+                return
+            METRICS.inc("commands_total", command=cmd)
+            METRICS.observe("command_reply_seconds", time.perf_counter() - t0, command=cmd)
+
+    async def fresh(self, client: httpx.AsyncClient) -> None:
+        snap = self.rt.snapshot
+        if snap is not None and snap.age_sec() <= self.max_staleness_sec:
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self.refresh(client))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._refreshing), self.refresh_wait_sec)
+        except Exception:
+            # answer from the stale snapshot; the refresh keeps going
+            pass
+
+    async def refresh(self, client: httpx.AsyncClient) -> None:
+        rt = self.rt
+        try:
+            with METRICS.span("stage_seconds", stage="command_refresh"):
+                tickers, premiums = await asyncio.gather(
+                    rt.binance.ticker_24hr_columns(client, TICKER_FIELDS),
+                    rt.binance.premium_index_columns(client, PREMIUM_FIELDS),
+                )
+                market = join_snapshot(tickers, premiums)
+                if rt.snapshot is not None:
+                    rt.snapshot.refresh(market)
+                else:
+                    # before the first report: closed candles from the cache file, no indicators
+                    rt.kline_cache.ensure_loaded()
+                    symbols = [s for s in await rt.get_symbols(client) if s in rt.kline_cache.closed]
+                    rt.snapshot = ScanSnapshot(symbols, market, rt.kline_cache)
+        except Exception as e:
+            log_json("command_refresh_failed", error=repr(e))
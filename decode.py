@@ -0,0 +1,44 @@
+import json
+import re
+from typing import Dict, List, Sequence
+
+from kline_cache import Candle, parse_klines
+
+# Selective decoders over raw response bytes: only the fields the report uses are
+# materialized, instead of a full dict/list tree per symbol. Binance payloads are flat
+# (objects without nesting, klines as arrays of strings), which keeps the patterns simple.
+# Any payload the patterns do not recognize goes through json.loads instead.
+
+# [openTime, "open", "high", "low", "close", "volume", ...]
+_KLINE = re.compile(rb'\[\s*(\d+)\s*,\s*"[^"]*"\s*,\s*"[^"]*"\s*,\s*"[^"]*"\s*,\s*"([^"]*)"\s*,\s*"([^"]*)"')
+_field_patterns: Dict[str, "re.Pattern[bytes]"] = {}
+
+
+def kline_candles(body: bytes) -> List[Candle]:
+    """(openTime, close, volume) per kline row, oldest first."""
+    rows = _KLINE.findall(body)
+    if not rows and body.strip() not in (b"", b"[]"):
+        return parse_klines(json.loads(body))
+    return [(int(t), float(c), float(v)) for t, c, v in rows]
+
+
+def _field_pattern(field: str) -> "re.Pattern[bytes]":
+    p = _field_patterns.get(field)
+    if p is None:
+        # "name":"value" or "name":value (numbers, null)
+        p = _field_patterns[field] = re.compile(rb'"' + re.escape(field.encode()) + rb'"\s*:\s*"?([^",}\s]*)')
+    return p
+
+
+def pick_columns(body: bytes, fields: Sequence[str]) -> Dict[str, List[bytes]]:
+    """
+    For a JSON array of flat objects: one column of raw values per field, in object
+    order (one C-level scan per field, nothing else is materialized). float() takes the
+    bytes as they are. Falls back to json.loads unless every field appears once per object.
+    """
+    cols = {f: _field_pattern(f).findall(body) for f in fields}
+    n = body.count(b"{")
+    if all(len(c) == n for c in cols.values()):
+        return cols
+    objs = json.loads(body)
+    return {f: [str(o.get(f)).encode() for o in objs] for f in fields}
@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+from metrics import METRICS, log_json
+from telegram_client import TelegramClient
+
+# report section separator (see build_report)
+SECTION = "—" * 28
+
+
+def split_message(text: str, max_len: int = 4096, sep: str = SECTION) -> List[str]:
+    """
+    Telegram-sized chunks cut at section separators; a section that is too long on
+    its own is cut at line breaks, and a single over-long line hard at max_len.
+    """
+    if len(text) <= max_len:
+        return [text]
+    lines = text.split("\n")
+    sections: List[List[str]] = [[]]
+    for line in lines:
+        if line == sep and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    pieces: List[str] = []
+    for sec in sections:
+        body = "\n".join(sec)
+        if len(body) <= max_len:
+            pieces.append(body)
+            continue
+        for line in sec:
+            while len(line) > max_len:
+                pieces.append(line[:max_len])
+                line = line[max_len:]
+            pieces.append(line)
+
+    chunks: List[str] = []
+    cur = ""
+    for p in pieces:
+        if cur and len(cur) + 1 + len(p) > max_len:
+            chunks.append(cur)
+            cur = p
+        else:
+            cur = f"{cur}\n{p}" if cur else p
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+class DeliveryQueue:
+    """
+    Fan-out of one report to many chats.
+    - one task per chat, so a slow or failing chat never holds up the others
+    - global pacing at global_rate msg/s across all chats (Telegram: ~30/s per bot)
+    - per-chat pacing: private chats 1 msg/s, groups/channels (negative ids, @names) 20 msg/min
+    - one report at a time per chat: profiles sharing a chat queue up instead of interleaving chunks
+    - 429 retry_after pauses that chat only; 5xx/transport errors retry with backoff;
+      other 4xx (blocked bot, bad chat id) drop the chat for this report
+    Pacing state lives on the queue, so keep one instance for the process.
+    """
+
+    def __init__(
+        self,
+        tg: TelegramClient,
+        global_rate: float = 30.0,
+        private_interval: float = 1.0,
+        group_interval: float = 3.0,
+        max_retries: int = 5,
+    ):
+        self.tg = tg
+        self.global_interval = 1.0 / global_rate
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+        self._next_global = 0.0
+        self._next_chat: Dict[str, float] = {}
+        self._chat_locks: Dict[str, asyncio.Lock] = {}
+        self._lock = asyncio.Lock()
+        self.pending: set = set()
+
+    async def _slot(self, chat_id: str) -> None:
+        """Wait for this chat's next slot, then reserve a global one (caller holds the chat's lock)."""
+        interval = self.group_interval if chat_id.startswith(("-", "@")) else self.private_interval
+        now = time.monotonic()
+        at = self._next_chat.get(chat_id, 0.0)
+        if at > now:
+            await asyncio.sleep(at - now)
+        async with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_global)
+            self._next_global = at + self.global_interval
+        if at > now:
+            await asyncio.sleep(at - now)
+        self._next_chat[chat_id] = time.monotonic() + interval
+
+    async def _send_chat(self, client: httpx.AsyncClient, chat_id: str, chunks: Sequence[str]) -> bool:
+        # _next_chat is read before and written after the sleeps in _slot: one sender per chat
+        async with self._chat_locks.setdefault(chat_id, asyncio.Lock()):
+            return await self._send_chunks(client, chat_id, chunks)
+
+    async def _send_chunks(self, client: httpx.AsyncClient, chat_id: str, chunks: Sequence[str]) -> bool:
+        for i, chunk in enumerate(chunks):
+            for attempt in range(self.max_retries + 1):
+                await self._slot(chat_id)
+                try:
+                    await self.tg.send_message(client, chat_id, chunk)
+                    break
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if status == 429:
+                        try:
+                            wait = float(e.response.json().get("parameters", {}).get("retry_after", 1))
+                        except Exception:
+                            wait = 1.0
+                        METRICS.inc("telegram_throttled_total")
+                        self._next_chat[chat_id] = time.monotonic() + wait
+                    elif status < 500:
+                        log_json("delivery_dropped", chat=chat_id, status=status, chunk=i, chunks=len(chunks))
+                        METRICS.inc("deliveries_total", outcome="rejected")
+                        return False
+                    else:
+                        await asyncio.sleep(random.uniform(0, min(30.0, 2 ** attempt)))
+                except httpx.TransportError:
+                    await asyncio.sleep(random.uniform(0, min(30.0, 2 ** attempt)))
+            else:
+                log_json("delivery_failed", chat=chat_id, chunk=i, chunks=len(chunks))
+                METRICS.inc("deliveries_total", outcome="failed")
+                return False
+        METRICS.inc("deliveries_total", outcome="ok")
+        return True
+
+    async def deliver(
+        self,
+        client: httpx.AsyncClient,
+        chat_ids: Sequence[str],
+        text: str,
+        wait_sec: Optional[float] = None,
+    ) -> Dict[str, Optional[bool]]:
+        """
+        Split `text` and send it to every chat in parallel. Returns per-chat outcome
+        (None: still in flight after wait_sec; it keeps going in the background).
+        """
+        chunks = split_message(text)
+        tasks = {chat: asyncio.create_task(self._send_chat(client, chat, chunks)) for chat in chat_ids}
+        for t in tasks.values():
+            self.pending.add(t)
+            t.add_done_callback(self.pending.discard)
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=wait_sec)
+        return {
+            chat: (None if not t.done() else t.exception() is None and t.result())
+            for chat, t in tasks.items()
+        }
@@ -1,4 +1,5 @@
-from typing import List, Optional
+import copy
+from typing import Dict, List, Optional, Sequence, Tuple
 
 def ema(values: List[float], period: int) -> Optional[float]:
     if len(values) < period or period <= 0:
@@ -34,3 +35,156 @@ def rsi(values: List[float], period: int = 14) -> Optional[float]:
         return 100.0
     rs = avg_gain / avg_loss
     return 100.0 - (100.0 / (1.0 + rs))
+
+
+class EMAState:
+    """Incremental EMA, same seeding (SMA of the first `period` values) and values as ema()."""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.n = 0
+        self.acc = 0  # running sum while warming up, EMA afterwards
+
+    def update(self, v: float) -> None:
+        if self.n < self.period:
+            self.acc += v
+            if self.n + 1 == self.period:
+                self.acc = self.acc / self.period
+        else:
+            self.acc = v * self.k + self.acc * (1 - self.k)
+        self.n += 1
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.period <= 0 or self.n < self.period:
+            return None
+        return self.acc
+
+    def peek(self, v: float) -> Optional[float]:
+        """Value after one more update with v, without changing the state."""
+        s = copy.copy(self)
+        s.update(v)
+        return s.value
+
+    def dump(self) -> list:
+        return [self.n, self.acc]
+
+    @classmethod
+    def load(cls, period: int, obj: list) -> "EMAState":
+        s = cls(period)
+        s.n, s.acc = int(obj[0]), obj[1]
+        return s
+
+
+class RSIState:
+    """Incremental Wilder RSI, same values as rsi()."""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.n = 0
+        self.prev: Optional[float] = None
+        self.avg_gain = 0.0  # running sums until the seed, Wilder averages afterwards
+        self.avg_loss = 0.0
+
+    def update(self, v: float) -> None:
+        if self.prev is not None:
+            d = v - self.prev
+            if self.n <= self.period:
+                if d >= 0:
+                    self.avg_gain += d
+                else:
+                    self.avg_loss += -d
+                if self.n == self.period:
+                    self.avg_gain = self.avg_gain / self.period
+                    self.avg_loss = self.avg_loss / self.period
+            else:
+                gain = max(d, 0.0)
+                loss = max(-d, 0.0)
+                self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+                self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        self.prev = v
+        self.n += 1
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.n < self.period + 1:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100.0 - (100.0 / (1.0 + rs))
+
+    def peek(self, v: float) -> Optional[float]:
+        s = copy.copy(self)
+        s.update(v)
+        return s.value
+
+    def dump(self) -> list:
+        return [self.n, self.prev, self.avg_gain, self.avg_loss]
+
+    @classmethod
+    def load(cls, period: int, obj: list) -> "RSIState":
+        s = cls(period)
+        s.n, s.prev, s.avg_gain, s.avg_loss = int(obj[0]), obj[1], obj[2], obj[3]
+        return s
+
+
+class IndicatorBook:
+    """
+    Per-symbol EMA/RSI state over closed 1h candles, advanced in O(1) per new candle.
+    The live candle is applied with peek() so it never enters the state.
+    Serialized as {symbol: [last_open_time, ema_state, rsi_state]}.
+    """
+
+    def __init__(self, ema_period: int = 50, rsi_period: int = 14):
+        self.ema_period = ema_period
+        self.rsi_period = rsi_period
+        self.books: Dict[str, Tuple[int, EMAState, RSIState]] = {}
+
+    def load(self, obj: Dict[str, list]) -> None:
+        self.books = {}
+        for sym, (t, e, r) in (obj or {}).items():
+            try:
+                self.books[sym] = (int(t), EMAState.load(self.ema_period, e), RSIState.load(self.rsi_period, r))
+            except Exception:
+                continue
+
+    def dump(self) -> Dict[str, list]:
+        return {sym: [t, e.dump(), r.dump()] for sym, (t, e, r) in self.books.items()}
+
+    def prune(self, symbols: List[str]) -> None:
+        keep = set(symbols)
+        self.books = {s: b for s, b in self.books.items() if s in keep}
+
+    def advance(self, symbol: str, rows: Sequence[Sequence[float]]) -> None:
+        """
+        rows: contiguous closed candles (open_time, close, ...), oldest first.
+        Applies the ones newer than the state; rebuilds from rows if they no longer
+        reach back to the state (first run, gap in the candle buffer).
+        """
+        if not rows:
+            return
+        b = self.books.get(symbol)
+        if b is None or b[0] < rows[0][0]:
+            t, e, r = -1, EMAState(self.ema_period), RSIState(self.rsi_period)
+        else:
+            t, e, r = b
+        i = len(rows)
+        while i > 0 and rows[i - 1][0] > t:
+            i -= 1
+        for row in rows[i:]:
+            e.update(row[1])
+            r.update(row[1])
+            t = row[0]
+        self.books[symbol] = (t, e, r)
+
+    def values(self, symbol: str, live_close: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+        """(ema, rsi) over the closed candles plus the live close if given."""
+        b = self.books.get(symbol)
+        if b is None:
+            return None, None
+        _, e, r = b
+        if live_close is None:
+            return e.value, r.value
+        return e.peek(live_close), r.peek(live_close)
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+HOUR_MS = 3_600_000
+
+# (openTime ms, close, volume)
+Candle = Tuple[int, float, float]
+
+
+def _parse_kline(x: List[Any]) -> Optional[Candle]:
+    # kline format:
+    # [ openTime, open, high, low, close, volume, closeTime, quoteVolume, trades, ...]
+    try:
+        return int(x[0]), float(x[4]), float(x[5])
+    except Exception:
+        return None
+
+
+def parse_klines(klines: List[List[Any]]) -> List[Candle]:
+    """Decoded klines response -> candles (malformed rows skipped)."""
+    return [c for c in (_parse_kline(x) for x in klines if x and len(x) > 5) if c is not None]
+
+
+class KlineCache:
+    """
+    Per-symbol 1h candle store.
+    - closed candles: ring buffer (maxlen), persisted to disk between runs
+    - live (currently open) candle: memory only, replaced every refresh
+    Each refresh fetches only the candles missing since the last closed one.
+    """
+
+    def __init__(self, path: str = "klines.json", maxlen: int = 200):
+        self.path = path
+        self.maxlen = maxlen
+        self.closed: Dict[str, List[Candle]] = {}
+        self.live: Dict[str, Candle] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+            for sym, rows in obj.get("symbols", {}).items():
+                self.closed[sym] = [(int(t), float(c), float(v)) for t, c, v in rows][-self.maxlen:]
+        except Exception:
+            self.closed = {}
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def save(self) -> None:
+        obj = {
+            "interval_ms": HOUR_MS,
+            "symbols": {sym: [list(r) for r in rows] for sym, rows in self.closed.items()},
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def prune(self, symbols: List[str]) -> None:
+        # drop delisted / no longer trading symbols
+        keep = set(symbols)
+        for sym in [s for s in self.closed if s not in keep]:
+            del self.closed[sym]
+        for sym in [s for s in self.live if s not in keep]:
+            del self.live[sym]
+
+    def missing(self, symbol: str, now_ms: Optional[int] = None) -> int:
+        """Number of closed candles not yet in the buffer."""
+        rows = self.closed.get(symbol)
+        if not rows:
+            return self.maxlen
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        cur_open = now_ms // HOUR_MS * HOUR_MS
+        n = (cur_open - rows[-1][0]) // HOUR_MS - 1
+        return int(min(max(n, 0), self.maxlen))
+
+    def merge(self, symbol: str, rows: List[Candle], reset: bool = False) -> bool:
+        """
+        Merge the candles of a klines response (oldest first, last row = live candle).
+        Returns False if the response does not connect to the buffer (gap).
+        """
+        if not rows:
+            return reset
+        closed, live = rows[:-1], rows[-1]
+
+        buf = [] if reset else self.closed.get(symbol, [])
+        if buf:
+            last_t = buf[-1][0]
+            new = [r for r in closed if r[0] > last_t]
+            expect = last_t + HOUR_MS
+            first_t = new[0][0] if new else live[0]
+            if first_t != expect and live[0] > last_t:
+                return False
+            buf = buf + new
+        else:
+            buf = list(closed)
+
+        self.closed[symbol] = buf[-self.maxlen:]
+        self.live[symbol] = live
+        return True
+
+    def close_candle(self, symbol: str, candle: Candle) -> bool:
+        """
+        Append one closed candle (stream ingest); the next hour's live candle starts
+        empty at its close, as a REST fetch right after the boundary would show it.
+        Returns False if it does not follow the buffer (gap), which is left as is.
+        """
+        buf = self.closed.get(symbol)
+        if not buf or candle[0] > buf[-1][0] + HOUR_MS:
+            return False
+        if candle[0] == buf[-1][0] + HOUR_MS:
+            buf.append(candle)
+            if len(buf) > self.maxlen:
+                del buf[0]
+        live = self.live.get(symbol)
+        if buf[-1][0] == candle[0] and (live is None or live[0] <= candle[0]):
+            self.live[symbol] = (candle[0] + HOUR_MS, candle[1], 0.0)
+        return True
+
+    async def refresh(
+        self,
+        symbol: str,
+        fetch: Callable[[str, int], Awaitable[List[Candle]]],
+        now_ms: Optional[int] = None,
+    ) -> None:
+        """fetch(symbol, limit) -> candles (see parse_klines). Falls back to a full refetch on gaps."""
+        need = self.missing(symbol, now_ms)
+        kl = await fetch(symbol, need + 1)
+        if not self.merge(symbol, kl):
+            kl = await fetch(symbol, self.maxlen + 1)
+            self.merge(symbol, kl, reset=True)
+
+    def window(self, symbol: str, n: int) -> Tuple[List[float], List[float]]:
+        """Last n (closes, volumes), live candle included as the last element."""
+        rows = self.closed.get(symbol, [])
+        live = self.live.get(symbol)
+        if live is not None:
+            rows = rows[-(n - 1):] + [live] if n > 1 else [live]
+        else:
+            rows = rows[-n:]
+        return [r[1] for r in rows], [r[2] for r in rows]
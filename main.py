@@ -1,27 +1,43 @@
 import os
+import sys
 
 
 import asyncio
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, List, Tuple
+from importlib import import_module
+from typing import Dict, Any, List, Optional
 import httpx
 from dotenv import load_dotenv
 
-from binance_client import BinanceFuturesClient
 from telegram_client import TelegramClient
 from openai_summarizer import OpenAISummarizer
-from indicators import ema, rsi
+from indicators import IndicatorBook
 from state_store import StateStore
+from series_store import SeriesStore, hour_ts
+from metrics import METRICS, log_json, serve_metrics
+from runtime import Runtime
+from alerts import AlertEngine, poll_market
+from oi_sweeper import OISweeper
+from commands import CommandServer
+from delivery import DeliveryQueue
+from kline_cache import HOUR_MS, Candle
+from profiles import ReportProfile, load_profiles, render, select, union_windows
+from shards import ShardPool
+from stream import StreamIngest, recorded_messages, websockets_available
+from snapshot import EMPTY_ROW, PREMIUM_FIELDS, TICKER_FIELDS, ScanSnapshot, join_snapshot
+from scan import WINDOWS, MarketScan, StreamingTopK, buckets_for, parse_windows, symbol_moves
 import time
 
-print("[debug] TELEGRAM_BOT_TOKEN exists?", "TELEGRAM_BOT_TOKEN" in os.environ)
-print("[debug] available env sample:", sorted([k for k in os.environ.keys() if "TELEGRAM" in k or "OPENAI" in k or "BINANCE" in k])[:50])
-print("[boot] starting main.py", flush=True)
-print("[boot] time:", time.strftime("%Y-%m-%d %H:%M:%S"), flush=True)
-print("[boot] env ok:", "TELEGRAM_BOT_TOKEN" in __import__("os").environ, flush=True)
-
 load_dotenv()
 
+def boot_log() -> None:
+    # only when run as a script: importing main (bench, one-shot wrappers) stays quiet
+    log_json(
+        "boot",
+        env_ok="TELEGRAM_BOT_TOKEN" in os.environ,
+        env_sample=sorted([k for k in os.environ.keys() if "TELEGRAM" in k or "OPENAI" in k or "BINANCE" in k])[:50],
+    )
+
 def kst_now(offset_hours: int = 9) -> datetime:
     return datetime.now(timezone(timedelta(hours=offset_hours)))
 
@@ -31,330 +47,640 @@ def clamp_text_telegram(text: str, max_len: int = 4096) -> str:
         return text
     return text[: max_len - 20] + "\n…(truncated)"
 
+def report_dropped(stage: str, errors: List[Exception], total: int) -> None:
+    """Count and log (one line per stage) items lost to exceptions."""
+    if not errors:
+        return
+    by_type: Dict[str, int] = {}
+    for e in errors:
+        by_type[type(e).__name__] = by_type.get(type(e).__name__, 0) + 1
+    for name, n in by_type.items():
+        METRICS.inc("dropped_symbols_total", n, stage=stage, error=name)
+    log_json("symbols_dropped", stage=stage, dropped=len(errors), total=total, errors=by_type, sample=repr(errors[0]))
+
 def safe_float(x, default=None):
     try:
         return float(x)
     except Exception:
         return default
 
-def pick_top_bottom(rows: List[Dict[str, Any]], key: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    rows2 = [r for r in rows if r.get(key) is not None]
-    rows2.sort(key=lambda r: r[key])
-    return rows2[-1], rows2[0]
-
-def ensure_unique(picks: List[Dict[str, Any]], ranked_lists: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+def telegram_chat_ids() -> List[str]:
+    """TELEGRAM_CHAT_IDS: comma-separated chats / channels; TELEGRAM_CHAT_ID alone still works."""
+    return [c.strip() for c in (os.getenv("TELEGRAM_CHAT_IDS") or os.getenv("TELEGRAM_CHAT_ID", "")).split(",") if c.strip()]
+
+def delivery_queue(rt: Runtime, tg: TelegramClient) -> DeliveryQueue:
+    """The process-wide DeliveryQueue (reports and alerts share its pacing)."""
+    if rt.delivery is None:
+        rt.delivery = DeliveryQueue(tg, global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")))
+    return rt.delivery
+
+def report_profiles() -> List[ReportProfile]:
+    """REPORT_PROFILES_PATH, or the REPORT_* env as the single "default" profile; ValueError if unusable."""
+    TELEGRAM_CHAT_IDS = telegram_chat_ids()
+    REPORT_WINDOWS = parse_windows(os.getenv("REPORT_WINDOWS", "12H,24H"))
+    # optional compact sections from the universe snapshot, e.g. "funding,basis"
+    REPORT_EXTREMES = [x.strip().lower() for x in os.getenv("REPORT_EXTREMES", "").split(",") if x.strip()]
+    EXTREMES_TOP_N = int(os.getenv("EXTREMES_TOP_N", "3"))
+    REPORT_TOP_N = int(os.getenv("REPORT_TOP_N", "1"))
+    REPORT_MIN_QUOTE_VOL = float(os.getenv("REPORT_MIN_QUOTE_VOL", "0"))
+
+    profiles = load_profiles(
+        os.getenv("REPORT_PROFILES_PATH", "profiles.json"),
+        ReportProfile(
+            "default",
+            REPORT_WINDOWS,
+            TELEGRAM_CHAT_IDS,
+            top_n=REPORT_TOP_N,
+            min_quote_vol=REPORT_MIN_QUOTE_VOL,
+            extremes=REPORT_EXTREMES,
+            extremes_top_n=EXTREMES_TOP_N,
+        ),
+    )
+    if not all(p.chat_ids for p in profiles):
+        raise ValueError("no report chats: set TELEGRAM_CHAT_ID(S) or the profile's chats")
+    return profiles
+
+async def build_report(runtime: Optional[Runtime] = None, scheduled: bool = False) -> Dict[str, str]:
     """
-    picks: initial picks (may contain duplicates by symbol)
-    ranked_lists: {name: sorted desc/asc lists we can draw replacements from}
+    One market snapshot per cycle (symbols, bulk ticker/premiumIndex, klines scan),
+    rendered into every report profile (REPORT_PROFILES_PATH, or the REPORT_* env as
+    a single profile). Symbols picked by several profiles are enriched and summarized
+    once. runtime: long-lived pool/caches from run_loop; a throwaway one is created (and
+    closed) if omitted. scheduled: started by the hourly scheduler at a candle close,
+    the only cycles whose delivery lag is measured. Returns {profile name: text}.
     """
-    used = set()
-    out = []
-    for p in picks:
-        sym = p["symbol"]
-        if sym not in used:
-            out.append(p)
-            used.add(sym)
-        else:
-            # replace using the relevant ranked list if provided
-            # fallback: find next best from all lists
-            replaced = None
-            for _, lst in ranked_lists.items():
-                for cand in lst:
-                    if cand["symbol"] not in used:
-                        replaced = cand
-                        break
-                if replaced:
-                    break
-            if replaced:
-                out.append(replaced)
-                used.add(replaced["symbol"])
-            else:
-                # keep duplicate if nothing else
-                out.append(p)
-    return out
-
-async def build_report() -> str:
     # env
-    BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "https://fapi.binance.com")
     TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-    TELEGRAM_CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]
-    OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
+    DELIVERY_WAIT_SEC = float(os.getenv("DELIVERY_WAIT_SEC", "60"))
+    # "rules": rule-based reasons only; the OpenAI client is never imported or created
+    REASONS_MODE = os.getenv("REASONS_MODE", "ai").strip().lower()
+    OPENAI_API_KEY = os.environ["OPENAI_API_KEY"] if REASONS_MODE != "rules" else None
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")
+    OPENAI_DEADLINE_SEC = float(os.getenv("OPENAI_DEADLINE_SEC", "20"))
 
-    CONCURRENCY = int(os.getenv("CONCURRENCY", "20"))
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "12"))
     KST_OFFSET_HOURS = int(os.getenv("KST_OFFSET_HOURS", "9"))
-
-    b = BinanceFuturesClient(BINANCE_BASE_URL, timeout_sec=REQUEST_TIMEOUT)
+    SCAN_DEADLINE_SEC = float(os.getenv("SCAN_DEADLINE_SEC", "60"))
+    SPECULATE_AFTER = float(os.getenv("SPECULATE_AFTER", "0.5"))  # fraction of symbols scanned
+    # stream mode: how long to wait for the boundary candle closes before backfilling via REST
+    STREAM_CLOSE_WAIT_SEC = float(os.getenv("STREAM_CLOSE_WAIT_SEC", "10"))
+    # >1: the klines scan runs in that many worker processes (large universes)
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "1"))
+    # sweeper values older than this count as missing; only missing picks are fetched on the hot path
+    OI_MAX_AGE_SEC = float(os.getenv("OI_MAX_AGE_SEC", "900"))
+
+    rt = runtime or Runtime()
+    profiles = rt.profiles or report_profiles()
+    # the scan covers every window of every profile
+    windows = union_windows(profiles)
+    buckets = buckets_for(windows)
+    depth = MarketScan.depth(windows)
+
+    b = rt.binance
+    kline_cache = rt.kline_cache
     tg = TelegramClient(TELEGRAM_BOT_TOKEN, timeout_sec=REQUEST_TIMEOUT)
-    summarizer = OpenAISummarizer(OPENAI_API_KEY, OPENAI_MODEL)
     store = StateStore("state.json")
     state = store.load()
-
-    sem = asyncio.Semaphore(CONCURRENCY)
-
-    async def with_sem(coro):
-        async with sem:
-            return await coro
-
-    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-        ex = await b.exchange_info(client)
-        symbols = []
-        for s in ex.get("symbols", []):
-            # USDT-margined perpetuals
-            if s.get("quoteAsset") == "USDT" and s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING":
-                symbols.append(s["symbol"])
-
-        tickers = await b.ticker_24hr_all(client)
-        ticker_map: Dict[str, Dict[str, Any]] = {t["symbol"]: t for t in tickers if t.get("symbol")}
-
-        async def compute_symbol_moves(symbol: str) -> Dict[str, Any]:
-            kl = await with_sem(b.klines_1h(client, symbol=symbol, limit=25))
-            # kline format:
-            # [ openTime, open, high, low, close, volume, closeTime, quoteVolume, trades, ...]
-            closes = [safe_float(x[4]) for x in kl if x and len(x) > 4]
-            vols = [safe_float(x[5]) for x in kl if x and len(x) > 5]
-
-            if len(closes) < 25:
-                return {"symbol": symbol, "ret12": None, "ret24": None, "vol_ratio": None}
-
-            last = closes[-1]
-            c12 = closes[-13]
-            c24 = closes[-25]
-
-            ret12 = (last / c12 - 1.0) * 100.0 if (c12 and last) else None
-            ret24 = (last / c24 - 1.0) * 100.0 if (c24 and last) else None
-
-            # volume ratio: last hour vol vs mean of previous 12 hours
-            vol_ratio = None
-            if len(vols) >= 13 and vols[-1] is not None:
-                base = [v for v in vols[-13:-1] if v is not None]
-                if base:
-                    avg = sum(base) / len(base)
-                    if avg > 0:
-                        vol_ratio = vols[-1] / avg
-
-            return {"symbol": symbol, "ret12": ret12, "ret24": ret24, "vol_ratio": vol_ratio, "price": last}
-
-        # compute returns for all symbols (1h klines, limit 25)
-        tasks = [asyncio.create_task(compute_symbol_moves(sym)) for sym in symbols]
-        moves = []
-        for fut in asyncio.as_completed(tasks):
-            try:
-                moves.append(await fut)
-            except Exception:
-                pass
-
-        # rank lists for replacement
-        moves_ret12_desc = sorted([m for m in moves if m.get("ret12") is not None], key=lambda x: x["ret12"], reverse=True)
-        moves_ret12_asc  = sorted([m for m in moves if m.get("ret12") is not None], key=lambda x: x["ret12"])
-        moves_ret24_desc = sorted([m for m in moves if m.get("ret24") is not None], key=lambda x: x["ret24"], reverse=True)
-        moves_ret24_asc  = sorted([m for m in moves if m.get("ret24") is not None], key=lambda x: x["ret24"])
-
-        top12 = moves_ret12_desc[0]
-        bot12 = moves_ret12_asc[0]
-        top24 = moves_ret24_desc[0]
-        bot24 = moves_ret24_asc[0]
-
-        picks = [
-            {**top12, "bucket": "12H_UP"},
-            {**bot12, "bucket": "12H_DOWN"},
-            {**top24, "bucket": "24H_UP"},
-            {**bot24, "bucket": "24H_DOWN"},
-        ]
-
-        picks = ensure_unique(
-            picks,
-            ranked_lists={
-                "ret12_desc": moves_ret12_desc,
-                "ret12_asc": moves_ret12_asc,
-                "ret24_desc": moves_ret24_desc,
-                "ret24_asc": moves_ret24_asc,
-            },
-        )
-
-        # enrich selected 4 symbols
-        async def enrich(p: Dict[str, Any]) -> Dict[str, Any]:
-            sym = p["symbol"]
-            t = ticker_map.get(sym, {})
-
-            # 1h klines for indicators (RSI, EMA50)
-            kl = await with_sem(b.klines_1h(client, symbol=sym, limit=200))
-            closes = [safe_float(x[4]) for x in kl if x and len(x) > 4]
-            price = safe_float(t.get("lastPrice")) or (closes[-1] if closes else p.get("price"))
-
-            ema50 = ema([c for c in closes if c is not None], 50) if closes else None
-            rsi14 = rsi([c for c in closes if c is not None], 14) if closes else None
-
-            oi_obj = await with_sem(b.open_interest(client, sym))
-            oi = safe_float(oi_obj.get("openInterest"))
-
-            prem = await with_sem(b.premium_index(client, sym))
-            funding = safe_float(prem.get("lastFundingRate"))
-            mark_price = safe_float(prem.get("markPrice"))
-
-            prev_oi = store.get_prev_oi(state, sym)
-            oi_chg_pct = None
-            if oi is not None and prev_oi is not None and prev_oi > 0:
-                oi_chg_pct = (oi / prev_oi - 1.0) * 100.0
-
-            # update state (save later)
-            if oi is not None:
-                store.set_oi(state, sym, oi)
-
-            quote_vol = safe_float(t.get("quoteVolume"))
-            pct_24hr_ticker = safe_float(t.get("priceChangePercent"))
-
-            return {
-                **p,
-                "price": price,
-                "quote_vol": quote_vol,
-                "ticker_24h_pct": pct_24hr_ticker,
-                "ema50": ema50,
-                "rsi": rsi14,
-                "oi": oi,
-                "oi_chg_pct": oi_chg_pct,
-                "funding": funding,
-                "mark_price": mark_price,
+    ts_now = hour_ts()
+    # a healthy stream already holds the snapshot and the candles: no REST on the hot path
+    stream = rt.stream if rt.stream is not None and rt.stream.healthy() else None
+    if rt.shards is None and SCAN_WORKERS > 1:
+        rt.shards = ShardPool(SCAN_WORKERS)
+    # sharded: the workers hold the candles and indicator state; the local cache stays unused
+    shards = rt.shards if stream is None else None
+    # once the sweeper covers (nearly) the whole universe, OI comes from memory
+    sweeper = rt.oi_sweeper if rt.oi_sweeper is not None and rt.oi_sweeper.ready() else None
+    # the OpenAI SDK import overlaps the Binance fetches instead of delaying the first request
+    openai_ready = asyncio.ensure_future(asyncio.to_thread(import_module, "openai")) if OPENAI_API_KEY else None
+    # the kline cache file is parsed in a thread while the first requests are in flight
+    cache_ready = asyncio.ensure_future(asyncio.to_thread(kline_cache.ensure_loaded)) if shards is None else None
+    book = IndicatorBook(ema_period=50, rsi_period=14)
+    book.load(state.get("ind", {}))
+
+    series = SeriesStore(
+        os.getenv("SERIES_DB_PATH", "market.db"),
+        retention_days=int(os.getenv("SERIES_RETENTION_DAYS", "30")),
+    )
+    try:
+        async with rt.session() as client:
+            with METRICS.span("stage_seconds", stage="exchange_info"):
+                # cached between cycles, refreshed by the pre-warm phase
+                symbols = await rt.get_symbols(client)
+
+            # bulk ticker + premiumIndex: price, volume, funding, mark/index for the whole universe
+            with METRICS.span("stage_seconds", stage="ticker"):
+                if stream is not None:
+                    market, market_at, snapshot_errors = stream.market_snapshot(), stream.market_at, []
+                else:
+                    # only the fields join_snapshot reads are decoded from the response bytes
+                    tickers, premiums = await asyncio.gather(
+                        b.ticker_24hr_columns(client, TICKER_FIELDS),
+                        b.premium_index_columns(client, PREMIUM_FIELDS),
+                        return_exceptions=True,
+                    )
+                    # either half missing: the report goes out without those columns
+                    snapshot_errors = [x for x in (tickers, premiums) if isinstance(x, Exception)]
+                    report_dropped("snapshot", snapshot_errors, 2)
+                    market = join_snapshot(
+                        {} if isinstance(tickers, Exception) else tickers,
+                        {} if isinstance(premiums, Exception) else premiums,
+                    )
+                    market_at = time.time()
+                series.record(
+                    (sym, ts_now, None, r.funding, r.mark)
+                    for sym, r in market.items()
+                    if r.funding is not None or r.mark is not None
+                )
+                if rt.oi_sweeper is not None:
+                    rt.oi_sweeper.set_priority(market)
+                if sweeper is not None:
+                    # hourly OI history for the whole universe, so change_pct works for any pick
+                    series.record((sym, ts_now, oi, None, None) for sym, oi in sweeper.values(OI_MAX_AGE_SEC).items())
+
+            if cache_ready is not None:
+                await cache_ready
+            kline_cache.prune(symbols)
+            book.prune(symbols)
+            streamed = set()
+            if stream is not None:
+                with METRICS.span("stage_seconds", stage="stream_wait"):
+                    late = await stream.wait_closed(symbols, ts_now - HOUR_MS, STREAM_CLOSE_WAIT_SEC)
+                # symbols whose boundary candle did not arrive in time go through REST below
+                streamed = set(symbols) - set(late)
+                METRICS.set("stream_covered_symbols", len(streamed))
+
+            async def fetch_klines(symbol: str, limit: int) -> List[Candle]:
+                return await b.candles_1h(client, symbol=symbol, limit=limit)
+
+            async def refresh_symbol(symbol: str) -> str:
+                # only candles closed since the last run are fetched; the rest come from the cache
+                if symbol not in streamed:
+                    await kline_cache.refresh(symbol, fetch_klines)
+                # EMA50/RSI14 state for the whole universe, O(1) per newly closed candle
+                book.advance(symbol, kline_cache.closed.get(symbol, []))
+                return symbol
+
+            async def fetch_oi(sym: str) -> Optional[float]:
+                oi_obj = await b.open_interest(client, sym)
+                oi = safe_float(oi_obj.get("openInterest"))
+
+                # hourly history
+                series.record([(sym, ts_now, oi, None, None)])
+                return oi
+
+            # OI fetches started speculatively for the current leaders while the scan runs
+            oi_tasks: Dict[str, asyncio.Task] = {}
+            leaders = StreamingTopK(buckets)
+
+            def speculate() -> None:
+                want = set(leaders.leaders())
+                for sym in [s for s, t in oi_tasks.items() if s not in want and not t.done()]:
+                    oi_tasks.pop(sym).cancel()
+                    METRICS.inc("speculative_enrich_total", outcome="cancelled")
+                for sym in want - oi_tasks.keys():
+                    t = asyncio.create_task(fetch_oi(sym))
+                    # a guess that is dropped later is never awaited: retrieve its error here
+                    t.add_done_callback(lambda t: t.cancelled() or t.exception())
+                    oi_tasks[sym] = t
+                    METRICS.inc("speculative_enrich_total", outcome="started")
+
+            # refresh 1h klines for all symbols (one shared buffer feeds every window);
+            # stragglers past SCAN_DEADLINE_SEC are cut off
+            with METRICS.span("stage_seconds", stage="klines_scan"):
+                scanned = []
+                scan_errors: List[Exception] = []
+                pending = set()
+                if shards is not None:
+                    # every window, so the merged scan also serves /top; no speculative OI (nothing streams back)
+                    scan, scan_errors = await shards.scan(symbols, list(WINDOWS.values()), SCAN_DEADLINE_SEC)
+                    scanned = scan.symbols
+                else:
+                    pending = {asyncio.create_task(refresh_symbol(sym)) for sym in symbols}
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + SCAN_DEADLINE_SEC
+                while pending:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    changed = False
+                    for fut in done:
+                        try:
+                            sym = fut.result()
+                        except Exception as e:
+                            scan_errors.append(e)
+                            continue
+                        scanned.append(sym)
+                        closes, vols = kline_cache.window(sym, depth)
+                        changed = leaders.offer(symbol_moves(sym, closes, vols, windows)) or changed
+                    if changed and sweeper is None and leaders.seen >= SPECULATE_AFTER * len(symbols):
+                        speculate()
+                for fut in pending:
+                    fut.cancel()
+                    scan_errors.append(asyncio.TimeoutError("scan deadline"))
+            report_dropped("scan", scan_errors, len(symbols))
+            METRICS.set("universe_symbols", len(symbols))
+            METRICS.set("scanned_symbols", len(scanned))
+            coverage = len(scanned) / len(symbols) if symbols else 0.0
+            METRICS.set("report_coverage_ratio", coverage)
+
+            # columnar window returns/vol ratios over the whole universe, then each profile's picks
+            with METRICS.span("stage_seconds", stage="select"):
+                if shards is None:
+                    scan = MarketScan.from_cache(scanned, kline_cache, windows)
+                picks = {prof.name: select(prof, scan, market) for prof in profiles}
+            # published for /coin and /top between reports
+            if shards is None:
+                rt.snapshot = ScanSnapshot(scanned, market, kline_cache, book, ts=market_at)
+            else:
+                rt.snapshot = ScanSnapshot(scanned, market, None, ts=market_at, scan=scan)
+
+            # enrich each picked symbol once across profiles, reusing speculative fetches when they guessed right
+            first_pick: Dict[str, Dict[str, Any]] = {}
+            for prof in profiles:
+                for p in picks[prof.name]:
+                    first_pick.setdefault(p["symbol"], p)
+            final = set(first_pick)
+            for sym in list(oi_tasks):
+                if sym not in final:
+                    t = oi_tasks.pop(sym)
+                    if not t.done():
+                        t.cancel()
+                    METRICS.inc("speculative_enrich_total", outcome="wasted")
+            for sym in final:
+                if sym in oi_tasks:
+                    METRICS.inc("speculative_enrich_total", outcome="reused")
+                elif sweeper is None or sweeper.get(sym, OI_MAX_AGE_SEC) is None:
+                    # without a sweeper value (failing or not yet swept symbol) the pick is fetched as before
+                    oi_tasks[sym] = asyncio.create_task(fetch_oi(sym))
+
+            oi_errors: List[Exception] = []
+
+            async def enrich(p: Dict[str, Any]) -> Dict[str, Any]:
+                """Symbol-level fields only; each profile merges them into its own pick rows."""
+                sym = p["symbol"]
+                m = market.get(sym, EMPTY_ROW)
+
+                # indicators (RSI, EMA50) from the streaming state, live candle applied on top
+                live = kline_cache.live.get(sym)
+                live_close = live[1] if live else None
+                price = m.last_price or live_close or p.get("price")
+                if shards is None:
+                    ema50, rsi14 = book.values(sym, live_close)
+                else:
+                    # computed by the symbol's shard
+                    ema50, rsi14 = p.get("ema50"), p.get("rsi")
+
+                if sym not in oi_tasks:
+                    # refreshed in the background: no request on the critical path
+                    oi = sweeper.get(sym, OI_MAX_AGE_SEC)
+                else:
+                    try:
+                        oi = await oi_tasks[sym]
+                    except Exception as e:
+                        # the pick stays in the report, just without open interest
+                        oi_errors.append(e)
+                        oi = None
+                # OI change vs 1h/12h/24h ago
+                oi_chg = {h: series.change_pct(sym, "oi", h, ts_now) for h in (1, 12, 24)}
+
+                return {
+                    "symbol": sym,
+                    "price": price,
+                    "quote_vol": m.quote_vol,
+                    "ticker_24h_pct": m.pct_24h,
+                    "ema50": ema50,
+                    "rsi": rsi14,
+                    "oi": oi,
+                    "oi_chg_pct": oi_chg[1],
+                    "oi_chg_12h_pct": oi_chg[12],
+                    "oi_chg_24h_pct": oi_chg[24],
+                    "funding": m.funding,
+                    "mark_price": m.mark,
+                    "basis_pct": m.basis_pct,
+                }
+
+            with METRICS.span("stage_seconds", stage="enrich"):
+                enriched: Dict[str, Dict[str, Any]] = {}
+                enrich_errors: List[Exception] = []
+                for fut in asyncio.as_completed([asyncio.create_task(enrich(p)) for p in first_pick.values()]):
+                    try:
+                        e_row = await fut
+                        enriched[e_row["symbol"]] = e_row
+                    except Exception as e:
+                        enrich_errors.append(e)
+            report_dropped("enrich", enrich_errors, len(first_pick))
+            report_dropped("oi", oi_errors, len(first_pick))
+            METRICS.set("enriched_symbols", len(enriched))
+            # a pick whose enrichment failed is left out of its report, as before
+            items = {
+                prof.name: [{**p, **enriched[p["symbol"]]} for p in picks[prof.name] if p["symbol"] in enriched]
+                for prof in profiles
             }
 
-        enriched = []
-        for fut in asyncio.as_completed([asyncio.create_task(enrich(p)) for p in picks]):
-            try:
-                enriched.append(await fut)
-            except Exception:
-                pass
-
-        # stable ordering in final message
-        order = {"12H_UP": 0, "12H_DOWN": 1, "24H_UP": 2, "24H_DOWN": 3}
-        enriched.sort(key=lambda x: order.get(x.get("bucket", ""), 99))
-
-        # OpenAI short reasons (1 call)
-        # Keep prompt minimal → cheap, less hallucination surface
-        ai_input = []
-        for it in enriched:
-            ai_input.append({
-                "symbol": it["symbol"],
-                "bucket": it["bucket"],
-                "ret12": it.get("ret12"),
-                "ret24": it.get("ret24"),
-                "vol_ratio": it.get("vol_ratio"),
-                "quote_vol": it.get("quote_vol"),
-                "oi": it.get("oi"),
-                "oi_chg_pct": it.get("oi_chg_pct"),
-                "funding": it.get("funding"),
-                "rsi": it.get("rsi"),
-                "price_vs_ema50": (None if (it.get("price") is None or it.get("ema50") is None) else (it["price"] - it["ema50"])),
-            })
-
-        reasons_map = summarizer.summarize(ai_input)
-
-        # build telegram text
-        now = kst_now(KST_OFFSET_HOURS)
-        header = f"📊 Binance USDT 선물 변동 리포트\n(KST {now:%Y-%m-%d %H:%M})\n"
-        lines = [header]
-
-        def fmt_pct(x):
-            return "NA" if x is None else f"{x:+.2f}%"
-
-        def fmt_num(x):
-            if x is None:
-                return "NA"
-            # large numbers compact
-            if x >= 1e9:
-                return f"{x/1e9:.2f}B"
-            if x >= 1e6:
-                return f"{x/1e6:.2f}M"
-            if x >= 1e3:
-                return f"{x/1e3:.2f}K"
-            return f"{x:.2f}"
-
-        # sections
-        bucket_titles = {
-            "12H_UP": "⏱ 12H (최근 12시간)",
-            "12H_DOWN": "⏱ 12H (최근 12시간)",
-            "24H_UP": "🗓 1D (최근 24시간)",
-            "24H_DOWN": "🗓 1D (최근 24시간)",
-        }
-
-        # group by top header
-        lines.append("—" * 28)
-        lines.append("⏱ 12H (최근 12시간)")
-        for it in enriched:
-            if it["bucket"] not in ("12H_UP", "12H_DOWN"):
+            # OpenAI short reasons (1 call for the symbols of all profiles)
+            # Keep prompt minimal → cheap, less hallucination surface
+            ai_input = []
+            for sym, p in first_pick.items():
+                if sym not in enriched:
+                    continue
+                it = {**p, **enriched[sym]}
+                ai_input.append({
+                    "symbol": it["symbol"],
+                    "bucket": it["bucket"],
+                    **{f"ret{w.hours}": it.get(f"ret{w.hours}") for w in windows},
+                    "vol_ratio": it.get("vol_ratio"),
+                    "quote_vol": it.get("quote_vol"),
+                    "oi": it.get("oi"),
+                    "oi_chg_pct": it.get("oi_chg_pct"),
+                    "funding": it.get("funding"),
+                    "rsi": it.get("rsi"),
+                    "price_vs_ema50": (None if (it.get("price") is None or it.get("ema50") is None) else (it["price"] - it["ema50"])),
+                })
+
+            # bounded by OPENAI_DEADLINE_SEC; rule-based reasons otherwise
+            summarizer = None
+            if openai_ready is not None:
+                await openai_ready
+                if rt.summarizer is None:
+                    # built once per Runtime: its connection pool is reused across cycles and closed with rt
+                    rt.summarizer = OpenAISummarizer(
+                        OPENAI_API_KEY,
+                        OPENAI_MODEL,
+                        deadline_sec=OPENAI_DEADLINE_SEC,
+                        http_client=(httpx.AsyncClient(transport=rt.transport) if rt.transport is not None else None),
+                    )
+                summarizer = rt.summarizer
+                # the response cache lives in state.json, which is reloaded every cycle
+                summarizer.cache = state.setdefault("ai_cache", {})
+            with METRICS.span("stage_seconds", stage="summarize"):
+                if summarizer is None:
+                    reasons_map = OpenAISummarizer.fallback(ai_input)
+                else:
+                    reasons_map = await summarizer.summarize(ai_input)
+            if summarizer is not None:
+                st = summarizer.stats
+                METRICS.inc("openai_cache_hits_total", st["cache_hits"])
+                METRICS.inc("openai_cache_misses_total", st["cache_misses"])
+                METRICS.inc("openai_timeouts_total", st["timeouts"])
+                METRICS.inc("openai_errors_total", st["errors"])
+                hit_rate = summarizer.hit_rate()
+                if hit_rate is not None:
+                    METRICS.set("summary_cache_hit_ratio", hit_rate)
+                if st["latency_ms"] is not None:
+                    METRICS.observe("openai_request_seconds", st["latency_ms"] / 1000.0)
+
+            # build telegram text, one per profile
+            now = kst_now(KST_OFFSET_HOURS)
+            warnings = []
+            # partial report: whatever was computed goes out, with its coverage
+            if len(scanned) < len(symbols):
+                warnings.append(f"⚠️ 부분 리포트: {len(scanned)}/{len(symbols)} 심볼")
+            if snapshot_errors:
+                warnings.append("⚠️ 시세/펀딩 스냅샷 일부 누락")
+            with METRICS.span("stage_seconds", stage="render"):
+                # long reports are split at section boundaries on delivery, not truncated
+                texts = {
+                    prof.name: render(prof, items[prof.name], reasons_map, market, scanned, warnings, now)
+                    for prof in profiles
+                }
+
+            # persist state
+            with METRICS.span("stage_seconds", stage="persist"):
+                state["ind"] = book.dump()
+                store.save(state)
+                if shards is None:
+                    kline_cache.save()
+                series.compact()
+
+            # send
+            delivery = delivery_queue(rt, tg)
+            with METRICS.span("stage_seconds", stage="send"):
+                # with a persistent pool, chats still sending after DELIVERY_WAIT_SEC finish in the background
+                outcomes = await asyncio.gather(*[
+                    delivery.deliver(
+                        client, prof.chat_ids, texts[prof.name], wait_sec=DELIVERY_WAIT_SEC if rt.client is not None else None
+                    )
+                    for prof in profiles
+                ])
+            failed_all = True
+            for prof, outcome in zip(profiles, outcomes):
+                failed = [c for c, ok in outcome.items() if ok is False]
+                failed_all = failed_all and len(failed) == len(outcome)
+                log_json(
+                    "report_delivered",
+                    profile=prof.name,
+                    chats=len(outcome),
+                    failed=failed,
+                    pending=[c for c, ok in outcome.items() if ok is None],
+                )
+            if failed_all:
+                raise RuntimeError("report delivery failed for every chat")
+            if scheduled:
+                # candle close -> message delivered; startup and one-shot runs start mid-hour
+                METRICS.observe("report_delivery_lag_seconds", time.time() - ts_now / 1000.0)
+            return texts
+    finally:
+        series.close()
+        if runtime is None:
+            await rt.close()
+
+async def run_cycle(rt: Runtime, label: str) -> bool:
+    if rt.lock.locked():
+        # previous cycle still running: never overlap, skip this boundary
+        METRICS.inc("cycles_skipped_total", reason="overlap")
+        log_json("cycle_skipped", cycle=label, reason="previous cycle still running")
+        return False
+    async with rt.lock:
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            await build_report(rt, scheduled=label == "scheduled")
+        except Exception as e:
+            ok = False
+            METRICS.inc("report_failures_total", error=type(e).__name__)
+            log_json("report_failed", cycle=label, error=repr(e))
+        elapsed = time.perf_counter() - t0
+        METRICS.observe("report_seconds", elapsed)
+        METRICS.set("report_last_success", 1 if ok else 0)
+        log_json("cycle", cycle=label, ok=ok, elapsed_ms=round(elapsed * 1000.0, 1), **METRICS.end_cycle())
+        return ok
+
+async def alert_loop(rt: Runtime) -> None:
+    """Intra-hour alerts next to the hourly report (ALERTS=1); bulk endpoints only."""
+    TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
+    # ALERT_CHAT_ID: comma-separated; by default alerts go to every report chat
+    ALERT_CHAT_IDS = [c.strip() for c in os.getenv("ALERT_CHAT_ID", "").split(",") if c.strip()] or telegram_chat_ids()
+    if not ALERT_CHAT_IDS:
+        raise ValueError("no alert chats: set ALERT_CHAT_ID or TELEGRAM_CHAT_ID(S)")
+    KST_OFFSET_HOURS = int(os.getenv("KST_OFFSET_HOURS", "9"))
+    ALERT_INTERVAL_SEC = float(os.getenv("ALERT_INTERVAL_SEC", "15"))
+
+    engine = AlertEngine(
+        interval_sec=ALERT_INTERVAL_SEC,
+        window_sec=float(os.getenv("ALERT_WINDOW_SEC", "300")),
+        ret_pct=float(os.getenv("ALERT_RET_PCT", "3")),
+        vol_ratio=float(os.getenv("ALERT_VOL_RATIO", "5")),
+        oi_pct=float(os.getenv("ALERT_OI_PCT", "5")),
+        funding_abs=float(os.getenv("ALERT_FUNDING_ABS", "0.001")),
+        min_quote_vol=float(os.getenv("ALERT_MIN_QUOTE_VOL", "1000000")),
+        cooldown_sec=float(os.getenv("ALERT_COOLDOWN_SEC", "1800")),
+    )
+    tg = TelegramClient(TELEGRAM_BOT_TOKEN, timeout_sec=rt.request_timeout)
+    delivery = delivery_queue(rt, tg)
+
+    async with rt.session() as client:
+        async for ts_ms, market, event_ms in poll_market(rt.binance, client, ALERT_INTERVAL_SEC):
+            with METRICS.span("stage_seconds", stage="alert_eval"):
+                oi = None
+                if rt.oi_sweeper is not None:
+                    rt.oi_sweeper.set_priority(market)
+                    oi = rt.oi_sweeper.values(engine.window_sec)
+                alerts = engine.update(ts_ms, market, event_ms, oi=oi)
+            if not alerts:
                 continue
-            emoji = "🟢" if it["bucket"] == "12H_UP" else "🔴"
-            sym = it["symbol"]
-            r = reasons_map.get(sym, ["", ""])
-            r1 = r[0] if len(r) > 0 else ""
-            r2 = r[1] if len(r) > 1 else ""
-            line1 = (
-                f"{emoji} {sym}  12H {fmt_pct(it.get('ret12'))} | 24H {fmt_pct(it.get('ret24'))}\n"
-                f"   가격 {fmt_num(it.get('price'))} | RSI {('NA' if it.get('rsi') is None else f'{it['rsi']:.1f}')}"
-                f" | 펀딩 {('NA' if it.get('funding') is None else f'{it['funding']:+.5f}')}\n"
-                f"   OI {fmt_num(it.get('oi'))} ({('NA' if it.get('oi_chg_pct') is None else f'{it['oi_chg_pct']:+.1f}%')})"
-                f" | 거래량배수 {('NA' if it.get('vol_ratio') is None else f'{it['vol_ratio']:.2f}x')}\n"
-                f"   - {r1}\n"
-                f"   - {r2}"
+            now = kst_now(KST_OFFSET_HOURS)
+            text = clamp_text_telegram(
+                "\n".join([f"⚡ 실시간 알림 (KST {now:%H:%M:%S})"] + [a.text for a in alerts]), 4096
             )
-            lines.append(line1)
-
-        lines.append("—" * 28)
-        lines.append("🗓 1D (최근 24시간)")
-        for it in enriched:
-            if it["bucket"] not in ("24H_UP", "24H_DOWN"):
+            outcome = await delivery.deliver(client, ALERT_CHAT_IDS, text)
+            failed = [c for c, ok in outcome.items() if not ok]
+            if failed:
+                METRICS.inc("alert_send_failures_total", len(failed))
+                log_json("alert_send_failed", chats=failed, alerts=len(alerts))
+            if len(failed) == len(outcome):
                 continue
-            emoji = "🟢" if it["bucket"] == "24H_UP" else "🔴"
-            sym = it["symbol"]
-            r = reasons_map.get(sym, ["", ""])
-            r1 = r[0] if len(r) > 0 else ""
-            r2 = r[1] if len(r) > 1 else ""
-            line1 = (
-                f"{emoji} {sym}  24H {fmt_pct(it.get('ret24'))} | 12H {fmt_pct(it.get('ret12'))}\n"
-                f"   가격 {fmt_num(it.get('price'))} | RSI {('NA' if it.get('rsi') is None else f'{it['rsi']:.1f}')}"
-                f" | 펀딩 {('NA' if it.get('funding') is None else f'{it['funding']:+.5f}')}\n"
-                f"   OI {fmt_num(it.get('oi'))} ({('NA' if it.get('oi_chg_pct') is None else f'{it['oi_chg_pct']:+.1f}%')})"
-                f" | 거래량배수 {('NA' if it.get('vol_ratio') is None else f'{it['vol_ratio']:.2f}x')}\n"
-                f"   - {r1}\n"
-                f"   - {r2}"
-            )
-            lines.append(line1)
-
-        text = "\n".join(lines)
-        text = clamp_text_telegram(text, 4096)
-
-        # persist state
-        store.save(state)
+            # exchange event time -> alert delivered
+            sent = time.time()
+            for a in alerts:
+                METRICS.inc("alerts_total", rule=a.rule)
+                METRICS.observe("alert_detection_latency_seconds", sent - a.event_ms / 1000.0, rule=a.rule)
+            log_json("alerts_sent", alerts=[f"{a.symbol}:{a.rule}" for a in alerts])
+
+async def command_loop(rt: Runtime) -> None:
+    """Answers /coin, /top from rt.snapshot between reports (COMMANDS=1)."""
+    tg = TelegramClient(os.environ["TELEGRAM_BOT_TOKEN"], timeout_sec=rt.request_timeout)
+    server = CommandServer(
+        rt,
+        tg,
+        max_staleness_sec=float(os.getenv("COMMAND_MAX_STALENESS_SEC", "900")),
+        refresh_wait_sec=float(os.getenv("COMMAND_REFRESH_WAIT_SEC", "2")),
+    )
+    async with rt.session() as client:
+        await server.run(client)
+
+async def stream_loop(rt: Runtime) -> None:
+    """
+    WebSocket ingest (STREAM=1): klines, ticker and funding kept in memory, so the report
+    reads no REST at the boundary. STREAM_REPLAY_PATH feeds a recorded stream instead.
+    Resubscribes when the symbol list changes.
+    """
+    replay_path = os.getenv("STREAM_REPLAY_PATH")
+    if not replay_path and not websockets_available():
+        log_json("stream_unavailable", hint="pip install websockets")
+        return
+    rt.stream = StreamIngest(
+        rt.kline_cache,
+        rt.binance,
+        base_url=replay_path or os.getenv("BINANCE_WS_URL", "wss://fstream.binance.com"),
+        source=recorded_messages if replay_path else None,
+        live=not replay_path,
+    )
+    async with rt.session() as client:
+        while True:
+            symbols = list(await rt.get_symbols(client))
+            task = asyncio.create_task(rt.stream.run(client, symbols))
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=rt.symbols_ttl_sec)
+                if done:
+                    return task.result()
+                if set(await rt.get_symbols(client)) != set(symbols):
+                    break
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            log_json("stream_resubscribe", symbols=len(rt.symbols))
 
-        # send
-        await tg.send_message(client, TELEGRAM_CHAT_ID, text)
-        return text
+async def oi_sweep_loop(rt: Runtime) -> None:
+    """
+    Open interest for every symbol, refreshed in the background within OI_SWEEP_WEIGHT_PER_MIN
+    (OI_SWEEP=1): the report and the OI alert rule read it from memory.
+    """
+    rt.oi_sweeper = OISweeper(
+        rt.binance,
+        weight_per_min=float(os.getenv("OI_SWEEP_WEIGHT_PER_MIN", "120")),
+        tick_sec=float(os.getenv("OI_SWEEP_TICK_SEC", "5")),
+        min_coverage=float(os.getenv("OI_SWEEP_MIN_COVERAGE", "0.98")),
+    )
+    async with rt.session() as client:
+        await rt.oi_sweeper.run(client, lambda: rt.get_symbols(client))
 
 async def run_loop():
     # schedule config
     KST_OFFSET_HOURS = int(os.getenv("KST_OFFSET_HOURS", "9"))
     at_min = int(os.getenv("SCHEDULE_AT_MINUTE", "0"))
     at_sec = int(os.getenv("SCHEDULE_AT_SECOND", "5"))
+    PREWARM_SEC = float(os.getenv("PREWARM_SEC", "90"))
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # pool connections must survive the gap between pre-warm and the boundary
+    rt = Runtime()
+    # a bad profiles file stops the bot here, once, instead of failing every cycle
+    rt.profiles = report_profiles()
+    await rt.open(keepalive_sec=PREWARM_SEC + 120)
+
+    if METRICS_PORT:
+        await serve_metrics(METRICS_PORT)
+        log_json("metrics_listening", port=METRICS_PORT, path="/metrics")
+
+    # intra-hour alerts, the command server, the stream ingest and the OI sweeper share the pool and the Binance weight limiter
+    background = set()
+    loops = {"ALERTS": alert_loop, "COMMANDS": command_loop, "STREAM": stream_loop, "OI_SWEEP": oi_sweep_loop}
+    for env, loop_fn in loops.items():
+        if os.getenv(env, "0") == "1":
+            task = asyncio.create_task(loop_fn(rt))
+            background.add(task)
+            task.add_done_callback(
+                lambda t, name=loop_fn.__name__: t.cancelled() or t.exception() and log_json(f"{name}_stopped", error=repr(t.exception()))
+            )
 
-    # 1) immediate send
-    try:
-        await build_report()
-    except Exception as e:
-        # if first send fails, still continue loop
-        print("[first send failed]", repr(e))
+    # 1) immediate send (if it fails, still continue loop)
+    await run_cycle(rt, "first")
 
-    # 2) every hour
+    # 2) every hour: pre-warm PREWARM_SEC before the boundary, report at the boundary
+    running = set()
     while True:
         now = kst_now(KST_OFFSET_HOURS)
         # next hour boundary
         nxt = (now + timedelta(hours=1)).replace(minute=at_min, second=at_sec, microsecond=0)
-        sleep_s = max(1.0, (nxt - now).total_seconds())
-        print(f"[sleep] {sleep_s:.1f}s until {nxt.isoformat()}")
+        sleep_s = max(0.0, (nxt - now).total_seconds() - PREWARM_SEC)
+        log_json("sleep", seconds=round(sleep_s, 1), until=nxt.isoformat(), prewarm_sec=PREWARM_SEC)
         await asyncio.sleep(sleep_s)
-        try:
-            await build_report()
-        except Exception as e:
-            print("[scheduled send failed]", repr(e))
+
+        if PREWARM_SEC > 0 and not rt.lock.locked():
+            try:
+                await rt.prewarm()
+            except Exception as e:
+                log_json("prewarm_failed", error=repr(e))
+
+        await asyncio.sleep(max(1.0, (nxt - kst_now(KST_OFFSET_HOURS)).total_seconds()))
+        # in the background so a long cycle cannot shift the schedule
+        task = asyncio.create_task(run_cycle(rt, "scheduled"))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+async def run_once() -> bool:
+    """
+    One report and exit (cron / serverless). Symbols come from the on-disk exchangeInfo
+    cache while fresh, and REASONS_MODE=rules skips OpenAI entirely.
+    """
+    rt = Runtime()
+    try:
+        return await run_cycle(rt, "once")
+    finally:
+        await rt.close()
 
 if __name__ == "__main__":
+    boot_log()
+    if "--once" in sys.argv[1:]:
+        sys.exit(0 if asyncio.run(run_once()) else 1)
     asyncio.run(run_loop())
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# seconds; Prometheus-style cumulative buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def quantile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank quantile; None for an empty list."""
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, math.ceil(q * len(s)) - 1))]
+
+
+class Metrics:
+    """
+    In-process counters, gauges and latency histograms.
+    - cumulative values are served in Prometheus text format (render)
+    - histogram observations are also kept per cycle for p50/p99 (end_cycle)
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.hist: Dict[str, Dict[LabelKey, List[float]]] = {}  # [bucket counts..., sum, count]
+        self.cycle_obs: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self.cycle_counts: Dict[str, Dict[LabelKey, float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        k = _key(labels)
+        c = self.counters.setdefault(name, {})
+        c[k] = c.get(k, 0.0) + value
+        cc = self.cycle_counts.setdefault(name, {})
+        cc[k] = cc.get(k, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        self.gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        k = _key(labels)
+        h = self.hist.setdefault(name, {}).setdefault(k, [0.0] * (len(BUCKETS) + 2))
+        for i, b in enumerate(BUCKETS):
+            if seconds <= b:
+                h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+        self.cycle_obs.setdefault(name, {}).setdefault(k, []).append(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Iterator[None]:
+        """Time the block into histogram `name`; exceptions are counted and re-raised."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc(f"{name}_errors_total", error=type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def end_cycle(self) -> Dict[str, Any]:
+        """Per-cycle summary (count, p50, p99, max per histogram series; counter deltas), then reset."""
+        out: Dict[str, Any] = {"latency": {}, "counts": {}}
+        for name, series in self.cycle_obs.items():
+            for k, obs in series.items():
+                out["latency"][name + _fmt_labels(k)] = {
+                    "n": len(obs),
+                    "p50_ms": round(quantile(obs, 0.5) * 1000.0, 1),
+                    "p99_ms": round(quantile(obs, 0.99) * 1000.0, 1),
+                    "max_ms": round(max(obs) * 1000.0, 1),
+                }
+        for name, series in self.cycle_counts.items():
+            for k, v in series.items():
+                out["counts"][name + _fmt_labels(k)] = v
+        self.cycle_obs = {}
+        self.cycle_counts = {}
+        return out
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for k, v in series.items():
+                lines.append(f"{name}{_fmt_labels(k)} {v:g}")
+        for name, series in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for k, v in series.items():
+                lines.append(f"{name}{_fmt_labels(k)} {v:g}")
+        for name, series in sorted(self.hist.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for k, h in series.items():
+                for i, b in enumerate(BUCKETS):
+                    lines.append(f"{name}_bucket{_fmt_labels(k, ('le', f'{b:g}'))} {h[i]:g}")
+                lines.append(f"{name}_bucket{_fmt_labels(k, ('le', '+Inf'))} {h[-1]:g}")
+                lines.append(f"{name}_sum{_fmt_labels(k)} {h[-2]:g}")
+                lines.append(f"{name}_count{_fmt_labels(k)} {h[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def log_json(event: str, **fields: Any) -> None:
+    """One structured log line on stdout."""
+    rec = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), "event": event, **fields}
+    print(json.dumps(rec, ensure_ascii=False, default=str), flush=True)
+
+
+async def serve_metrics(port: int, host: str = "0.0.0.0", metrics: Metrics = METRICS) -> asyncio.AbstractServer:
+    """Minimal HTTP server answering GET /metrics in Prometheus text format."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            parts = head.split(b" ", 2)
+            path = parts[1].decode("latin-1") if len(parts) > 1 else ""
+            if path.split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
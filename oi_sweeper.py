@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from binance_client import BinanceFuturesClient, request_weight
+from metrics import METRICS, log_json
+from snapshot import MarketRow
+
+OI_PATH = "/fapi/v1/openInterest"
+
+
+def _rank_pct(x: np.ndarray) -> np.ndarray:
+    """0 for the smallest value .. 1 for the largest."""
+    if x.size < 2:
+        return np.zeros(x.size)
+    return np.argsort(np.argsort(x, kind="stable"), kind="stable") / (x.size - 1)
+
+
+class OISweeper:
+    """
+    Open interest for the whole universe, refreshed in the background under a fixed
+    request weight budget (weight_per_min), so the report reads OI from memory.
+    Every tick spends the budget on the symbols with the largest
+    (seconds since last attempt x priority). Priority runs from 1 to 4. Volatile
+    symbols (|24h change|, counted twice) and liquid ones (quote volume) rank higher
+    and so are refreshed up to 4x as often. Before the first set_priority every
+    symbol has priority 1. ready() once min_coverage of the universe has a value, so a
+    few symbols whose openInterest keeps failing (delivering/settling contracts) do not
+    hold the whole universe back.
+    """
+
+    def __init__(
+        self,
+        binance: BinanceFuturesClient,
+        weight_per_min: float = 120.0,
+        tick_sec: float = 5.0,
+        min_coverage: float = 0.98,
+    ):
+        self.binance = binance
+        self.weight_per_min = weight_per_min
+        self.tick_sec = tick_sec
+        self.min_coverage = min_coverage
+        self.symbols: List[str] = []
+        self.oi: Dict[str, float] = {}
+        self.at: Dict[str, float] = {}  # when oi[symbol] was fetched
+        self.checked: Dict[str, float] = {}  # last attempt, failed ones included
+        self.priority: Dict[str, float] = {}
+
+    # --- state -----------------------------------------------------------------
+
+    def coverage(self) -> float:
+        """Share of the universe with a value (fetched at least once)."""
+        if not self.symbols:
+            return 0.0
+        return sum(1 for s in self.symbols if s in self.oi) / len(self.symbols)
+
+    def ready(self) -> bool:
+        return self.coverage() >= self.min_coverage
+
+    def get(self, symbol: str, max_age_sec: float) -> Optional[float]:
+        at = self.at.get(symbol)
+        if at is None or time.time() - at > max_age_sec:
+            return None
+        return self.oi[symbol]
+
+    def values(self, max_age_sec: float) -> Dict[str, float]:
+        """Every OI value no older than max_age_sec."""
+        cutoff = time.time() - max_age_sec
+        return {s: v for s, v in self.oi.items() if self.at[s] >= cutoff}
+
+    def set_universe(self, symbols: List[str]) -> None:
+        self.symbols = list(symbols)
+        keep = set(symbols)
+        for d in (self.oi, self.at, self.checked, self.priority):
+            for sym in [s for s in d if s not in keep]:
+                del d[sym]
+
+    def set_priority(self, market: Dict[str, MarketRow]) -> None:
+        """Priorities from a bulk snapshot: volatility and volume ranks over the universe."""
+        syms = [s for s in self.symbols if s in market]
+        if not syms:
+            return
+        move = np.array([abs(market[s].pct_24h or 0.0) for s in syms])
+        qv = np.array([market[s].quote_vol or 0.0 for s in syms])
+        prio = 1.0 + 2.0 * _rank_pct(move) + _rank_pct(qv)
+        self.priority = dict(zip(syms, prio.tolist()))
+
+    def due(self, n: int, now: Optional[float] = None) -> List[str]:
+        """The n symbols to refresh next (never attempted ones first)."""
+        now = time.time() if now is None else now
+        return heapq.nlargest(
+            n, self.symbols, key=lambda s: (now - self.checked.get(s, 0.0)) * self.priority.get(s, 1.0)
+        )
+
+    # --- sweeping ------------------------------------------------------------------
+
+    async def _fetch(self, client: httpx.AsyncClient, symbol: str) -> None:
+        self.checked[symbol] = time.time()
+        obj = await self.binance.open_interest(client, symbol)
+        self.oi[symbol] = float(obj["openInterest"])
+        self.at[symbol] = time.time()
+
+    async def sweep(self, client: httpx.AsyncClient, n: int) -> int:
+        """One tick: refresh the n most due symbols. Returns how many failed."""
+        batch = self.due(n)
+        results = await asyncio.gather(*[self._fetch(client, s) for s in batch], return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        METRICS.inc("oi_sweep_requests_total", len(batch) - len(failed), outcome="ok")
+        if failed:
+            METRICS.inc("oi_sweep_requests_total", len(failed), outcome="error")
+        return len(failed)
+
+    async def run(self, client: httpx.AsyncClient, symbols: Callable[[], Awaitable[List[str]]]) -> None:
+        """Sweep until cancelled; symbols() gives the current universe (cached by the caller)."""
+        loop = asyncio.get_running_loop()
+        per_tick = self.weight_per_min * self.tick_sec / 60.0 / request_weight(OI_PATH)
+        carry = 0.0
+        log_json("oi_sweep_started", weight_per_min=self.weight_per_min, tick_sec=self.tick_sec)
+        while True:
+            t0 = loop.time()
+            try:
+                self.set_universe(await symbols())
+            except Exception as e:
+                log_json("oi_sweep_symbols_failed", error=repr(e))
+            # fractional budgets carry over, so a small budget still refreshes something
+            carry += per_tick
+            n = min(int(carry), len(self.symbols))
+            carry -= int(carry)
+            if n:
+                failed = await self.sweep(client, n)
+                if failed:
+                    log_json("oi_sweep_failed", requested=n, failed=failed)
+            if self.symbols:
+                ages = [time.time() - self.at[s] for s in self.symbols if s in self.at]
+                METRICS.set("oi_sweep_coverage_ratio", self.coverage())
+                if ages:
+                    METRICS.set("oi_sweep_max_age_seconds", max(ages))
+            await asyncio.sleep(max(0.0, self.tick_sec - (loop.time() - t0)))
@@ -1,16 +1,113 @@
+import asyncio
 import json
+import time
+import httpx
 from typing import Dict, Any, List, Optional
-from openai import OpenAI
+
+# quantization steps for the response cache: near-identical hourly inputs share a key
+# (window returns, ret{hours}, use RET_STEP whichever windows are configured)
+RET_STEP = 2.0
+CACHE_STEPS = {
+    "vol_ratio": 0.5,
+    "oi_chg_pct": 2.0,
+    "funding": 0.0001,
+    "rsi": 5.0,
+}
+
+
+def _quantize(x: Optional[float], step: float) -> Optional[int]:
+    if x is None:
+        return None
+    return int(x // step)
+
+
+def cache_key(it: Dict[str, Any]) -> str:
+    parts = [it["symbol"], it.get("bucket", "")]
+    rets = sorted(k for k in it if k.startswith("ret") and k[3:].isdigit())
+    parts.extend([k, _quantize(it[k], RET_STEP)] for k in rets)
+    for k, step in CACHE_STEPS.items():
+        parts.append(_quantize(it.get(k), step))
+    pve = it.get("price_vs_ema50")
+    parts.append(None if pve is None else pve >= 0)
+    return json.dumps(parts, separators=(",", ":"))
+
 
 class OpenAISummarizer:
-    def __init__(self, api_key: str, model: str):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        deadline_sec: float = 20.0,
+        cache: Optional[Dict[str, Any]] = None,
+        cache_ttl_sec: float = 6 * 3600,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        # imported here: the SDK is the slowest import of the bot and rules-only runs never need it
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0, http_client=http_client)
         self.model = model
+        self.deadline_sec = deadline_sec
+        # {key: [reasons, unix_ts]}; pass the dict kept in state to reuse it across runs
+        self.cache: Dict[str, Any] = cache if cache is not None else {}
+        self.cache_ttl_sec = cache_ttl_sec
+        # counters of the last summarize() call (one report cycle)
+        self.stats = self._new_stats()
+
+    @staticmethod
+    def _new_stats() -> Dict[str, Any]:
+        return {"cache_hits": 0, "cache_misses": 0, "calls": 0, "timeouts": 0, "errors": 0, "latency_ms": None}
+
+    async def aclose(self) -> None:
+        """Close the SDK client and its connection pool (a passed-in http_client included)."""
+        await self.client.close()
 
-    def summarize(self, items: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    async def summarize(self, items: List[Dict[str, Any]]) -> Dict[str, List[str]]:
         """
         Returns: { "SYMBOL": ["요인1", "요인2"], ... }
+        - cached reasons for near-identical inputs are reused without an API call
+        - the model gets at most deadline_sec; anything it did not answer falls back to rules
+        """
+        self.stats = self._new_stats()
+        now = time.time()
+        self._prune(now)
+
+        out: Dict[str, List[str]] = {}
+        missing: List[Dict[str, Any]] = []
+        for it in items:
+            hit = self.cache.get(cache_key(it))
+            if hit:
+                out[it["symbol"]] = hit[0]
+                self.stats["cache_hits"] += 1
+            else:
+                missing.append(it)
+                self.stats["cache_misses"] += 1
+
+        if missing:
+            answered = await self._ask_model(missing)
+            rules = self.fallback(missing)
+            for it in missing:
+                sym = it["symbol"]
+                if sym in answered:
+                    out[sym] = answered[sym]
+                    self.cache[cache_key(it)] = [answered[sym], now]
+                else:
+                    out[sym] = rules[sym]
+        return out
+
+    def hit_rate(self) -> Optional[float]:
+        """The last summarize() call's cache hits over lookups; None if it made no lookup."""
+        n = self.stats["cache_hits"] + self.stats["cache_misses"]
+        return None if n == 0 else self.stats["cache_hits"] / n
+
+    def _prune(self, now: float) -> None:
+        for k in [k for k, v in self.cache.items() if now - v[1] > self.cache_ttl_sec]:
+            del self.cache[k]
+
+    async def _ask_model(self, items: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """
         - '뉴스/이벤트'를 지어내지 않게 강하게 제한 (숫자 기반)
+        Returns {} on timeout/error/unparseable output.
         """
         instructions = (
             "너는 암호화폐 선물 시장 리포터다. "
@@ -24,11 +121,25 @@ class OpenAISummarizer:
             "items": items
         }
 
-        resp = self.client.responses.create(
-            model=self.model,
-            instructions=instructions,
-            input=json.dumps(payload, ensure_ascii=False),
-        )
+        self.stats["calls"] += 1
+        t0 = time.monotonic()
+        try:
+            resp = await asyncio.wait_for(
+                self.client.responses.create(
+                    model=self.model,
+                    instructions=instructions,
+                    input=json.dumps(payload, ensure_ascii=False),
+                ),
+                self.deadline_sec,
+            )
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return {}
+        except Exception:
+            self.stats["errors"] += 1
+            return {}
+        finally:
+            self.stats["latency_ms"] = (time.monotonic() - t0) * 1000.0
 
         text = (resp.output_text or "").strip()
         try:
@@ -44,8 +155,11 @@ class OpenAISummarizer:
                 return out
         except Exception:
             pass
+        return {}
 
-        # fallback: no hallucination, rule-based
+    @staticmethod
+    def fallback(items: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        # no hallucination, rule-based
         fallback: Dict[str, List[str]] = {}
         for it in items:
             sym = it["symbol"]
@@ -59,8 +173,11 @@ class OpenAISummarizer:
                     reasons.append("RSI 과열(추격매수 구간)")
                 elif it["rsi"] <= 30:
                     reasons.append("RSI 과매도(반등/추가하락 분기)")
-            if it.get("ema50") is not None and it.get("price") is not None:
-                if it["price"] >= it["ema50"]:
+            pve = it.get("price_vs_ema50")
+            if pve is None and it.get("ema50") is not None and it.get("price") is not None:
+                pve = it["price"] - it["ema50"]
+            if pve is not None:
+                if pve >= 0:
                     reasons.append("EMA50 상단(추세 유지)")
                 else:
                     reasons.append("EMA50 하단(추세 약세)")
@@ -0,0 +1,172 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from delivery import SECTION
+from scan import WINDOWS, MarketScan, Window, buckets_for, parse_windows
+from snapshot import EXTREME_FIELDS, MarketRow, extremes
+
+
+class ReportProfile(NamedTuple):
+    """One report variant rendered from the shared per-cycle snapshot."""
+
+    name: str
+    windows: List[Window]
+    chat_ids: List[str]
+    top_n: int = 1  # picks per bucket
+    min_quote_vol: float = 0.0  # 24h quote volume floor for the picks
+    extremes: Sequence[str] = ()  # REPORT_EXTREMES names, e.g. ("funding", "basis")
+    extremes_top_n: int = 3
+
+    @property
+    def buckets(self):
+        return buckets_for(self.windows)
+
+
+def _names(x: Any) -> List[str]:
+    """["a", "b"] or "a,b" -> ["a", "b"]"""
+    if isinstance(x, list):
+        return [str(c).strip() for c in x if str(c).strip()]
+    return [c.strip() for c in str(x).split(",") if c.strip()]
+
+
+def load_profiles(path: str, default: ReportProfile) -> List[ReportProfile]:
+    """
+    Profiles from a JSON list, e.g.
+      [{"name": "main"}, {"name": "top10", "top_n": 10, "chats": "-100123", "min_quote_vol": 5e7}]
+    Keys left out inherit from `default` (the REPORT_* env settings). windows, chats and
+    extremes take a list or a comma-separated string. No file: [default].
+    A malformed file raises ValueError naming the file and the profile.
+    """
+    if not path or not os.path.exists(path):
+        return [default]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except ValueError as e:
+        raise ValueError(f"{path}: not valid JSON: {e}") from None
+    if not isinstance(raw, list) or not raw:
+        raise ValueError(f"{path}: expected a non-empty JSON list of profiles")
+    out = []
+    for i, obj in enumerate(raw):
+        if not isinstance(obj, dict):
+            raise ValueError(f"{path}: profile {i}: expected an object")
+        try:
+            windows = parse_windows(",".join(_names(obj["windows"]))) if "windows" in obj else default.windows
+            if not windows:
+                raise ValueError("no windows")
+            p = default._replace(
+                name=str(obj.get("name", f"profile{i}")),
+                windows=windows,
+                chat_ids=_names(obj["chats"]) if "chats" in obj else default.chat_ids,
+                top_n=int(obj.get("top_n", default.top_n)),
+                min_quote_vol=float(obj.get("min_quote_vol", default.min_quote_vol)),
+                extremes=[x.lower() for x in _names(obj["extremes"])] if "extremes" in obj else default.extremes,
+                extremes_top_n=int(obj.get("extremes_top_n", default.extremes_top_n)),
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: profile {obj.get('name', i)}: {e}") from None
+        out.append(p)
+    if len({p.name for p in out}) != len(out):
+        raise ValueError(f"{path}: report profile names must be unique")
+    return out
+
+
+def union_windows(profiles: Sequence[ReportProfile]) -> List[Window]:
+    """Every window any profile reports, in WINDOWS order: the one scan covers them all."""
+    used = {w.label for p in profiles for w in p.windows}
+    return [w for w in WINDOWS.values() if w.label in used]
+
+
+def select(profile: ReportProfile, scan: MarketScan, market: Dict[str, MarketRow]) -> List[Dict[str, Any]]:
+    """The profile's picks from the shared scan, universe filtered by min_quote_vol."""
+    mask = None
+    if profile.min_quote_vol > 0:
+        qv = [market[s].quote_vol if s in market else None for s in scan.symbols]
+        mask = np.array([q is not None and q >= profile.min_quote_vol for q in qv], dtype=bool)
+    return scan.pick(profile.buckets, n=profile.top_n, mask=mask)
+
+
+def fmt_pct(x: Optional[float]) -> str:
+    return "NA" if x is None else f"{x:+.2f}%"
+
+
+def fmt_num(x: Optional[float]) -> str:
+    if x is None:
+        return "NA"
+    # large numbers compact
+    if x >= 1e9:
+        return f"{x/1e9:.2f}B"
+    if x >= 1e6:
+        return f"{x/1e6:.2f}M"
+    if x >= 1e3:
+        return f"{x/1e3:.2f}K"
+    return f"{x:.2f}"
+
+
+EXTREME_TITLES = {
+    "funding": ("💸 펀딩 극단", lambda x: f"{x:+.5f}"),
+    "basis": ("📐 베이시스 극단 (마크/인덱스)", lambda x: f"{x:+.3f}%"),
+}
+
+
+def render(
+    profile: ReportProfile,
+    items: List[Dict[str, Any]],
+    reasons_map: Dict[str, List[str]],
+    market: Dict[str, MarketRow],
+    scanned: Sequence[str],
+    warnings: Sequence[str],
+    now: datetime,
+) -> str:
+    """Telegram text for one profile; items are its enriched picks."""
+    # stable ordering in final message
+    order = {bucket: i for i, (bucket, _, _) in enumerate(profile.buckets)}
+    items = sorted(items, key=lambda x: (order.get(x.get("bucket", ""), 99), x.get("rank", 0)))
+
+    header = f"📊 Binance USDT 선물 변동 리포트\n(KST {now:%Y-%m-%d %H:%M})\n"
+    lines = [header] + list(warnings)
+    if not items:
+        lines.append("⚠️ 이번 시간에는 집계된 종목이 없습니다 (Binance 응답 실패)")
+
+    # one section per window: its UP/DOWN picks, other windows' returns alongside
+    for w in profile.windows:
+        lines.append(SECTION)
+        lines.append(w.title)
+        for it in items:
+            if it["bucket"] not in (f"{w.label}_UP", f"{w.label}_DOWN"):
+                continue
+            emoji = "🟢" if it["bucket"] == f"{w.label}_UP" else "🔴"
+            sym = it["symbol"]
+            r = reasons_map.get(sym, ["", ""])
+            r1 = r[0] if len(r) > 0 else ""
+            r2 = r[1] if len(r) > 1 else ""
+            rets = " | ".join(
+                f"{o.label} {fmt_pct(it.get(f'ret{o.hours}'))}"
+                for o in [w] + [o for o in profile.windows if o is not w]
+            )
+            lines.append(
+                f"{emoji} {sym}  {rets}\n"
+                f"   가격 {fmt_num(it.get('price'))} | RSI {('NA' if it.get('rsi') is None else f'{it['rsi']:.1f}')}"
+                f" | 펀딩 {('NA' if it.get('funding') is None else f'{it['funding']:+.5f}')}\n"
+                f"   OI {fmt_num(it.get('oi'))} ({('NA' if it.get('oi_chg_pct') is None else f'{it['oi_chg_pct']:+.1f}%')})"
+                f" | 거래량배수 {('NA' if it.get('vol_ratio') is None else f'{it['vol_ratio']:.2f}x')}\n"
+                f"   - {r1}\n"
+                f"   - {r2}"
+            )
+
+    # funding/basis extremes over the scanned universe, no extra requests
+    for name in profile.extremes:
+        if name not in EXTREME_FIELDS:
+            continue
+        title, fmt = EXTREME_TITLES[name]
+        hi, lo = extremes(market, EXTREME_FIELDS[name], profile.extremes_top_n, scanned)
+        lines.append(SECTION)
+        lines.append(title)
+        lines.append("   ▲ " + ", ".join(f"{sym} {fmt(v)}" for sym, v in hi))
+        lines.append("   ▼ " + ", ".join(f"{sym} {fmt(v)}" for sym, v in lo))
+
+    return "\n".join(lines)
@@ -0,0 +1,315 @@
+"""
+Historical replay of the report's selection over archived 1h klines.
+
+Runs the live pick logic (MarketScan.pick per ReportProfile) and the EMA50/RSI14
+indicators hour by hour over a local archive, vectorized across symbols and time
+(scan columns for a block of hours come from one pass of prefix sums), and writes
+one CSV row per pick (with forward returns) plus one row of metrics per hour.
+
+Archive: a directory of aligned .npy matrices (hours x symbols, so one hour is one
+contiguous row), opened memory-mapped.
+Build it once from Binance kline CSVs (data.binance.vision layout: SYMBOL-1h-*.csv or
+SYMBOL.csv, with or without a header row):
+
+    python replay.py build klines_csv/ archive/
+    python replay.py run archive/ --windows 12H,24H --top-n 3 --out picks.csv
+    python replay.py run archive/ --profiles profiles.json --start 2024-01-01 --end 2024-04-01
+
+Each replayed hour is the report sent right after that candle closed: the closed
+candle stands in for the live one, and there is no OI/funding (klines only).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from kline_cache import HOUR_MS
+from profiles import ReportProfile, load_profiles, union_windows
+from scan import MarketScan, parse_windows, rolling_window_columns
+
+FORWARD_HOURS = (1, 4, 24)
+
+
+class Archive(NamedTuple):
+    symbols: List[str]
+    times: np.ndarray  # (hours,) candle open time, ms
+    closes: np.ndarray  # (hours, symbols), NaN where a symbol has no candle
+    vols: np.ndarray
+    qvols: np.ndarray  # quote volume per candle
+
+
+def _read_csv(path: str) -> np.ndarray:
+    """(open_time, close, volume, quote_volume) rows of one Binance kline CSV."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+    skip = 0 if first[:1].isdigit() else 1
+    rows = np.loadtxt(path, delimiter=",", skiprows=skip, usecols=(0, 4, 5, 7), ndmin=2)
+    # newer dumps use microsecond open times
+    rows[rows[:, 0] > 1e14, 0] //= 1000
+    return rows
+
+
+def build_archive(csv_dir: str, out_dir: str) -> Archive:
+    """Align every symbol's CSVs on one hourly grid and write them as .npy columns."""
+    per_symbol: Dict[str, List[np.ndarray]] = {}
+    for name in sorted(os.listdir(csv_dir)):
+        if not name.endswith(".csv"):
+            continue
+        sym = name[:-4].split("-", 1)[0].upper()
+        per_symbol.setdefault(sym, []).append(_read_csv(os.path.join(csv_dir, name)))
+    if not per_symbol:
+        raise ValueError(f"no kline CSVs in {csv_dir}")
+
+    data = {s: np.concatenate(parts) for s, parts in per_symbol.items()}
+    t0 = int(min(d[:, 0].min() for d in data.values())) // HOUR_MS * HOUR_MS
+    t1 = int(max(d[:, 0].max() for d in data.values())) // HOUR_MS * HOUR_MS
+    n_hours = (t1 - t0) // HOUR_MS + 1
+    symbols = sorted(data)
+
+    os.makedirs(out_dir, exist_ok=True)
+    times = t0 + HOUR_MS * np.arange(n_hours, dtype=np.int64)
+    np.save(os.path.join(out_dir, "times.npy"), times)
+    cols = {}
+    for i, name in enumerate(("closes", "vols", "qvols")):
+        # written through a memmap: only one matrix is in memory at a time
+        m = np.lib.format.open_memmap(
+            os.path.join(out_dir, f"{name}.npy"), mode="w+", dtype=np.float64, shape=(n_hours, len(symbols))
+        )
+        m[:] = np.nan
+        for col, sym in enumerate(symbols):
+            d = data[sym]
+            idx = (d[:, 0].astype(np.int64) - t0) // HOUR_MS
+            m[idx, col] = d[:, 1 + i]
+        m.flush()
+        cols[name] = m
+    with open(os.path.join(out_dir, "symbols.json"), "w", encoding="utf-8") as f:
+        json.dump(symbols, f)
+    return Archive(symbols, times, cols["closes"], cols["vols"], cols["qvols"])
+
+
+def open_archive(path: str) -> Archive:
+    with open(os.path.join(path, "symbols.json"), "r", encoding="utf-8") as f:
+        symbols = json.load(f)
+    cols = {n: np.load(os.path.join(path, f"{n}.npy"), mmap_mode="r") for n in ("times", "closes", "vols", "qvols")}
+    return Archive(symbols, np.asarray(cols["times"]), cols["closes"], cols["vols"], cols["qvols"])
+
+
+class VectorIndicators:
+    """
+    EMAState / RSIState (same seeding and values) for a whole column of symbols per
+    update; a NaN close leaves that symbol's state untouched.
+    """
+
+    def __init__(self, n: int, ema_period: int = 50, rsi_period: int = 14):
+        self.ep = ema_period
+        self.rp = rsi_period
+        self.k = 2 / (ema_period + 1)
+        self.ema_n = np.zeros(n, dtype=np.int64)
+        self.ema = np.zeros(n)
+        self.rsi_n = np.zeros(n, dtype=np.int64)
+        self.prev = np.full(n, np.nan)
+        self.gain = np.zeros(n)
+        self.loss = np.zeros(n)
+
+    def update(self, v: np.ndarray) -> None:
+        ok = ~np.isnan(v)
+
+        warm = ok & (self.ema_n < self.ep)
+        run = ok & (self.ema_n >= self.ep)
+        self.ema[warm] += v[warm]
+        seed = warm & (self.ema_n + 1 == self.ep)
+        self.ema[seed] /= self.ep
+        self.ema[run] = v[run] * self.k + self.ema[run] * (1 - self.k)
+        self.ema_n[ok] += 1
+
+        has = ok & ~np.isnan(self.prev)
+        d = np.where(has, v - np.nan_to_num(self.prev), 0.0)
+        g, l = np.maximum(d, 0.0), np.maximum(-d, 0.0)
+        warm = has & (self.rsi_n <= self.rp)
+        run = has & (self.rsi_n > self.rp)
+        self.gain[warm] += g[warm]
+        self.loss[warm] += l[warm]
+        seed = warm & (self.rsi_n == self.rp)
+        self.gain[seed] /= self.rp
+        self.loss[seed] /= self.rp
+        self.gain[run] = (self.gain[run] * (self.rp - 1) + g[run]) / self.rp
+        self.loss[run] = (self.loss[run] * (self.rp - 1) + l[run]) / self.rp
+        self.prev[ok] = v[ok]
+        self.rsi_n[ok] += 1
+
+    def values(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ema, rsi) columns, NaN while warming up."""
+        ema = np.where(self.ema_n >= self.ep, self.ema, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(self.loss == 0, 100.0, 100.0 - 100.0 / (1.0 + self.gain / self.loss))
+        return ema, np.where(self.rsi_n >= self.rp + 1, rsi, np.nan)
+
+
+def _hour_index(times: np.ndarray, day: Optional[str], default: int) -> int:
+    if not day:
+        return default
+    ms = int(datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return int(np.searchsorted(times, ms))
+
+
+def replay(
+    ar: Archive,
+    profiles: List[ReportProfile],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Tuple[List[Dict], List[Dict]]:
+    """(pick rows, per-hour metric rows) for every profile over [start, end)."""
+    windows = union_windows(profiles)
+    depth = MarketScan.depth(windows)
+    n_hours, n_sym = ar.closes.shape
+    lo = max(_hour_index(ar.times, start, 0), depth - 1)
+    hi = min(_hour_index(ar.times, end, n_hours), n_hours)
+    book = VectorIndicators(n_sym)
+    # 24h quote volume as a rolling sum, for the profiles' min_quote_vol filter
+    qv24 = np.zeros(n_sym)
+    index = {s: i for i, s in enumerate(ar.symbols)}
+    # hours per rolling_window_columns call (~15 float columns of block x symbols)
+    block = max(1, 2_000_000 // n_sym)
+
+    picks: List[Dict] = []
+    metrics: List[Dict] = []
+    # indicators warm up from the start of the archive
+    for t in range(lo):
+        book.update(np.asarray(ar.closes[t]))
+        qv24 += np.nan_to_num(np.asarray(ar.qvols[t]))
+        if t >= 24:
+            qv24 -= np.nan_to_num(np.asarray(ar.qvols[t - 24]))
+
+    for b0 in range(lo, hi, block):
+        b1 = min(b0 + block, hi)
+        # the scan columns of every hour in the block, from the candles up to that hour
+        h0 = b0 - depth + 1
+        closes, vols = np.asarray(ar.closes[h0:b1]), np.asarray(ar.vols[h0:b1])
+        cols = rolling_window_columns(closes, vols, [w.hours for w in windows], depth)
+
+        for t in range(b0, b1):
+            c = np.asarray(ar.closes[t])
+            book.update(c)
+            qv24 += np.nan_to_num(np.asarray(ar.qvols[t]))
+            if t >= 24:
+                qv24 -= np.nan_to_num(np.asarray(ar.qvols[t - 24]))
+            j = t - h0
+            scan = MarketScan(
+                ar.symbols,
+                closes[j - depth + 1 : j + 1].T,
+                vols[j - depth + 1 : j + 1].T,
+                windows,
+                columns={name: col[j] for name, col in cols.items()},
+            )
+            ema, rsi = book.values()
+            report_ms = int(ar.times[t]) + HOUR_MS
+            hour = datetime.fromtimestamp(report_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+            fwd = {h: np.asarray(ar.closes[t + h]) if t + h < n_hours else None for h in FORWARD_HOURS}
+
+            n_picks = 0
+            for prof in profiles:
+                mask = qv24 >= prof.min_quote_vol if prof.min_quote_vol > 0 else None
+                for p in scan.pick(prof.buckets, n=prof.top_n, mask=mask):
+                    i = index[p["symbol"]]
+                    row = {"hour": hour, "profile": prof.name, "bucket": p["bucket"], "rank": p["rank"], "symbol": p["symbol"]}
+                    for w in windows:
+                        row[f"ret{w.hours}"] = p.get(f"ret{w.hours}")
+                    row["vol_ratio"] = p.get("vol_ratio")
+                    row["rsi"] = None if np.isnan(rsi[i]) else float(rsi[i])
+                    row["ema50_gap_pct"] = None if np.isnan(ema[i]) else float((c[i] / ema[i] - 1.0) * 100.0)
+                    for h, f in fwd.items():
+                        ok = f is not None and not np.isnan(f[i]) and c[i] > 0
+                        row[f"fwd{h}h"] = float((f[i] / c[i] - 1.0) * 100.0) if ok else None
+                    picks.append(row)
+                    n_picks += 1
+
+            m = {"hour": hour, "symbols": int(np.count_nonzero(~np.isnan(c))), "picks": n_picks}
+            # market breadth per window: median return and share of symbols up
+            for w in windows:
+                col = scan.columns[f"ret{w.hours}"]
+                col = col[~np.isnan(col)]
+                m[f"median_ret{w.hours}"] = float(np.median(col)) if col.size else None
+                m[f"up_share{w.hours}"] = float(np.mean(col > 0)) if col.size else None
+            metrics.append(m)
+    return picks, metrics
+
+
+def write_csv(path: str, rows: List[Dict]) -> None:
+    if not rows:
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+
+
+def summarize(picks: List[Dict], top: int = 10) -> None:
+    by_profile: Dict[str, List[Dict]] = {}
+    for p in picks:
+        by_profile.setdefault(p["profile"], []).append(p)
+    for name, rows in by_profile.items():
+        print(f"[{name}] {len(rows)} picks")
+        print("  most picked:", ", ".join(f"{s} {n}" for s, n in Counter(r["symbol"] for r in rows).most_common(top)))
+        buckets: Dict[str, List[Dict]] = {}
+        for r in rows:
+            buckets.setdefault(r["bucket"], []).append(r)
+        for bucket, rs in buckets.items():
+            fwd = []
+            for h in FORWARD_HOURS:
+                xs = [r[f"fwd{h}h"] for r in rs if r[f"fwd{h}h"] is not None]
+                fwd.append(f"fwd{h}h {np.mean(xs):+.2f}%" if xs else f"fwd{h}h NA")
+            print(f"  {bucket:10s} n={len(rs):5d}  " + "  ".join(fwd))
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="convert kline CSVs into a memory-mappable archive")
+    b.add_argument("csv_dir")
+    b.add_argument("archive")
+    r = sub.add_parser("run", help="replay the report selection over an archive")
+    r.add_argument("archive")
+    r.add_argument("--profiles", default=None, help="profiles JSON (same format as REPORT_PROFILES_PATH)")
+    r.add_argument("--windows", default="12H,24H")
+    r.add_argument("--top-n", type=int, default=1)
+    r.add_argument("--min-quote-vol", type=float, default=0.0)
+    r.add_argument("--start", default=None, help="first report day, YYYY-MM-DD (UTC)")
+    r.add_argument("--end", default=None, help="end day, exclusive")
+    r.add_argument("--out", default="replay_picks.csv")
+    r.add_argument("--metrics-out", default="replay_hours.csv")
+    return ap.parse_args(argv)
+
+
+def main(argv: List[str]) -> None:
+    args = parse_args(argv)
+    t0 = time.perf_counter()
+    if args.cmd == "build":
+        ar = build_archive(args.csv_dir, args.archive)
+        print(f"{len(ar.symbols)} symbols x {len(ar.times)} hours -> {args.archive} ({time.perf_counter() - t0:.1f}s)")
+        return
+
+    ar = open_archive(args.archive)
+    default = ReportProfile(
+        "default", parse_windows(args.windows), [], top_n=args.top_n, min_quote_vol=args.min_quote_vol
+    )
+    profiles = load_profiles(args.profiles, default) if args.profiles else [default]
+    picks, metrics = replay(ar, profiles, args.start, args.end)
+    elapsed = time.perf_counter() - t0
+    write_csv(args.out, picks)
+    write_csv(args.metrics_out, metrics)
+    print(
+        f"{len(metrics)} hours x {len(ar.symbols)} symbols in {elapsed:.2f}s "
+        f"({len(metrics) / max(elapsed, 1e-9):.0f} hours/s) -> {args.out}, {args.metrics_out}"
+    )
+    summarize(picks)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from binance_client import BinanceFuturesClient
+from delivery import DeliveryQueue
+from kline_cache import Candle, KlineCache
+from metrics import METRICS, log_json
+from oi_sweeper import OISweeper
+from openai_summarizer import OpenAISummarizer
+from scan import DEFAULT_WINDOWS
+from shards import ShardPool, weight_share
+from snapshot import ScanSnapshot
+from stream import StreamIngest
+
+
+def usdt_perpetuals(exchange_info: Dict[str, Any]) -> List[str]:
+    symbols = []
+    for s in exchange_info.get("symbols", []):
+        # USDT-margined perpetuals
+        if s.get("quoteAsset") == "USDT" and s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING":
+            symbols.append(s["symbol"])
+    return symbols
+
+
+class Runtime:
+    """
+    Resources that outlive a single report cycle:
+    - HTTP connection pool (kept alive between the pre-warm phase and the boundary)
+    - Binance client, so the weight limiter keeps its state
+    - kline cache and the USDT perpetual symbol list (refreshed after SYMBOLS_TTL_SEC)
+    - a lock so two cycles never run at once
+    Without open() every session() gets a short-lived client, as build_report used to.
+    The symbol list is also kept on disk (SYMBOLS_CACHE_PATH), so one-shot runs skip
+    exchangeInfo while it is younger than SYMBOLS_TTL_SEC.
+    """
+
+    def __init__(self, kline_cache: Optional[KlineCache] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.request_timeout = int(os.getenv("REQUEST_TIMEOUT", "12"))
+        self.concurrency = int(os.getenv("CONCURRENCY", "20"))
+        self.symbols_ttl_sec = float(os.getenv("SYMBOLS_TTL_SEC", "600"))
+        self.transport = transport
+        # concurrency and request weight are throttled inside the client
+        self.binance = BinanceFuturesClient(
+            os.getenv("BINANCE_BASE_URL", "https://fapi.binance.com"),
+            timeout_sec=self.request_timeout,
+            max_concurrency=self.concurrency,
+            weight_limit=int(os.getenv("BINANCE_WEIGHT_LIMIT", "2400")),
+            # < 1 with a sharded scan: the IP's limit is split between the workers and this process
+            weight_share=float(os.getenv("BINANCE_WEIGHT_SHARE") or weight_share(int(os.getenv("SCAN_WORKERS", "1")))),
+            call_deadline_sec=float(os.getenv("BINANCE_CALL_DEADLINE_SEC", "30")),
+            hedge_min_sec=float(os.getenv("BINANCE_HEDGE_MIN_SEC", "0.5")),
+            breaker_threshold=int(os.getenv("BINANCE_BREAKER_THRESHOLD", "5")),
+            breaker_cooldown_sec=float(os.getenv("BINANCE_BREAKER_COOLDOWN_SEC", "30")),
+        )
+        self.kline_cache = kline_cache or KlineCache(os.getenv("KLINE_CACHE_PATH", "klines.json"))
+        self.symbols_path = os.getenv("SYMBOLS_CACHE_PATH", "symbols.json")
+        # HTTP/2 (needs the optional h2 package): every request shares one TLS connection
+        self.http2 = os.getenv("HTTP2", "0") == "1" and find_spec("h2") is not None
+        if os.getenv("HTTP2", "0") == "1" and not self.http2:
+            log_json("http2_unavailable", hint="pip install 'httpx[http2]'")
+        self.client: Optional[httpx.AsyncClient] = None
+        self.symbols: List[str] = []
+        self.symbols_at = 0.0
+        self.lock = asyncio.Lock()
+        # latest universe state, published by build_report for the command server
+        self.snapshot: Optional[ScanSnapshot] = None
+        # multi-chat report and alert delivery; pacing state must outlive a single cycle
+        self.delivery: Optional[DeliveryQueue] = None
+        # WebSocket ingest (STREAM=1): keeps kline_cache and the market snapshot current
+        self.stream: Optional[StreamIngest] = None
+        # sharded klines scan over worker processes (SCAN_WORKERS > 1), started on first use
+        self.shards: Optional[ShardPool] = None
+        # universe-wide open interest kept in memory (OI_SWEEP=1)
+        self.oi_sweeper: Optional[OISweeper] = None
+        # report profiles, loaded and validated once at startup (main.report_profiles)
+        self.profiles: Optional[List[Any]] = None
+        # OpenAI reasons client, created on the first AI-mode cycle
+        self.summarizer: Optional[OpenAISummarizer] = None
+
+    def _new_client(self, keepalive_sec: float = 5.0) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self.request_timeout,
+            transport=self.transport,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.concurrency * 2,
+                max_keepalive_connections=self.concurrency * 2,
+                keepalive_expiry=keepalive_sec,
+            ),
+        )
+
+    async def open(self, keepalive_sec: float = 300.0) -> None:
+        if self.client is None:
+            self.client = self._new_client(keepalive_sec)
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        if self.shards is not None:
+            await asyncio.to_thread(self.shards.close)
+            self.shards = None
+        if self.summarizer is not None:
+            await self.summarizer.aclose()
+            self.summarizer = None
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self.client is not None:
+            yield self.client
+        else:
+            async with self._new_client() as client:
+                yield client
+
+    async def get_symbols(self, client: httpx.AsyncClient, force: bool = False) -> List[str]:
+        """On an exchangeInfo failure the last known list (or the cached symbols) is reused."""
+        if not force and not self.symbols:
+            self._load_symbols()
+        if force or not self.symbols or time.time() - self.symbols_at > self.symbols_ttl_sec:
+            try:
+                self.symbols = usdt_perpetuals(await self.binance.exchange_info(client))
+                self.symbols_at = time.time()
+                self._save_symbols()
+            except Exception as e:
+                self.symbols = self.symbols or sorted(self.kline_cache.closed)
+                if not self.symbols:
+                    raise
+                log_json("symbols_stale", error=repr(e), symbols=len(self.symbols))
+        return self.symbols
+
+    def _load_symbols(self) -> None:
+        try:
+            with open(self.symbols_path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+            self.symbols, self.symbols_at = list(obj["symbols"]), float(obj["at"])
+        except Exception:
+            pass
+
+    def _save_symbols(self) -> None:
+        tmp = f"{self.symbols_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"at": self.symbols_at, "symbols": self.symbols}, f, separators=(",", ":"))
+            os.replace(tmp, self.symbols_path)
+        except OSError as e:
+            log_json("symbols_cache_write_failed", error=repr(e))
+
+    async def prewarm(self) -> None:
+        """
+        Run shortly before the hour boundary: open pool connections, refresh symbol
+        metadata and load every candle closed so far, so the boundary cycle only needs
+        the just-closed candle per symbol.
+        """
+        t0 = time.perf_counter()
+        self.kline_cache.ensure_loaded()
+        async with self.session() as client:
+            symbols = await self.get_symbols(client, force=True)
+            if self.stream is not None and self.stream.healthy():
+                # the stream keeps the candles current (and backfills its own gaps)
+                log_json("prewarm", symbols=len(symbols), stream=True)
+                return
+            if self.shards is not None:
+                # the workers hold the candles: a discarded scan brings their caches up to date
+                _, errors = await self.shards.scan(symbols, DEFAULT_WINDOWS, float(os.getenv("SCAN_DEADLINE_SEC", "60")))
+                log_json("prewarm", symbols=len(symbols), failed=len(errors), shards=self.shards.workers)
+                return
+            self.kline_cache.prune(symbols)
+
+            async def fetch(symbol: str, limit: int) -> List[Candle]:
+                return await self.binance.candles_1h(client, symbol=symbol, limit=limit)
+
+            results = await asyncio.gather(
+                *[self.kline_cache.refresh(sym, fetch) for sym in symbols], return_exceptions=True
+            )
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        self.kline_cache.save()
+        elapsed = time.perf_counter() - t0
+        METRICS.observe("stage_seconds", elapsed, stage="prewarm")
+        log_json("prewarm", symbols=len(symbols), failed=failed, elapsed_ms=round(elapsed * 1000.0, 1))
@@ -0,0 +1,354 @@
+import heapq
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kline_cache import KlineCache
+
+
+class Window(NamedTuple):
+    label: str  # bucket prefix, e.g. "12H" -> 12H_UP / 12H_DOWN
+    hours: int
+    title: str  # report section header
+
+
+WINDOWS: Dict[str, Window] = {
+    "1H": Window("1H", 1, "⚡ 1H (최근 1시간)"),
+    "4H": Window("4H", 4, "⏱ 4H (최근 4시간)"),
+    "12H": Window("12H", 12, "⏱ 12H (최근 12시간)"),
+    "24H": Window("24H", 24, "🗓 1D (최근 24시간)"),
+    "7D": Window("7D", 168, "📅 7D (최근 7일)"),
+}
+
+DEFAULT_WINDOWS: List[Window] = [WINDOWS["12H"], WINDOWS["24H"]]
+
+
+def parse_windows(spec: str) -> List[Window]:
+    """"12H,24H" -> [Window, ...]; unknown labels raise ValueError."""
+    out = []
+    for label in [x.strip().upper() for x in spec.split(",") if x.strip()]:
+        if label not in WINDOWS:
+            raise ValueError(f"unknown window: {label} (known: {', '.join(WINDOWS)})")
+        out.append(WINDOWS[label])
+    return out
+
+
+def buckets_for(windows: Sequence[Window]) -> List[Tuple[str, str, bool]]:
+    """(bucket, column, largest) per window: top and bottom return."""
+    out = []
+    for w in windows:
+        out.append((f"{w.label}_UP", f"ret{w.hours}", True))
+        out.append((f"{w.label}_DOWN", f"ret{w.hours}", False))
+    return out
+
+
+# (bucket, column, largest)
+DEFAULT_BUCKETS: List[Tuple[str, str, bool]] = buckets_for(DEFAULT_WINDOWS)
+
+
+def pct_return(closes: np.ndarray, hours: int) -> np.ndarray:
+    """Return (%) of the last close vs the close `hours` candles earlier. NaN if missing or zero."""
+    last = closes[:, -1]
+    base = closes[:, -(hours + 1)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (last / base - 1.0) * 100.0
+    out[(base == 0) | (last == 0)] = np.nan
+    return out
+
+
+def volume_ratio(vols: np.ndarray, lookback: int = 12) -> np.ndarray:
+    """Last candle volume vs mean of the previous `lookback` candles."""
+    base = vols[:, -(lookback + 1):-1]
+    n = np.sum(~np.isnan(base), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.nansum(base, axis=1) / n
+        out = vols[:, -1] / avg
+    out[~(avg > 0)] = np.nan
+    return out
+
+
+def _prefix(x: np.ndarray) -> np.ndarray:
+    """Row-wise prefix sums with a leading zero column: p[:, j] = sum(x[:, :j])."""
+    return np.concatenate([np.zeros((x.shape[0], 1)), np.cumsum(x, axis=1)], axis=1)
+
+
+def window_columns(closes: np.ndarray, vols: np.ndarray, hours: Sequence[int]) -> Dict[str, np.ndarray]:
+    """
+    Per window h, from one pass of prefix sums over the shared candle buffer:
+    - ret{h}: % return over the last h candles
+    - vol_ratio{h}: mean volume of the last h candles vs the h candles before them
+    - rv{h}: realized volatility, std of hourly log returns over the last h candles (%)
+    A value is NaN unless every candle it needs is present.
+    """
+    n_sym, n = closes.shape
+    ok = ~np.isnan(closes) & (closes > 0) & ~np.isnan(vols)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logc = np.where(ok, np.log(np.where(ok, closes, 1.0)), 0.0)
+    r_ok = ok[:, 1:] & ok[:, :-1]
+    r = np.where(r_ok, np.diff(logc, axis=1), 0.0)
+    p_ok, p_r, p_r2 = _prefix(ok.astype(float)), _prefix(r), _prefix(r * r)
+    p_rok = _prefix(r_ok.astype(float))
+    p_v = _prefix(np.where(ok, vols, 0.0))
+
+    out: Dict[str, np.ndarray] = {}
+    nan = np.full(n_sym, np.nan)
+    for h in hours:
+        ret = pct_return(closes, h) if h < n else nan.copy()
+        if h < n:
+            ret[~(ok[:, -1] & ok[:, -(h + 1)])] = np.nan
+        out[f"ret{h}"] = ret
+
+        if 2 * h <= n:
+            full = (p_ok[:, n] - p_ok[:, n - 2 * h]) == 2 * h
+            last = p_v[:, n] - p_v[:, n - h]
+            prev = p_v[:, n - h] - p_v[:, n - 2 * h]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                vr = last / prev
+            vr[~full | ~(prev > 0)] = np.nan
+        else:
+            vr = nan.copy()
+        out[f"vol_ratio{h}"] = vr
+
+        if 2 <= h < n:
+            m = n - 1
+            full = (p_rok[:, m] - p_rok[:, m - h]) == h
+            s1 = p_r[:, m] - p_r[:, m - h]
+            s2 = p_r2[:, m] - p_r2[:, m - h]
+            var = np.maximum((s2 - s1 * s1 / h) / (h - 1), 0.0)
+            rv = np.sqrt(var) * 100.0
+            rv[~full] = np.nan
+        else:
+            rv = nan.copy()
+        out[f"rv{h}"] = rv
+    return out
+
+
+def rolling_window_columns(
+    closes: np.ndarray, vols: np.ndarray, hours: Sequence[int], depth: int, lookback: int = 12
+) -> Dict[str, np.ndarray]:
+    """
+    MarketScan's columns (window_columns for `hours`, vol_ratio, price) for every step of
+    a (time x symbols) block at once: row t holds what a MarketScan over the `depth`
+    candles ending at t would give. Prefix sums run along time once, so a block costs
+    O(time x symbols) instead of O(time x symbols x depth). Rows before the first full
+    `depth` window are NaN.
+    """
+    T, S = closes.shape
+    ok = ~np.isnan(closes) & (closes > 0) & ~np.isnan(vols)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logc = np.where(ok, np.log(np.where(ok, closes, 1.0)), 0.0)
+    # r[t]: log return from t-1 to t
+    r_ok = np.zeros_like(ok)
+    r_ok[1:] = ok[1:] & ok[:-1]
+    r = np.zeros((T, S))
+    r[1:] = np.where(r_ok[1:], np.diff(logc, axis=0), 0.0)
+
+    def prefix(x: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.zeros((1, S)), np.cumsum(x, axis=0)])
+
+    def wsum(p: np.ndarray, k: int, lag: int = 0) -> np.ndarray:
+        """Sum over rows t-lag-k+1 .. t-lag, per row t (NaN where that reaches before row 0)."""
+        out = np.full((T, S), np.nan)
+        if lag + k - 1 < T:
+            out[lag + k - 1:] = p[k : T - lag + 1] - p[: T - lag - k + 1]
+        return out
+
+    p_ok, p_r, p_r2 = prefix(ok.astype(float)), prefix(r), prefix(r * r)
+    p_rok = prefix(r_ok.astype(float))
+    p_v = prefix(np.where(ok, vols, 0.0))
+
+    out: Dict[str, np.ndarray] = {}
+    nan = np.full((T, S), np.nan)
+    for h in hours:
+        ret = nan.copy()
+        if h < min(depth, T):
+            last, base = closes[h:], closes[:-h]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ret[h:] = (last / base - 1.0) * 100.0
+            ret[h:][(base == 0) | (last == 0) | ~(ok[h:] & ok[:-h])] = np.nan
+        out[f"ret{h}"] = ret
+
+        if 2 * h <= depth:
+            full = wsum(p_ok, 2 * h) == 2 * h
+            last, prev = wsum(p_v, h), wsum(p_v, h, h)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                vr = last / prev
+            vr[~full | ~(prev > 0)] = np.nan
+        else:
+            vr = nan.copy()
+        out[f"vol_ratio{h}"] = vr
+
+        if 2 <= h < depth:
+            full = wsum(p_rok, h) == h
+            s1, s2 = wsum(p_r, h), wsum(p_r2, h)
+            with np.errstate(invalid="ignore"):
+                var = np.maximum((s2 - s1 * s1 / h) / (h - 1), 0.0)
+            rv = np.sqrt(var) * 100.0
+            rv[~full] = np.nan
+        else:
+            rv = nan.copy()
+        out[f"rv{h}"] = rv
+
+    # volume_ratio: last candle vs the mean of the previous `lookback`
+    n = wsum(prefix((~np.isnan(vols)).astype(float)), lookback, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = wsum(prefix(np.nan_to_num(vols)), lookback, 1) / n
+        vr = vols / avg
+    vr[~(avg > 0)] = np.nan
+    out["vol_ratio"] = vr
+    out["price"] = closes.copy()
+    for col in out.values():
+        col[: depth - 1] = np.nan
+    return out
+
+
+def top_k(values: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    """Indices of the k largest (or smallest) non-NaN values, best first."""
+    idx = np.flatnonzero(~np.isnan(values))
+    if idx.size == 0 or k <= 0:
+        return idx[:0]
+    v = -values[idx] if largest else values[idx]
+    k = min(k, idx.size)
+    part = np.argpartition(v, k - 1)[:k]
+    return idx[part[np.argsort(v[part], kind="stable")]]
+
+
+class MarketScan:
+    """
+    Columnar view of the universe: one (symbols x hours) array for closes and volumes,
+    right-aligned (live candle last) and NaN-padded for short histories. Window columns
+    (ret{h}, vol_ratio{h}, rv{h}) come from window_columns; vol_ratio is last candle
+    vs the previous 12 and price the last close.
+    """
+
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        closes: np.ndarray,
+        vols: np.ndarray,
+        windows: Sequence[Window] = DEFAULT_WINDOWS,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        """columns: precomputed (see rolling_window_columns); computed from closes/vols if omitted."""
+        self.symbols = list(symbols)
+        self.closes = closes
+        self.vols = vols
+        self.windows = list(windows)
+        if columns is None:
+            columns = window_columns(closes, vols, [w.hours for w in self.windows])
+            columns["vol_ratio"] = volume_ratio(vols, 12)
+            columns["price"] = closes[:, -1]
+        self.columns: Dict[str, np.ndarray] = columns
+
+    @staticmethod
+    def depth(windows: Sequence[Window]) -> int:
+        """Candles needed per symbol (incl. live) for every column of these windows."""
+        return max([2 * w.hours for w in windows] + [13]) + 1
+
+    @classmethod
+    def from_cache(
+        cls,
+        symbols: Sequence[str],
+        cache: KlineCache,
+        windows: Sequence[Window] = DEFAULT_WINDOWS,
+        prices: Optional[Dict[str, Optional[float]]] = None,
+    ) -> "MarketScan":
+        """prices: newer last prices that replace the live candle's close where present."""
+        hours = min(cls.depth(windows), cache.maxlen + 1)
+        closes = np.full((len(symbols), hours), np.nan)
+        vols = np.full((len(symbols), hours), np.nan)
+        for i, sym in enumerate(symbols):
+            c, v = cache.window(sym, hours)
+            if c:
+                closes[i, hours - len(c):] = c
+                vols[i, hours - len(v):] = v
+                if prices and prices.get(sym):
+                    closes[i, -1] = prices[sym]
+        return cls(symbols, closes, vols, windows)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"symbol": self.symbols[i]}
+        for name, col in self.columns.items():
+            x = col[i]
+            out[name] = None if np.isnan(x) else float(x)
+        return out
+
+    def pick(
+        self,
+        buckets: Sequence[Tuple[str, str, bool]] = DEFAULT_BUCKETS,
+        n: int = 1,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        n picks per bucket (ranked 1..n), unique by symbol: a symbol already taken by an
+        earlier bucket is replaced with the next best of the same ranking. mask: symbols
+        eligible for picking (default all).
+        """
+        used = set()
+        out = []
+        for bucket, key, largest in buckets:
+            col = self.columns[key] if mask is None else np.where(mask, self.columns[key], np.nan)
+            # fewer than n * len(buckets) symbols are taken, so this many candidates always suffice
+            cands = [int(i) for i in top_k(col, n * len(buckets), largest)]
+            if not cands:
+                continue
+            chosen = ([i for i in cands if i not in used] + [i for i in cands if i in used])[:n]
+            used.update(chosen)
+            out.extend({**self.row(i), "bucket": bucket, "rank": r} for r, i in enumerate(chosen, 1))
+        return out
+
+
+def symbol_moves(
+    symbol: str,
+    closes: Sequence[float],
+    vols: Sequence[float],
+    windows: Sequence[Window] = DEFAULT_WINDOWS,
+) -> Dict[str, Any]:
+    """Scan columns for a single symbol, same math (and NaN rules) as MarketScan."""
+    n = max(len(closes), 1)
+    c = np.full((1, n), np.nan)
+    v = np.full((1, n), np.nan)
+    if closes:
+        c[0], v[0] = closes, vols
+    return MarketScan([symbol], c, v, windows).row(0)
+
+
+class StreamingTopK:
+    """
+    Running top-k per bucket while scan results stream in (each symbol offered once).
+    Used to guess the final picks early; MarketScan.pick stays the source of truth.
+    """
+
+    def __init__(self, buckets: Sequence[Tuple[str, str, bool]] = DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.k = len(self.buckets)
+        self.heaps: List[List[Tuple[float, str]]] = [[] for _ in self.buckets]
+        self.seen = 0
+
+    def offer(self, row: Dict[str, Any]) -> bool:
+        """Add one symbol's scan row. Returns True if any bucket's top-k changed."""
+        self.seen += 1
+        changed = False
+        for (_, key, largest), h in zip(self.buckets, self.heaps):
+            x = row.get(key)
+            if x is None:
+                continue
+            # min-heap of the k best; negate for "smallest" buckets
+            item = (x if largest else -x, row["symbol"])
+            if len(h) < self.k:
+                heapq.heappush(h, item)
+                changed = True
+            elif item > h[0]:
+                heapq.heapreplace(h, item)
+                changed = True
+        return changed
+
+    def leaders(self) -> List[str]:
+        """Current unique pick per bucket (same replacement rule as MarketScan.pick)."""
+        used: List[str] = []
+        for h in self.heaps:
+            ranked = [s for _, s in sorted(h, reverse=True)]
+            if not ranked:
+                continue
+            used.append(next((s for s in ranked if s not in used), ranked[0]))
+        return used
@@ -0,0 +1,97 @@
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Tuple
+
+HOUR_MS = 3_600_000
+
+FIELDS = ("oi", "funding", "mark")
+
+# (symbol, hour open ms, oi, funding, mark)
+Row = Tuple[str, int, Optional[float], Optional[float], Optional[float]]
+
+
+def hour_ts(now_ms: Optional[int] = None) -> int:
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return now_ms // HOUR_MS * HOUR_MS
+
+
+class SeriesStore:
+    """
+    Hourly OI / funding / mark price per symbol in SQLite (WAL).
+    - one row per (symbol, hour); later writes in the same hour fill or overwrite fields
+    - every write batch is a single transaction, so a crash never leaves a partial hour
+    - (symbol, ts) primary key serves point lookups and range queries without a full load
+    """
+
+    def __init__(self, path: str = "market.db", retention_days: int = 30):
+        self.path = path
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS market ("
+                " symbol TEXT NOT NULL, ts INTEGER NOT NULL,"
+                " oi REAL, funding REAL, mark REAL,"
+                " PRIMARY KEY (symbol, ts)) WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS market_ts ON market (ts)")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def record(self, rows: Iterable[Row]) -> int:
+        """Upsert rows; None fields keep what is already stored for that hour."""
+        rows = list(rows)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO market (symbol, ts, oi, funding, mark) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (symbol, ts) DO UPDATE SET "
+                " oi = COALESCE(excluded.oi, oi),"
+                " funding = COALESCE(excluded.funding, funding),"
+                " mark = COALESCE(excluded.mark, mark)",
+                rows,
+            )
+        return len(rows)
+
+    def range(self, symbol: str, start_ts: int, end_ts: int) -> List[Row]:
+        """Rows with start_ts <= ts <= end_ts, oldest first."""
+        cur = self.conn.execute(
+            "SELECT symbol, ts, oi, funding, mark FROM market"
+            " WHERE symbol = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (symbol, start_ts, end_ts),
+        )
+        return cur.fetchall()
+
+    def value_at(self, symbol: str, field: str, ts: int, max_age_ms: int = HOUR_MS) -> Optional[float]:
+        """Latest non-null field at or before ts, no older than max_age_ms."""
+        if field not in FIELDS:
+            raise ValueError(f"unknown field: {field}")
+        cur = self.conn.execute(
+            f"SELECT {field} FROM market WHERE symbol = ? AND ts <= ? AND ts > ? AND {field} IS NOT NULL"
+            " ORDER BY ts DESC LIMIT 1",
+            (symbol, ts, ts - max_age_ms),
+        )
+        row = cur.fetchone()
+        return None if row is None else row[0]
+
+    def change_pct(self, symbol: str, field: str, hours: int, ts: Optional[int] = None) -> Optional[float]:
+        """% change of field between hour ts and `hours` hours earlier."""
+        ts = hour_ts() if ts is None else ts
+        now = self.value_at(symbol, field, ts)
+        prev = self.value_at(symbol, field, ts - hours * HOUR_MS)
+        if now is None or prev is None or prev <= 0:
+            return None
+        return (now / prev - 1.0) * 100.0
+
+    def compact(self, now_ms: Optional[int] = None) -> int:
+        """Drop rows past retention and give the space back. Returns rows deleted."""
+        cutoff = hour_ts(now_ms) - self.retention_days * 24 * HOUR_MS
+        with self.conn:
+            n = self.conn.execute("DELETE FROM market WHERE ts < ?", (cutoff,)).rowcount
+        if n:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return n
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import pickle
+import time
+import zlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from indicators import IndicatorBook
+from kline_cache import Candle, KlineCache
+from metrics import METRICS, log_json
+from scan import MarketScan, Window
+
+
+def shard_of(symbol: str, shards: int) -> int:
+    """Stable across runs and processes (unlike hash()), so a symbol stays with its shard's cache."""
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def weight_share(workers: int) -> float:
+    """Each process's share of the IP's request weight: the workers plus the coordinator (bulk calls, OI, alerts)."""
+    return 1.0 / (workers + 1) if workers > 1 else 1.0
+
+
+def shard_path(path: str, index: int) -> str:
+    """klines.json -> klines.shard0.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+class ShardResult(NamedTuple):
+    symbols: List[str]  # scanned, in column order
+    columns: Dict[str, np.ndarray]  # MarketScan columns plus ema50 / rsi (live close applied)
+    errors: List[Exception]
+    elapsed_sec: float
+
+
+def _portable(e: Exception) -> Exception:
+    """The exception itself if it survives pickling (httpx errors do not), else a stand-in with its repr."""
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(repr(e))
+
+
+async def scan_shard(rt: Any, book: IndicatorBook, symbols: List[str], windows: Sequence[Window], deadline_sec: float) -> ShardResult:
+    """One shard's part of the klines scan, as build_report runs it unsharded."""
+    t0 = time.perf_counter()
+    kline_cache = rt.kline_cache
+    kline_cache.prune(symbols)
+    book.prune(symbols)
+
+    async with rt.session() as client:
+        async def fetch_klines(symbol: str, limit: int) -> List[Candle]:
+            return await rt.binance.candles_1h(client, symbol=symbol, limit=limit)
+
+        async def refresh_symbol(symbol: str) -> str:
+            await kline_cache.refresh(symbol, fetch_klines)
+            book.advance(symbol, kline_cache.closed.get(symbol, []))
+            return symbol
+
+        tasks = [asyncio.create_task(refresh_symbol(s)) for s in symbols]
+        _, pending = await asyncio.wait(tasks, timeout=deadline_sec) if tasks else (set(), set())
+    scanned, errors = [], []
+    for t in tasks:
+        if t in pending:
+            t.cancel()
+            errors.append(asyncio.TimeoutError("scan deadline"))
+        elif t.exception() is not None:
+            errors.append(_portable(t.exception()))
+        else:
+            scanned.append(t.result())
+
+    scan = MarketScan.from_cache(scanned, kline_cache, windows)
+    columns = dict(scan.columns)
+    ind = [book.values(s, kline_cache.live[s][1] if s in kline_cache.live else None) for s in scanned]
+    columns["ema50"] = np.array([np.nan if e is None else e for e, _ in ind], dtype=float)
+    columns["rsi"] = np.array([np.nan if r is None else r for _, r in ind], dtype=float)
+    return ShardResult(scanned, columns, errors, time.perf_counter() - t0)
+
+
+async def _serve(index: int, conn, transport_factory: Optional[Callable[[], Any]]) -> None:
+    # imported here: runtime owns the pool that starts these processes
+    from runtime import Runtime
+
+    cache_path = shard_path(os.getenv("KLINE_CACHE_PATH", "klines.json"), index)
+    ind_path = shard_path(os.getenv("SHARD_INDICATORS_PATH", "indicators.json"), index)
+    rt = Runtime(KlineCache(cache_path), transport=transport_factory() if transport_factory else None)
+    await rt.open()
+    rt.kline_cache.ensure_loaded()
+    book = IndicatorBook(ema_period=50, rsi_period=14)
+    try:
+        with open(ind_path, "r", encoding="utf-8") as f:
+            book.load(json.load(f))
+    except Exception:
+        pass
+    try:
+        while True:
+            job = await asyncio.to_thread(conn.recv)
+            if job is None:
+                return
+            symbols, windows, deadline_sec = job
+            conn.send(await scan_shard(rt, book, symbols, windows, deadline_sec))
+            # persisted after the reply: cache writes are off the coordinator's critical path
+            try:
+                rt.kline_cache.save()
+                tmp = f"{ind_path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(book.dump(), f, separators=(",", ":"))
+                os.replace(tmp, ind_path)
+            except OSError as e:
+                log_json("shard_persist_failed", shard=index, error=repr(e))
+    finally:
+        await rt.close()
+
+
+def _worker_main(index: int, shards: int, conn, transport_factory: Optional[Callable[[], Any]]) -> None:
+    # each worker gets an equal share of the request weight (as does the coordinator) and
+    # of the connection budget; the limit itself stays the IP's, which the used-weight
+    # header is measured against
+    os.environ["BINANCE_WEIGHT_SHARE"] = str(weight_share(shards))
+    os.environ["CONCURRENCY"] = str(max(2, int(os.getenv("CONCURRENCY", "20")) // shards))
+    asyncio.run(_serve(index, conn, transport_factory))
+
+
+class ShardPool:
+    """
+    Klines scan over worker processes (SCAN_WORKERS > 1) for universes where decoding,
+    candle merging and window math saturate one core. Symbols are split by a stable
+    hash, so each long-lived worker keeps its shard's kline cache and indicator state
+    in memory (and in klines.shardN.json between runs). A worker fetches and scans
+    its shard with its own pool and a 1/(N+1) share of the Binance weight budget (the
+    coordinator keeps one share for its bulk calls), and sends back the shard's
+    columns; the coordinator concatenates them into one MarketScan, so picks, profile
+    filters and /top are exactly those of an unsharded scan.
+    transport_factory: picklable callable giving each worker its httpx transport (bench).
+    """
+
+    def __init__(self, workers: int, transport_factory: Optional[Callable[[], Any]] = None):
+        self.workers = workers
+        self.transport_factory = transport_factory
+        self._procs: List[Optional[Tuple[Any, Any]]] = [None] * workers
+
+    def _start(self, index: int) -> Tuple[Any, Any]:
+        # spawn: a forked child would inherit the coordinator's running event loop
+        ctx = mp.get_context("spawn")
+        parent, child = ctx.Pipe()
+        p = ctx.Process(
+            target=_worker_main,
+            args=(index, self.workers, child, self.transport_factory),
+            name=f"scan-shard-{index}",
+            daemon=True,
+        )
+        p.start()
+        child.close()
+        return p, parent
+
+    def _stop(self, index: int) -> None:
+        proc = self._procs[index]
+        self._procs[index] = None
+        if proc is not None:
+            proc[0].kill()
+            proc[1].close()
+
+    async def _scan_one(self, index: int, symbols: List[str], windows: Sequence[Window], deadline_sec: float) -> ShardResult:
+        if self._procs[index] is None or not self._procs[index][0].is_alive():
+            self._procs[index] = self._start(index)
+        _, conn = self._procs[index]
+        try:
+            conn.send((symbols, list(windows), deadline_sec))
+            # the worker enforces the deadline itself; this bound covers a worker that hangs or starts slowly
+            return await asyncio.wait_for(asyncio.to_thread(conn.recv), deadline_sec + 30.0)
+        except (Exception, asyncio.CancelledError):
+            # restarted (with its cache reloaded from disk) on the next cycle
+            self._stop(index)
+            raise
+
+    async def scan(
+        self, symbols: Sequence[str], windows: Sequence[Window], deadline_sec: float
+    ) -> Tuple[MarketScan, List[Exception]]:
+        """One cycle's scan of `symbols`; a failed shard drops its symbols (errors), not the report."""
+        parts: List[List[str]] = [[] for _ in range(self.workers)]
+        for sym in symbols:
+            parts[shard_of(sym, self.workers)].append(sym)
+        results = await asyncio.gather(
+            *[self._scan_one(i, part, windows, deadline_sec) for i, part in enumerate(parts)], return_exceptions=True
+        )
+        done: List[ShardResult] = []
+        errors: List[Exception] = []
+        for i, (part, r) in enumerate(zip(parts, results)):
+            if isinstance(r, BaseException):
+                log_json("shard_failed", shard=i, symbols=len(part), error=repr(r))
+                errors.extend([r] * len(part))
+                continue
+            METRICS.observe("shard_scan_seconds", r.elapsed_sec, shard=str(i))
+            done.append(r)
+            errors.extend(r.errors)
+
+        scanned = [s for r in done for s in r.symbols]
+        # an empty scan gives the column names (and dtypes) even if every shard failed
+        base = MarketScan([], np.empty((0, 1)), np.empty((0, 1)), windows).columns
+        base.update(ema50=np.empty(0), rsi=np.empty(0))
+        columns = {k: np.concatenate([v] + [r.columns[k] for r in done]) for k, v in base.items()}
+        empty = np.empty((len(scanned), 0))
+        return MarketScan(scanned, empty, empty, windows, columns=columns), errors
+
+    def close(self) -> None:
+        for i, proc in enumerate(self._procs):
+            if proc is None:
+                continue
+            p, conn = proc
+            try:
+                conn.send(None)
+                p.join(5.0)
+            except Exception:
+                pass
+            self._stop(i)
@@ -0,0 +1,146 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from indicators import IndicatorBook
+from kline_cache import KlineCache
+from scan import WINDOWS, MarketScan, top_k
+
+# REPORT_EXTREMES name -> snapshot field
+EXTREME_FIELDS = {"funding": "funding", "basis": "basis_pct"}
+
+
+def _f(x: Any) -> Optional[float]:
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+class MarketRow:
+    """Per-symbol snapshot values; slots keep a universe of rows small."""
+
+    __slots__ = ("last_price", "quote_vol", "pct_24h", "mark", "index", "funding", "basis_pct")
+
+    def __init__(self):
+        self.last_price: Optional[float] = None
+        self.quote_vol: Optional[float] = None
+        self.pct_24h: Optional[float] = None
+        self.mark: Optional[float] = None
+        self.index: Optional[float] = None
+        self.funding: Optional[float] = None
+        self.basis_pct: Optional[float] = None
+
+
+EMPTY_ROW = MarketRow()
+
+# the only payload keys join_snapshot reads (see decode.pick_columns)
+TICKER_FIELDS = ("symbol", "lastPrice", "quoteVolume", "priceChangePercent")
+PREMIUM_FIELDS = ("symbol", "markPrice", "indexPrice", "lastFundingRate")
+
+Columns = Dict[str, Sequence[Any]]
+
+
+def join_snapshot(tickers: Columns, premiums: Columns) -> Dict[str, MarketRow]:
+    """
+    Universe-wide per-symbol row from the bulk ticker/24hr and premiumIndex payloads,
+    given as columns (TICKER_FIELDS / PREMIUM_FIELDS; str or bytes values):
+    last_price, quote_vol, pct_24h, mark, index, funding, basis_pct (mark vs index, %).
+    Symbols missing from one payload keep None for its fields; {} skips a payload.
+    """
+    out: Dict[str, MarketRow] = {}
+
+    def row(sym: Any) -> MarketRow:
+        sym = sym.decode() if isinstance(sym, bytes) else sym
+        r = out.get(sym)
+        if r is None:
+            r = out[sym] = MarketRow()
+        return r
+
+    if tickers:
+        for sym, last, qv, pct in zip(
+            tickers["symbol"], tickers["lastPrice"], tickers["quoteVolume"], tickers["priceChangePercent"]
+        ):
+            r = row(sym)
+            r.last_price = _f(last)
+            r.quote_vol = _f(qv)
+            r.pct_24h = _f(pct)
+
+    if premiums:
+        for sym, mark, index, funding in zip(
+            premiums["symbol"], premiums["markPrice"], premiums["indexPrice"], premiums["lastFundingRate"]
+        ):
+            r = row(sym)
+            r.mark = _f(mark)
+            r.index = _f(index)
+            r.funding = _f(funding)
+            if r.mark is not None and r.index:
+                r.basis_pct = (r.mark / r.index - 1.0) * 100.0
+    return out
+
+
+def extremes(
+    market: Dict[str, MarketRow], field: str, k: int, symbols: Iterable[str]
+) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    """(k highest, k lowest) (symbol, value) pairs of one snapshot field over `symbols`."""
+    syms = [s for s in symbols if s in market]
+    raw = [getattr(market[s], field) for s in syms]
+    vals = np.array([np.nan if x is None else x for x in raw], dtype=float)
+    hi = [(syms[i], float(vals[i])) for i in top_k(vals, k, True)]
+    lo = [(syms[i], float(vals[i])) for i in top_k(vals, k, False)]
+    return hi, lo
+
+
+class ScanSnapshot:
+    """
+    Latest universe state kept between cycles (Runtime.snapshot) for answers that must
+    not call Binance: market rows, scan columns for every window, indicator state.
+    The scan is built on first use; refresh() swaps in a newer bulk snapshot whose last
+    prices replace the live candle closes. A sharded scan (no local kline cache) is
+    passed in as `scan` and kept as is, its ema50 / rsi columns standing in for the book.
+    """
+
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        market: Dict[str, MarketRow],
+        kline_cache: Optional[KlineCache],
+        book: Optional[IndicatorBook] = None,
+        ts: Optional[float] = None,
+        scan: Optional[MarketScan] = None,
+    ):
+        self.symbols = list(symbols)
+        self.market = market
+        self.kline_cache = kline_cache
+        self.book = book
+        self.ts = time.time() if ts is None else ts
+        self._scan: Optional[MarketScan] = scan
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+
+    def age_sec(self) -> float:
+        return time.time() - self.ts
+
+    def refresh(self, market: Dict[str, MarketRow]) -> None:
+        self.market = market
+        self.ts = time.time()
+        if self.kline_cache is not None:
+            self._scan = None
+
+    @property
+    def scan(self) -> MarketScan:
+        if self._scan is None:
+            prices = {s: self.market[s].last_price for s in self.symbols if s in self.market}
+            self._scan = MarketScan.from_cache(self.symbols, self.kline_cache, list(WINDOWS.values()), prices)
+        return self._scan
+
+    def row(self, symbol: str) -> Optional[Dict[str, Any]]:
+        i = self._index.get(symbol)
+        return None if i is None else self.scan.row(i)
+
+    def indicators(self, symbol: str) -> Tuple[Optional[float], Optional[float]]:
+        """(ema50, rsi14) with the latest price as the live close."""
+        if self.book is None:
+            row = self.row(symbol) if self.kline_cache is None else None
+            return (row.get("ema50"), row.get("rsi")) if row else (None, None)
+        return self.book.values(symbol, self.market.get(symbol, EMPTY_ROW).last_price)
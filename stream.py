@@ -0,0 +1,264 @@
+import asyncio
+import json
+import random
+import time
+from importlib import import_module
+from importlib.util import find_spec
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from binance_client import BinanceFuturesClient
+from kline_cache import HOUR_MS, Candle, KlineCache
+from metrics import METRICS, log_json
+from snapshot import MarketRow, _f
+
+# all-market streams: 24h ticker (last price, quote volume, %), mark/index/funding every 1s
+MARKET_STREAMS = ["!ticker@arr", "!markPrice@arr@1s"]
+
+
+def websockets_available() -> bool:
+    return find_spec("websockets") is not None
+
+
+async def ws_messages(url: str) -> AsyncIterator[str]:
+    """Raw text frames of one WebSocket connection (optional `websockets` package)."""
+    websockets = import_module("websockets")
+    # Binance pings every 3 minutes; the library answers with pongs
+    async with websockets.connect(url, max_size=2**24, ping_interval=None) as ws:
+        async for msg in ws:
+            yield msg
+
+
+async def recorded_messages(path: str) -> AsyncIterator[str]:
+    """Stand-in for a connection: one combined-stream message per line of a recorded file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line
+                await asyncio.sleep(0)
+
+
+class StreamIngest:
+    """
+    Live market state from Binance combined WebSocket streams, in place of hourly REST polling:
+    - <symbol>@kline_1h per symbol (sharded over connections): the live candle goes to
+      kline_cache.live, closed candles are appended to kline_cache.closed
+    - !ticker@arr and !markPrice@arr@1s: one MarketRow per symbol (price, volume, funding, basis)
+    Closed candles are written through to the kline cache file shortly after each burst
+    of closes. A candle that does not follow the buffer (missed messages) and every
+    (re)connect trigger a REST backfill of the missing candles via klines.
+    `source(url)` replaces the WebSocket connection; with live=False (e.g. recorded_messages
+    for tests) a single source is read once, without reconnects.
+    """
+
+    def __init__(
+        self,
+        kline_cache: KlineCache,
+        binance: BinanceFuturesClient,
+        base_url: str = "wss://fstream.binance.com",
+        streams_per_conn: int = 200,
+        flush_delay_sec: float = 5.0,
+        source=None,
+        live: bool = True,
+    ):
+        self.kline_cache = kline_cache
+        self.binance = binance
+        self.base_url = base_url.rstrip("/")
+        self.streams_per_conn = streams_per_conn
+        self.flush_delay_sec = flush_delay_sec
+        self.source = source or ws_messages
+        self.live = live
+        self.market: Dict[str, MarketRow] = {}
+        self.market_at = 0.0
+        self.last_msg_at = 0.0
+        self.gaps: Set[str] = set()
+        self._gap_event = asyncio.Event()
+        self._closed_event = asyncio.Event()
+        self._flush: Optional[asyncio.TimerHandle] = None
+
+    # --- state -----------------------------------------------------------------
+
+    def healthy(self, max_silence_sec: float = 30.0) -> bool:
+        return bool(self.market) and time.time() - self.last_msg_at <= max_silence_sec
+
+    def market_snapshot(self) -> Dict[str, MarketRow]:
+        """Copies, so a report is not changed by messages arriving while it runs."""
+        out: Dict[str, MarketRow] = {}
+        for sym, r in self.market.items():
+            c = out[sym] = MarketRow()
+            for k in MarketRow.__slots__:
+                setattr(c, k, getattr(r, k))
+        return out
+
+    def missing_close(self, symbols: List[str], open_ms: int) -> List[str]:
+        """Symbols whose candle opened at open_ms has not closed in the cache yet."""
+        closed = self.kline_cache.closed
+        return [s for s in symbols if not closed.get(s) or closed[s][-1][0] < open_ms]
+
+    async def wait_closed(self, symbols: List[str], open_ms: int, timeout: float) -> List[str]:
+        """Wait up to timeout for the open_ms candle of every symbol; returns the ones still missing."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        missing = self.missing_close(symbols, open_ms)
+        while missing and loop.time() < deadline:
+            self._closed_event.clear()
+            try:
+                await asyncio.wait_for(self._closed_event.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                pass
+            missing = self.missing_close(missing, open_ms)
+        return missing
+
+    # --- messages ----------------------------------------------------------------
+
+    def on_message(self, raw: str) -> None:
+        """One WebSocket frame; a malformed or unexpected one is logged and skipped, never fatal to the connection."""
+        try:
+            self._on_frame(raw)
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError) as e:
+            METRICS.inc("stream_bad_frames_total", error=type(e).__name__)
+            log_json("stream_bad_frame", error=repr(e), frame=raw[:200])
+
+    def _on_frame(self, raw: str) -> None:
+        msg = json.loads(raw)
+        data = msg.get("data", msg)
+        self.last_msg_at = time.time()
+        if isinstance(data, list):
+            for d in data:
+                self._on_market(d)
+            self.market_at = self.last_msg_at
+            METRICS.inc("stream_messages_total", kind="market")
+            return
+        if data.get("e") == "kline":
+            self._on_kline(data)
+
+    def _row(self, sym: str) -> MarketRow:
+        r = self.market.get(sym)
+        if r is None:
+            r = self.market[sym] = MarketRow()
+        return r
+
+    def _on_market(self, d: Dict[str, Any]) -> None:
+        e = d.get("e")
+        if e == "24hrTicker":
+            r = self._row(d["s"])
+            r.last_price = _f(d.get("c"))
+            r.quote_vol = _f(d.get("q"))
+            r.pct_24h = _f(d.get("P"))
+        elif e == "markPriceUpdate":
+            r = self._row(d["s"])
+            r.mark = _f(d.get("p"))
+            r.index = _f(d.get("i"))
+            r.funding = _f(d.get("r"))
+            r.basis_pct = (r.mark / r.index - 1.0) * 100.0 if r.mark is not None and r.index else None
+
+    def _on_kline(self, d: Dict[str, Any]) -> None:
+        k = d["k"]
+        sym = d["s"]
+        candle: Candle = (int(k["t"]), float(k["c"]), float(k["v"]))
+        METRICS.inc("stream_messages_total", kind="kline")
+        if not k.get("x"):
+            live = self.kline_cache.live.get(sym)
+            if live is None or live[0] <= candle[0]:
+                self.kline_cache.live[sym] = candle
+            return
+        # event time -> candle close: how far behind the stream runs
+        METRICS.observe("stream_close_lag_seconds", max(0.0, d.get("E", 0) / 1000.0 - (candle[0] + HOUR_MS) / 1000.0))
+        if self.kline_cache.close_candle(sym, candle):
+            self._closed_event.set()
+            self._flush_soon()
+        else:
+            METRICS.inc("stream_gaps_total")
+            self.gaps.add(sym)
+            self._gap_event.set()
+
+    def _flush_soon(self) -> None:
+        # every symbol closes at the boundary: one write for the whole burst
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().call_later(self.flush_delay_sec, self._write_through)
+
+    def _write_through(self) -> None:
+        self._flush = None
+        try:
+            self.kline_cache.save()
+        except OSError as e:
+            log_json("stream_flush_failed", error=repr(e))
+
+    # --- connections -------------------------------------------------------------
+
+    def urls(self, symbols: List[str]) -> List[str]:
+        streams = MARKET_STREAMS + [f"{s.lower()}@kline_1h" for s in symbols]
+        n = self.streams_per_conn
+        return [
+            f"{self.base_url}/stream?streams=" + "/".join(streams[i : i + n]) for i in range(0, len(streams), n)
+        ]
+
+    async def _connection(self, url: str, on_connect) -> None:
+        """One connection, reconnected with jittered backoff for as long as the ingest runs."""
+        attempt = 0
+        while True:
+            try:
+                first = True
+                async for raw in self.source(url):
+                    if first:
+                        first, attempt = False, 0
+                        on_connect()
+                    self.on_message(raw)
+                if not self.live:
+                    return
+                log_json("stream_closed", url=url[:120])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_json("stream_error", url=url[:120], error=repr(e))
+            METRICS.inc("stream_reconnects_total")
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, min(60.0, 2 ** attempt)))
+
+    async def backfill(self, client: httpx.AsyncClient, symbols: List[str]) -> None:
+        """REST klines for candles the stream missed (only the missing ones are fetched)."""
+        async def fetch(symbol: str, limit: int) -> List[Candle]:
+            return await self.binance.candles_1h(client, symbol=symbol, limit=limit)
+
+        todo = [s for s in symbols if self.kline_cache.missing(s) > 0]
+        if not todo:
+            return
+        results = await asyncio.gather(*[self.kline_cache.refresh(s, fetch) for s in todo], return_exceptions=True)
+        failed = [s for s, r in zip(todo, results) if isinstance(r, Exception)]
+        METRICS.inc("stream_backfills_total", len(todo) - len(failed))
+        log_json("stream_backfill", symbols=len(todo), failed=len(failed))
+        self.gaps.update(failed)
+        if len(failed) < len(todo):
+            self._closed_event.set()
+            self._flush_soon()
+
+    async def run(self, client: httpx.AsyncClient, symbols: List[str]) -> None:
+        """Ingest until cancelled; symbols are fixed for the run (restart to resubscribe)."""
+        self.kline_cache.ensure_loaded()
+
+        def on_connect() -> None:
+            # anything may have been missed while disconnected
+            self.gaps.update(symbols)
+            self._gap_event.set()
+
+        urls = self.urls(symbols) if self.live else [self.base_url]
+        conns = [asyncio.create_task(self._connection(url, on_connect)) for url in urls]
+        log_json("stream_started", symbols=len(symbols), connections=len(conns))
+        try:
+            while True:
+                await self._gap_event.wait()
+                self._gap_event.clear()
+                gaps, self.gaps = sorted(self.gaps), set()
+                try:
+                    await self.backfill(client, gaps)
+                except Exception as e:
+                    log_json("stream_backfill_failed", error=repr(e))
+                    self.gaps.update(gaps)
+                if self.gaps:
+                    # failed backfills are retried, paced
+                    await asyncio.sleep(30)
+                    self._gap_event.set()
+        finally:
+            for t in conns:
+                t.cancel()
@@ -1,6 +1,8 @@
 import httpx
 from typing import Optional, Dict, Any
 
+from metrics import METRICS
+
 class TelegramClient:
     def __init__(self, bot_token: str, timeout_sec: int = 12):
         self.bot_token = bot_token
@@ -20,15 +22,24 @@ class TelegramClient:
             "text": text,
             "disable_web_page_preview": disable_web_page_preview,
         }
-        r = await client.post(url, json=payload)
+        with METRICS.span("http_request_seconds", service="telegram", endpoint="sendMessage"):
+            r = await client.post(url, json=payload)
+        METRICS.inc("http_responses_total", service="telegram", endpoint="sendMessage", code=r.status_code)
         r.raise_for_status()
         return r.json()
 
-    async def get_updates(self, client: httpx.AsyncClient, offset: Optional[int] = None) -> Dict[str, Any]:
+    async def get_updates(
+        self, client: httpx.AsyncClient, offset: Optional[int] = None, timeout: int = 0
+    ) -> Dict[str, Any]:
+        # timeout > 0: long polling, the server holds the request until an update arrives
         url = f"{self.base_url}/getUpdates"
         params = {}
         if offset is not None:
             params["offset"] = offset
-        r = await client.get(url, params=params)
+        if timeout:
+            params["timeout"] = timeout
+        with METRICS.span("http_request_seconds", service="telegram", endpoint="getUpdates"):
+            r = await client.get(url, params=params, timeout=(timeout + 10) if timeout else httpx.USE_CLIENT_DEFAULT)
+        METRICS.inc("http_responses_total", service="telegram", endpoint="getUpdates", code=r.status_code)
         r.raise_for_status()
         return r.json()
@@ -0,0 +1,151 @@
+"""BinanceFuturesClient / WeightLimiter against a local fake server (httpx.MockTransport)."""
+import asyncio
+import time
+import unittest
+from typing import Callable, List
+from unittest import mock
+
+import httpx
+
+import binance_client
+from binance_client import BinanceFuturesClient, WeightLimiter
+
+
+class FakeServer:
+    """Answers each request with the next response of a script (the last one repeats)."""
+
+    def __init__(self, script: List[Callable[[httpx.Request], httpx.Response]]):
+        self.script = script
+        self.requests: List[float] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(time.monotonic())
+        step = self.script[min(len(self.requests), len(self.script)) - 1]
+        return step(request)
+
+
+def ok(used: int = 10) -> Callable[[httpx.Request], httpx.Response]:
+    return lambda r: httpx.Response(200, json={"symbols": []}, headers={"X-MBX-USED-WEIGHT-1M": str(used)})
+
+
+def status(code: int, retry_after: int = None) -> Callable[[httpx.Request], httpx.Response]:
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+    return lambda r: httpx.Response(code, json={"code": -1, "msg": "fake"}, headers=headers)
+
+
+def refused(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("refused", request=request)
+
+
+class ClientTest(unittest.IsolatedAsyncioTestCase):
+    def client(self, server: FakeServer, **kw) -> BinanceFuturesClient:
+        self.http = httpx.AsyncClient(transport=httpx.MockTransport(server))
+        self.addAsyncCleanup(self.http.aclose)
+        kw.setdefault("hedge_min_sec", 0)
+        return BinanceFuturesClient("https://fapi.test", **kw)
+
+    async def test_429_retry_after_pauses_then_retries(self):
+        server = FakeServer([status(429, retry_after=1), ok()])
+        b = self.client(server, max_concurrency=8)
+        await b.exchange_info(self.http)
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreaterEqual(server.requests[1] - server.requests[0], 0.9)
+        # throttled: concurrency halved (one low-usage response grows it back by 1)
+        self.assertEqual(b.limiter.concurrency, 5)
+
+    async def test_418_retry_after_is_honoured(self):
+        server = FakeServer([status(418, retry_after=1), ok()])
+        b = self.client(server)
+        await b.exchange_info(self.http)
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreaterEqual(server.requests[1] - server.requests[0], 0.9)
+
+    async def test_ban_longer_than_max_retry_after_is_not_waited_out(self):
+        server = FakeServer([status(418, retry_after=3600)])
+        b = self.client(server, max_retry_after=120)
+        with self.assertRaises(httpx.HTTPStatusError):
+            await b.exchange_info(self.http)
+        self.assertEqual(len(server.requests), 1)
+
+    async def test_5xx_retried_with_growing_backoff(self):
+        server = FakeServer([status(503), status(502), ok()])
+        b = self.client(server)
+        with mock.patch.object(binance_client, "_backoff", wraps=lambda a: 0.01) as backoff:
+            await b.exchange_info(self.http)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual([c.args[0] for c in backoff.call_args_list], [0, 1])
+
+    async def test_5xx_gives_up_after_max_retries(self):
+        server = FakeServer([status(500)])
+        b = self.client(server, max_retries=2)
+        with mock.patch.object(binance_client, "_backoff", return_value=0.0):
+            with self.assertRaises(httpx.HTTPStatusError):
+                await b.exchange_info(self.http)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_backoff_full_jitter(self):
+        for attempt in range(6):
+            xs = [binance_client._backoff(attempt) for _ in range(200)]
+            cap = min(8.0, 0.5 * 2 ** attempt)
+            self.assertTrue(all(0 <= x <= cap for x in xs))
+            self.assertGreater(len(set(xs)), 1)
+
+    async def test_used_weight_header_syncs_tokens_and_halves_concurrency(self):
+        server = FakeServer([ok(used=1700)])
+        b = self.client(server, weight_limit=2400, max_concurrency=8)
+        await b.exchange_info(self.http)
+        lim = b.limiter
+        self.assertEqual(lim.used_weight, 1700)
+        # budget 2400 * 0.8 = 1920: 220 left at most
+        self.assertLessEqual(lim._tokens, 220 + 1e-6)
+        self.assertEqual(lim.concurrency, 4)
+
+    async def test_concurrency_recovers_when_usage_drops(self):
+        server = FakeServer([ok(used=1700), ok(used=1700), ok(used=10)])
+        b = self.client(server, weight_limit=2400, max_concurrency=8)
+        for _ in range(2):
+            await b.exchange_info(self.http)
+        self.assertEqual(b.limiter.concurrency, 2)
+        for _ in range(10):
+            await b.exchange_info(self.http)
+        self.assertEqual(b.limiter.concurrency, 8)
+
+    async def test_call_deadline_stops_retries(self):
+        server = FakeServer([refused])
+        b = self.client(server, max_retries=50, call_deadline_sec=0.3)
+        t0 = time.monotonic()
+        with mock.patch.object(binance_client, "_backoff", return_value=0.1):
+            with self.assertRaises(asyncio.TimeoutError):
+                await b.exchange_info(self.http)
+        self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertLess(len(server.requests), 6)
+
+
+class LimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_weight_budget_paces_acquires(self):
+        # 60 weight/min after the 0.8 safety factor: 1 per second once the bucket is spent
+        lim = WeightLimiter(75, max_concurrency=100)
+        t0 = time.monotonic()
+        for _ in range(61):
+            await lim.acquire(1)
+            await lim.release()
+        self.assertGreaterEqual(time.monotonic() - t0, 0.9)
+
+    async def test_shared_ip_usage_against_full_budget(self):
+        # one of four processes: IP-wide usage 700 of 1920 is fine, it gets a quarter of the headroom
+        lim = WeightLimiter(2400, max_concurrency=5, share=0.25)
+        await lim.acquire(1)
+        await lim.release(used_weight=700)
+        self.assertAlmostEqual(lim._tokens, (1920 - 700) * 0.25)
+        self.assertEqual(lim.concurrency, 5)
+
+    async def test_pause_blocks_every_caller(self):
+        lim = WeightLimiter(2400)
+        await lim.pause(0.3)
+        t0 = time.monotonic()
+        await lim.acquire(1)
+        self.assertGreaterEqual(time.monotonic() - t0, 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
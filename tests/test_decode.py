@@ -0,0 +1,57 @@
+"""Regex fast paths of decode against their json.loads fallbacks."""
+import json
+import unittest
+
+from decode import kline_candles, pick_columns
+from kline_cache import parse_klines
+
+KLINES = [
+    [1700000000000, "1.0", "2.0", "0.5", "1.5", "100.25", 1700003599999, "150.0", 10, "0", "0", "0"],
+    [1700003600000, "1.5", "2.5", "1.0", "2.0", "0", 1700007199999, "0.0", 0, "0", "0", "0"],
+]
+TICKERS = [
+    {"symbol": "AUSDT", "lastPrice": "1.50", "quoteVolume": "1000.5", "count": 12, "closeTime": 0},
+    {"symbol": "BUSDT", "lastPrice": "0.00001234", "quoteVolume": "0", "count": 0, "closeTime": 1},
+]
+
+
+def fallback_columns(objs, fields):
+    return {f: [str(o.get(f)).encode() for o in objs] for f in fields}
+
+
+class KlineCandlesTest(unittest.TestCase):
+    def test_fast_path_matches_json(self):
+        body = json.dumps(KLINES).encode()
+        self.assertEqual(kline_candles(body), parse_klines(KLINES))
+
+    def test_unrecognized_rows_fall_back_to_json(self):
+        # numbers instead of the usual strings: the pattern does not match
+        rows = [[r[0]] + [float(x) for x in r[1:6]] + r[6:] for r in KLINES]
+        self.assertEqual(kline_candles(json.dumps(rows).encode()), parse_klines(KLINES))
+
+    def test_empty(self):
+        self.assertEqual(kline_candles(b"[]"), [])
+
+
+class PickColumnsTest(unittest.TestCase):
+    FIELDS = ("symbol", "lastPrice", "count")
+
+    def test_fast_path_matches_json(self):
+        body = json.dumps(TICKERS, separators=(",", ":")).encode()
+        self.assertEqual(pick_columns(body, self.FIELDS), fallback_columns(TICKERS, self.FIELDS))
+        # whitespace between tokens, as json.dumps' defaults produce
+        self.assertEqual(pick_columns(json.dumps(TICKERS).encode(), self.FIELDS), fallback_columns(TICKERS, self.FIELDS))
+
+    def test_nested_objects_fall_back_to_json_with_the_same_result(self):
+        nested = [{**t, "extra": {"count": 99}} for t in TICKERS]
+        self.assertEqual(pick_columns(json.dumps(nested).encode(), self.FIELDS), fallback_columns(TICKERS, self.FIELDS))
+
+    def test_missing_field_falls_back_to_json(self):
+        objs = [TICKERS[0], {k: v for k, v in TICKERS[1].items() if k != "lastPrice"}]
+        cols = pick_columns(json.dumps(objs).encode(), self.FIELDS)
+        self.assertEqual(cols["lastPrice"], [b"1.50", b"None"])
+        self.assertEqual(cols["symbol"], [b"AUSDT", b"BUSDT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
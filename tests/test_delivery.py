@@ -0,0 +1,33 @@
+"""Per-chat pacing and ordering of DeliveryQueue."""
+import asyncio
+import time
+import unittest
+
+from delivery import DeliveryQueue
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.sent = []  # (chat_id, text, monotonic time)
+
+    async def send_message(self, client, chat_id, text):
+        self.sent.append((chat_id, text, time.monotonic()))
+        await asyncio.sleep(0)
+
+
+class SharedChatTest(unittest.IsolatedAsyncioTestCase):
+    async def test_profiles_sharing_a_chat_are_paced_and_not_interleaved(self):
+        tg = FakeTelegram()
+        q = DeliveryQueue(tg, global_rate=1000.0, private_interval=0.05)
+        a = "a" * 4000 + "\n" + "a" * 4000
+        b = "b" * 4000 + "\n" + "b" * 4000
+        await asyncio.gather(q.deliver(None, ["42"], a), q.deliver(None, ["42"], b))
+
+        texts = [t[0] for _, t, _ in tg.sent]
+        self.assertIn(texts, (["a", "a", "b", "b"], ["b", "b", "a", "a"]))
+        gaps = [t2 - t1 for (_, _, t1), (_, _, t2) in zip(tg.sent, tg.sent[1:])]
+        self.assertTrue(all(g >= 0.045 for g in gaps), gaps)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Incremental EMA/RSI state against the batch ema()/rsi()."""
+import json
+import random
+import unittest
+
+from indicators import EMAState, IndicatorBook, RSIState, ema, rsi
+
+HOUR_MS = 3_600_000
+
+
+def closes(n: int = 120, seed: int = 3):
+    rng = random.Random(seed)
+    p, out = 100.0, []
+    for _ in range(n):
+        p *= 1.0 + rng.gauss(0, 0.02)
+        out.append(p)
+    return out
+
+
+class StateTest(unittest.TestCase):
+    def test_update_and_peek_match_the_batch_functions(self):
+        xs = closes()
+        e, r = EMAState(50), RSIState(14)
+        for i, v in enumerate(xs):
+            self.assertEqual(e.peek(v), ema(xs[: i + 1], 50))
+            self.assertEqual(r.peek(v), rsi(xs[: i + 1], 14))
+            e.update(v)
+            r.update(v)
+            self.assertEqual(e.value, ema(xs[: i + 1], 50))
+            self.assertEqual(r.value, rsi(xs[: i + 1], 14))
+
+    def test_dump_load_round_trip_continues_identically(self):
+        xs = closes()
+        e, r = EMAState(50), RSIState(14)
+        for v in xs[:70]:
+            e.update(v)
+            r.update(v)
+        e2 = EMAState.load(50, json.loads(json.dumps(e.dump())))
+        r2 = RSIState.load(14, json.loads(json.dumps(r.dump())))
+        for v in xs[70:]:
+            e2.update(v)
+            r2.update(v)
+        self.assertEqual(e2.value, ema(xs, 50))
+        self.assertEqual(r2.value, rsi(xs, 14))
+
+
+class BookTest(unittest.TestCase):
+    def test_book_over_a_growing_buffer_matches_the_batch_functions(self):
+        xs = closes()
+        rows = [(i * HOUR_MS, v, 1.0) for i, v in enumerate(xs)]
+        book = IndicatorBook(ema_period=50, rsi_period=14)
+        book.advance("X", rows[:60])
+        # persisted between runs, then advanced over a trimmed buffer that still overlaps
+        restored = IndicatorBook(ema_period=50, rsi_period=14)
+        restored.load(json.loads(json.dumps(book.dump())))
+        restored.advance("X", rows[40:-1])
+        live = xs[-1]
+        self.assertEqual(restored.values("X"), (ema(xs[:-1], 50), rsi(xs[:-1], 14)))
+        self.assertEqual(restored.values("X", live), (ema(xs, 50), rsi(xs, 14)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Gap detection and merging of KlineCache (REST refresh and stream closes)."""
+import unittest
+
+from kline_cache import HOUR_MS, KlineCache
+
+T0 = 1_700_000_000_000 // HOUR_MS * HOUR_MS
+
+
+def candles(first: int, n: int, close: float = 1.0):
+    """n hourly candles starting at hour index `first`."""
+    return [(T0 + (first + i) * HOUR_MS, close + first + i, 10.0) for i in range(n)]
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = KlineCache(path="unused.json", maxlen=5)
+        self.assertTrue(self.cache.merge("X", candles(0, 4)))  # 3 closed + live at hour 3
+
+    def test_contiguous_response_appends_and_trims_to_maxlen(self):
+        self.assertTrue(self.cache.merge("X", candles(3, 4)))  # hours 3..5 closed, live at 6
+        self.assertEqual([c[0] for c in self.cache.closed["X"]], [T0 + h * HOUR_MS for h in range(1, 6)])
+        self.assertEqual(self.cache.live["X"][0], T0 + 6 * HOUR_MS)
+
+    def test_overlapping_response_replaces_the_open_candle(self):
+        self.assertEqual(self.cache.live["X"], candles(3, 1)[0])
+        self.assertTrue(self.cache.merge("X", [candles(2, 1)[0], (T0 + 3 * HOUR_MS, 99.0, 5.0)]))
+        self.assertEqual(len(self.cache.closed["X"]), 3)
+        self.assertEqual(self.cache.live["X"], (T0 + 3 * HOUR_MS, 99.0, 5.0))
+
+    def test_gap_is_reported_and_leaves_the_buffer(self):
+        before = list(self.cache.closed["X"])
+        self.assertFalse(self.cache.merge("X", candles(5, 3)))  # hours 3, 4 missing
+        self.assertEqual(self.cache.closed["X"], before)
+
+
+class RefreshTest(unittest.IsolatedAsyncioTestCase):
+    async def test_gap_forces_a_full_refetch(self):
+        cache = KlineCache(path="unused.json", maxlen=6)
+        cache.merge("X", candles(0, 4))
+        calls = []
+
+        async def fetch(symbol, limit):
+            calls.append(limit)
+            # a short fetch that skips hour 3, then the full history
+            return candles(4, limit) if len(calls) == 1 else candles(9 - limit, limit)
+
+        await cache.refresh("X", fetch, now_ms=T0 + 8 * HOUR_MS + 1)
+        # buffer ended at hour 2: hours 3..7 closed since, plus live; then maxlen + live
+        self.assertEqual(calls, [6, 7])
+        self.assertEqual([c[0] for c in cache.closed["X"]], [T0 + h * HOUR_MS for h in range(2, 8)])
+        self.assertEqual(cache.live["X"][0], T0 + 8 * HOUR_MS)
+
+
+class CloseCandleTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = KlineCache(path="unused.json", maxlen=5)
+        self.cache.merge("X", candles(0, 4))
+
+    def test_next_candle_is_appended_and_opens_an_empty_live_one(self):
+        c = (T0 + 3 * HOUR_MS, 7.0, 3.0)
+        self.assertTrue(self.cache.close_candle("X", c))
+        self.assertEqual(self.cache.closed["X"][-1], c)
+        self.assertEqual(self.cache.live["X"], (T0 + 4 * HOUR_MS, 7.0, 0.0))
+
+    def test_gap_is_rejected(self):
+        self.assertFalse(self.cache.close_candle("X", (T0 + 5 * HOUR_MS, 7.0, 3.0)))
+        self.assertEqual(self.cache.closed["X"][-1][0], T0 + 2 * HOUR_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""OISweeper against a fake openInterest endpoint."""
+import unittest
+
+import httpx
+
+from binance_client import BinanceFuturesClient
+from oi_sweeper import OISweeper
+from snapshot import MarketRow
+
+
+def fake_oi(failing: set):
+    def handler(request: httpx.Request) -> httpx.Response:
+        sym = request.url.params["symbol"]
+        if sym in failing:
+            return httpx.Response(400, json={"code": -4108, "msg": "Symbol is on delivering or delivered or settling"})
+        return httpx.Response(200, json={"symbol": sym, "openInterest": "1000.5", "time": 0})
+    return handler
+
+
+class SweeperTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.symbols = [f"C{i}USDT" for i in range(100)]
+        self.http = httpx.AsyncClient(transport=httpx.MockTransport(fake_oi({"C7USDT"})))
+        self.addAsyncCleanup(self.http.aclose)
+        b = BinanceFuturesClient("https://fapi.test", hedge_min_sec=0, breaker_threshold=1000)
+        self.sweeper = OISweeper(b)
+        self.sweeper.set_universe(self.symbols)
+
+    async def test_failing_symbol_does_not_block_readiness(self):
+        await self.sweeper.sweep(self.http, len(self.symbols))
+        self.assertAlmostEqual(self.sweeper.coverage(), 0.99)
+        self.assertTrue(self.sweeper.ready())
+        self.assertIsNone(self.sweeper.get("C7USDT", 60))
+        self.assertEqual(self.sweeper.get("C1USDT", 60), 1000.5)
+
+    async def test_volatile_symbols_come_first(self):
+        market = {}
+        for i, s in enumerate(self.symbols):
+            r = market[s] = MarketRow()
+            r.pct_24h, r.quote_vol = float(i), 1e6
+        self.sweeper.set_priority(market)
+        await self.sweeper.sweep(self.http, len(self.symbols))
+        # all attempted at once: the most volatile are due again first
+        self.assertEqual(self.sweeper.due(3, now=max(self.sweeper.checked.values()) + 60), ["C99USDT", "C98USDT", "C97USDT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
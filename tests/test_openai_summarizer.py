@@ -0,0 +1,36 @@
+"""Response cache keys and the long-lived client of the summarizer."""
+import time
+import unittest
+
+import httpx
+
+from openai_summarizer import OpenAISummarizer, cache_key
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_every_window_return_is_part_of_the_key(self):
+        up = {"symbol": "XUSDT", "bucket": "4H_UP", "ret4": 10.0, "ret168": 30.0}
+        self.assertNotEqual(cache_key(up), cache_key({**up, "ret4": -50.0}))
+        self.assertNotEqual(cache_key(up), cache_key({**up, "ret168": -30.0}))
+
+    def test_near_identical_inputs_share_a_key(self):
+        a = {"symbol": "XUSDT", "bucket": "12H_UP", "ret12": 10.2, "ret24": 4.1, "rsi": 71.0}
+        b = {"symbol": "XUSDT", "bucket": "12H_UP", "ret24": 4.9, "ret12": 11.0, "rsi": 73.0}
+        self.assertEqual(cache_key(a), cache_key(b))
+
+
+class SummarizerReuseTest(unittest.IsolatedAsyncioTestCase):
+    async def test_stats_cover_one_call_and_aclose_closes_the_pool(self):
+        http = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(500)))
+        it = {"symbol": "XUSDT", "bucket": "4H_UP", "ret4": 10.0}
+        s = OpenAISummarizer("sk-test", "m", cache={cache_key(it): [["cached"], time.time()]}, http_client=http)
+        for _ in range(2):
+            self.assertEqual(await s.summarize([it]), {"XUSDT": ["cached"]})
+            self.assertEqual(s.stats["cache_hits"], 1)
+            self.assertEqual(s.hit_rate(), 1.0)
+        await s.aclose()
+        self.assertTrue(http.is_closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
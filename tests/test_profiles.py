@@ -0,0 +1,45 @@
+"""Report profile files."""
+import json
+import os
+import tempfile
+import unittest
+
+from profiles import ReportProfile, load_profiles
+from scan import WINDOWS
+
+
+class LoadProfilesTest(unittest.TestCase):
+    default = ReportProfile("default", [WINDOWS["12H"], WINDOWS["24H"]], ["1"])
+
+    def load(self, obj):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profiles.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(obj if isinstance(obj, str) else json.dumps(obj))
+            return load_profiles(path, self.default)
+
+    def test_windows_as_list_or_string(self):
+        a, b = self.load([{"name": "a", "windows": ["4H", "24h"]}, {"name": "b", "windows": "4H,24H"}])
+        self.assertEqual(a.windows, [WINDOWS["4H"], WINDOWS["24H"]])
+        self.assertEqual(a.windows, b.windows)
+
+    def test_missing_keys_inherit_default(self):
+        (p,) = self.load([{"name": "top10", "top_n": 10}])
+        self.assertEqual((p.windows, p.chat_ids, p.top_n), (self.default.windows, ["1"], 10))
+
+    def test_bad_files_are_rejected_with_the_profile_named(self):
+        for obj, msg in [
+            ([{"name": "x", "windows": ["5M"]}], "profile x: unknown window"),
+            ([{"name": "x", "top_n": "ten"}], "profile x"),
+            ([{"name": "x", "windows": []}], "no windows"),
+            ([{"name": "a"}, {"name": "a"}], "unique"),
+            ({"name": "a"}, "JSON list"),
+            (["a"], "profile 0: expected an object"),
+            ("[{", "not valid JSON"),
+        ]:
+            with self.assertRaisesRegex(ValueError, msg):
+                self.load(obj)
+
+
+if __name__ == "__main__":
+    unittest.main()
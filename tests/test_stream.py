@@ -0,0 +1,23 @@
+"""StreamIngest frame handling."""
+import json
+import unittest
+
+from binance_client import BinanceFuturesClient
+from kline_cache import KlineCache
+from metrics import METRICS
+from stream import StreamIngest
+
+
+class BadFrameTest(unittest.TestCase):
+    def test_bad_frames_are_counted_and_skipped(self):
+        ingest = StreamIngest(KlineCache(path="unused.json"), BinanceFuturesClient("https://fapi.test"))
+        before = sum(METRICS.counters.get("stream_bad_frames_total", {}).values())
+        ingest.on_message("not json")
+        ingest.on_message(json.dumps({"stream": "x@kline_1h", "data": {"e": "kline", "s": "XUSDT"}}))
+        ingest.on_message(json.dumps({"data": [{"e": "24hrTicker", "s": "XUSDT", "c": "1.5", "q": "10", "P": "2"}]}))
+        self.assertEqual(sum(METRICS.counters["stream_bad_frames_total"].values()) - before, 2)
+        self.assertEqual(ingest.market["XUSDT"].last_price, 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()